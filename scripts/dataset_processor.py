@@ -1,7 +1,29 @@
-import os, sys, json, zipfile, pyshark, statistics, regex
+import os, sys, io, csv, glob, shutil, zipfile, regex
 import time
+import concurrent.futures
+from array import array
 
 # RUN THIS FILE FROM THE ROOT DIRECTORY AND NOT THE SCRIPTS DIRECTORY
+# The payload header format is shared with the client and server, so the src directory is added to the import path
+sys.path.insert(0, "src")
+import payload
+# Capture files compressed with zstd or lz4 are decompressed on the fly with the same functions used to archive them
+import archiver
+# The server and the clients also write one JSON line per repetition to a results file, which is loaded without any log scraping
+import results
+# The capture files are decoded by the streaming reader in the scripts directory, instead of pyshark
+import pcap_reader
+# The results are kept in an SQLite database, with one row per run repetition and client
+import results_store
+# The statistics of every metric over the repetitions (and of the RTT samples of every capture) are calculated with NumPy
+import stats_engine
+
+# The capture files are read straight out of the zip files, with a read-ahead buffer of this size (in bytes) for every member
+# This keeps the memory usage bounded, and avoids writing the uncompressed captures to disk
+capture_buffer = 1024*1024
+
+results_database = "scripts/dataset_results.db"
+statistics_file = "scripts/dataset_statistics.csv"
 
 variables = {
     "device": ["server", "clients"],
@@ -14,208 +36,245 @@ variables = {
     "frequency": ["5 Hz", "25 Hz", "50 Hz"],
 }
 
-def results_file_builder():
-    print("[RFB] Building results file...")
-    results = {}
-    
-    for device in variables["device"]:
-        results[device] = {}
-        for client_amount in variables["client_amount"]:
-            results[device][client_amount] = {}
-            for cpu_performance in variables["cpu_performance"]:
-                results[device][client_amount][cpu_performance] = {}
-                for tcp_algorithm in variables["tcp_algorithm"]:
-                    results[device][client_amount][cpu_performance][tcp_algorithm] = {}
-                    for queue_size in variables["queue_size"]:
-                        results[device][client_amount][cpu_performance][tcp_algorithm][queue_size] = {}
-                        for qos_level in variables["qos_level"]:
-                            results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level] = {}
-                            for payload_size in variables["payload_size"]:
-                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size] = {}
-                                for frequency in variables["frequency"]:
-                                    results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency] = {}
-                                    results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["done"] = False
-                                    results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["uuid"] = ""
-                                    if device == "server":
-                                        results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["processed"] = False
-                                        results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["loss"] = 0.0
-                                        results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["timefactor"] = 0.0
-                                        results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freq"] = 0.0
-                                        results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqfactor"] = 0.0
-                                        results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["ooomsgs"] = 0
-                                        results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["rtt"] = 0.0
-                                    elif device == "clients":
-                                        results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc0"] = 0.0
-                                        match client_amount:
-                                            case "2 clients":
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc1"] = 0.0
-                                            case "5 clients":
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc1"] = 0.0
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc2"] = 0.0
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc3"] = 0.0
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc4"] = 0.0
-                                            case "10 clients":
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc1"] = 0.0
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc2"] = 0.0
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc3"] = 0.0
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc4"] = 0.0
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc5"] = 0.0
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc6"] = 0.0
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc7"] = 0.0
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc8"] = 0.0
-                                                results[device][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqc9"] = 0.0
-                        
-    with open("scripts/dataset_results.json", "w") as results_file:
-        json.dump(results, results_file, indent=4)
-        results_file.close()
-    print("[RFB] Results file built.")
-
+# Opens the results store, an SQLite database with one row per run (with its dimensions) and one row per (run UUID, repetition, client) with its metrics
+# This replaces the nested dataset_results.json file and the execution_details_lut.json file
+def results_store_opener():
+    return results_store.ResultsStore(results_database)
+
+# Parses a line of a server log, with the state of the parser kept in a dictionary, so the parsing can be resumed later from the same line
+# The results of every repetition are stored once its last result line is found, except for the runs already stored from the results file (skip_uuids)
+def server_line_parser(store, line, state, skip_uuids=()):
+    if "Broker CPU performance" in line:
+        state["cpu_performance"] = f"{line.split(':')[-1][1:-1]} CPU"
+    elif "Max queue size per client" in line:
+        state["queue_size"] = line.split(':')[-1][1:]
+    elif "TCP no delay algorithm" in line:
+        if "True" in line: state["tcp_algorithm"] = "tcpON"
+        else: state["tcp_algorithm"] = "tcpOFF"
+    elif "REPETITION" in line:
+        # The line has the repetition and the amount of repetitions of the run (REPETITION x/y), so runs with any amount of repetitions are completed
+        repetition, repetitions = regex.findall(r'REPETITION (\d+)/(\d+)', line)[0]
+        state["repetition"] = int(repetition)
+        state["repetitions"] = int(repetitions)
+    elif "Run UUID" in line:
+        state["uuid"] = line[-36:]
+    elif "Client amount" in line:
+        state["client_amount"] = line.split(':')[-1][1:]
+    elif "Message size" in line:
+        state["payload_size"] = line.split(':')[-1][1:]
+    elif "Publishing frequency" in line:
+        state["frequency"] = line.split(':')[-1][1:]
+    elif "QoS level: " in line:
+        state["qos_level"] = f"QoS {line.split(':')[-1][1:]}"
+    elif "Calculated packet loss" in line:
+        state["packet_loss"] = float(line.split(':')[-1][1:-1])
+    elif "Time factor" in line:
+        state["time_factor"] = float(regex.findall(r'Time factor: \d+\.\d+', line)[0].split(':')[1][1:])
+    elif "Actual frequency" in line:
+        state["actual_freq"] = float(line.split(':')[-1][1:-3])
+    elif state.get("uuid", "") in skip_uuids and ("Frequency factor" in line or "Run converged after" in line or "Run not converged after" in line):
+        return
+    elif "Frequency factor" in line:
+        # The frequency factor is the last result of a repetition, so the results of the repetition are stored in a single transaction
+        # A repetition that was repeated (due to being invalid) overwrites the results of the previous attempt
+        freq_factor = float(line.split(':')[-1][1:-1])
+        uuid = state.get("uuid", "")
+        repetition = state.get("repetition", 0)
+        run_dimensions = {name: state.get(name, "") for name in results_store.dimensions}
+        store.upsert_run(uuid, run_dimensions)
+        store.upsert_result(uuid, repetition, "server", run_dimensions, loss=state.get("packet_loss", 0.0), timefactor=state.get("time_factor", 0.0),
+                            freq=state.get("actual_freq", 0.0), freqfactor=freq_factor)
+        if repetition == state.get("repetitions"):
+            run_completer(store, uuid, run_dimensions)
+    elif "Run converged after" in line or "Run not converged after" in line:
+        # With adaptive repetitions, the run is complete once it converges (or reaches the maximum repetitions), logged after its last result
+        run_completer(store, state.get("uuid", ""), {name: state.get(name, "") for name in results_store.dimensions})
+
+# Marks a run as complete once its last repetition is stored
+# Only the first run with all repetitions done is used for each combination of dimensions
+def run_completer(store, uuid, run_dimensions):
+    store.upsert_run(uuid, complete=1)
+    if store.run(uuid)["done"] == 0 and len(store.runs(done=1, **run_dimensions)) == 0:
+        print(f"Added server data for run {uuid}")
+        store.upsert_run(uuid, done=1)
+
+# Parses a line of a client log, with the state of the parser kept in a dictionary, like the server log parser
+def client_line_parser(store, line, state, client, skip_uuids=()):
+    if "Run UUID" in line:
+        state["uuid"] = line[-36:]
+        state["repetition"] = None
+        # Only the runs with all repetitions done in the server logs are used, and not already stored from the results file
+        run = store.run(state["uuid"])
+        if run is not None and run["complete"] == 1 and state["uuid"] not in skip_uuids:
+            state["invalid"] = False
+        else:
+            state["invalid"] = True
+    elif "Run repetition" in line:
+        state["repetition"] = int(line.split(':')[-1][1:])
+    # TODO - INVESTIGATE POSSIBILITY OF BAD LOGIC HERE, AS IT MAY BE COUNTING RESULTS FROM SERVER-ONLY INVALID RUNS,
+    # SUCH AS WHEN EXECUTION TIME IS TOO LOW, AND THEREFORE MAY BE SKIPPING ACTUAL VALID RESULTS
+    # CHECK FOR RUNS IN THE DATASET WITH 11 CAPTURE FILES AND DOUBLE CHECK THE RESULTS ON THE CLIENT SIDE, AND UPDATE CODE TO AVOID THOSE
+    elif "Actual frequency (from the client)" in line and state.get("invalid", True) == False:
+        # The repetition is logged by the client at the start of every run, and for older logs without it,
+        # the repetitions of a run are numbered in the order they appear in the log file
+        state.setdefault("repetitions", {})
+        state["repetitions"][state["uuid"]] = state["repetitions"].get(state["uuid"], 0) + 1
+        repetition = state["repetition"] if state.get("repetition") is not None else state["repetitions"][state["uuid"]]
+        store.upsert_result(state["uuid"], repetition, client, freq=float(line.split(':')[-1][1:-3]))
+
+# Flattens the metrics of a results record into metric columns, with nested reports prefixed by their name (latency p99.9 -> latency_p99_9)
+# Only numeric values are kept, since the metric columns of the results store are all REAL
+def record_metrics(metrics, prefix=""):
+    columns = {}
+    for name, value in metrics.items():
+        column = prefix + name.lower().replace(".", "_")
+        if isinstance(value, dict):
+            columns.update(record_metrics(value, column + "_"))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            columns[column] = value
+    return columns
+
+# Stores a record of a results file, which has the same fields for the server and the clients, besides the broker settings (server only)
+# Server records create the run with its dimensions, and the last repetition of a run (flagged by the server) marks it as complete
+# Client records copy the dimensions of the run, so they are stored once the server record of the run exists
+# The repetition number is in the record, so client results of invalid server repetitions can't shift the valid ones (results only use done runs)
+# Invalid repetitions are skipped, since they are repeated with the same UUID and repetition number
+def record_parser(store, record, client):
+    if record.get("valid") is not True or "uuid" not in record or "repetition" not in record:
+        return
+    uuid = record["uuid"]
+    repetition = record["repetition"]
+    metrics = record_metrics(record.get("metrics", {}))
+    if client == "server":
+        config = record.get("config", {})
+        broker = record.get("broker", {})
+        run_dimensions = {"client_amount": f"{config.get('client_amount')} clients",
+                          "cpu_performance": f"{broker['cpu_performance']} CPU" if broker.get("cpu_performance") is not None else "",
+                          "tcp_algorithm": "tcpON" if broker.get("tcp_delay") else "tcpOFF",
+                          "queue_size": f"{broker.get('queue_size')} messages",
+                          "qos_level": f"QoS {config.get('msg_qos')}",
+                          "payload_size": f"{config.get('msg_size')} bytes",
+                          "frequency": f"{config.get('msg_freq')} Hz"}
+        store.upsert_run(uuid, run_dimensions)
+        store.upsert_result(uuid, repetition, client, run_dimensions, **metrics)
+        # The last repetition is flagged by the server, since with adaptive repetitions the amount of repetitions of a run is not fixed
+        if record.get("last", repetition == record.get("repetitions", 10)):
+            run_completer(store, uuid, run_dimensions)
+    else:
+        run = store.run(uuid)
+        if run is not None:
+            store.upsert_result(uuid, repetition, client, **metrics)
+
+# Gets the byte offset and parser state from which a file should be parsed, using the manifest of the results store:
+# - files with the same inode, size and modification time as in the manifest are skipped without being opened (None is returned)
+# - files that grew are parsed from the stored byte offset, with the stored parser state
+# - files that were replaced or truncated (different inode or smaller size) are parsed again from the beginning
+def manifest_resume(store, path, path_stat):
+    entry = store.manifest_entry(path)
+    if entry is not None and entry["inode"] == path_stat.st_ino and entry["size"] == path_stat.st_size and entry["mtime"] == path_stat.st_mtime_ns:
+        return None
+    if entry is not None and entry["inode"] == path_stat.st_ino and entry["offset"] <= path_stat.st_size:
+        return entry["offset"], entry["state"]
+    return 0, {}
+
+# Gets the log folders of a device ("server" or "clients"), as (folder, client) tuples
+# The client folders are found in the logs folder, since with virtual clients the client numbers go beyond the amount of hosts
+def device_folders(device):
+    if device == "server":
+        return [("logs/server", "server")]
+    clients = [folder for folder in glob.glob("logs/client-*") if os.path.isdir(folder) and folder.split("client-")[-1].isdigit()]
+    return [(folder, os.path.basename(folder)) for folder in sorted(clients, key=lambda folder: int(folder.split("client-")[-1]))]
+
+# Ingests the results files of a device ("server" or "clients") into the results store
+# Every record is a JSON line, so the file is loaded linearly from where the previous ingestion stopped, like the main logs
+def results_file_processor(device):
+    store = results_store_opener()
+    print(f"[RFP] Processing {device} results files...")
+    for log_folder, client in device_folders(device):
+        results_path = f"{log_folder}/{client}-results.jsonl"
+        if not os.path.isfile(results_path):
+            continue
+        results_stat = os.stat(results_path)
+        resume = manifest_resume(store, results_path, results_stat)
+        if resume is None:
+            print(f"[RFP] {client}-results.jsonl unchanged, skipping...")
+            continue
+        offset, state = resume
+        print(f"[RFP] Processing {client}-results.jsonl from byte {offset}...")
+        record_counter = 0
+        for record, offset in results.read_records(results_path, offset):
+            record_parser(store, record, client)
+            record_counter += 1
+            state["uuid"] = record.get("uuid")
+        store.upsert_manifest(results_path, results_stat.st_ino, results_stat.st_size, results_stat.st_mtime_ns, offset, state.get("uuid"), state)
+        print(f"[RFP] {record_counter} records of {client} added to results store.")
+    store.close()
+
+# Gets the run UUIDs of a results file, which are skipped by the log scraping, or an empty set in case the folder has no results file
+def results_file_uuids(results_path):
+    if not os.path.isfile(results_path):
+        return set()
+    return {record.get("uuid") for record, offset in results.read_records(results_path)}
+
+# Ingests the main logs of a device ("server" or "clients") into the results store
+# Runs with records in the results file of the folder are skipped, since the results file has the same results (and more) without any log scraping,
+# so the log scraping is only used for runs of older executions, logged before the results file existed (even if in the same folder)
+# Every log file is only parsed from where the previous ingestion stopped, using the manifest of the results store (see manifest_resume)
+# Lines are read one at a time, and only complete lines are parsed, so a log still being written is resumed from its last complete line
+# Since every result is an upsert by (run UUID, repetition, client), parsing the same lines again doesn't change the results
 def log_file_processor(device):
-    with open("scripts/dataset_results.json", "r") as results_file:
-        results = json.load(results_file)
-        results_file.close()
+    store = results_store_opener()
 
     if device == "server":
         print("[LFP] Processing server logs...")
-        execution_details_lut = {}
-        server_log_list = os.listdir(f"logs/server")
-        
+
+    for log_folder, client in device_folders(device):
+        if device == "clients":
+            print(f"[LFP] Processing {client} logs...")
+        if not os.path.isdir(log_folder):
+            continue
+        skip_uuids = results_file_uuids(f"{log_folder}/{client}-results.jsonl")
+        if len(skip_uuids) > 0:
+            print(f"[LFP] {client} has a results file, skipping the log scraping of its {len(skip_uuids)} runs...")
+        log_list = sorted(log_file_name for log_file_name in os.listdir(log_folder) if "-main-" in log_file_name)
+
         log_counter = 0
-        for log_file_name in server_log_list:
-            if "-main-" in log_file_name:
-                log_counter += 1
-                print(f"[LFP] [{log_counter}/{len(server_log_list)}] Processing {log_file_name}...")
-                
-                log_data = open(f"logs/server/{log_file_name}").read().splitlines()
-        
-                client_amount = ""
-                cpu_performance = ""
-                tcp_algorithm = ""
-                queue_size = ""
-                qos_level = ""
-                payload_size = ""
-                frequency = ""
-                uuid = ""
-                repetition = 0
-
-                packet_loss = []
-                time_factor = []
-                actual_freq = []
-                freq_factor = []
-                
-                for line in log_data:
-                    if "Broker CPU performance" in line:
-                        cpu_performance = f"{line.split(':')[-1][1:-1]} CPU"
-                    elif "Max queue size per client" in line:
-                        queue_size = line.split(':')[-1][1:]
-                    elif "TCP no delay algorithm" in line:
-                        if "True" in line: tcp_algorithm = "tcpON"
-                        else: tcp_algorithm = "tcpOFF"
-                    elif "REPETITION" in line:
-                        repetition = int(regex.findall(r'REPETITION \d+', line)[0].split(' ')[1])
-                    elif "Run UUID" in line:
-                        uuid = line[-36:]
-                    elif "Client amount" in line:
-                        client_amount = line.split(':')[-1][1:]
-                    elif "Message size" in line:
-                        payload_size = line.split(':')[-1][1:]
-                    elif "Publishing frequency" in line:
-                        frequency = line.split(':')[-1][1:]
-                    elif "QoS level: " in line:
-                        qos_level = f"QoS {line.split(':')[-1][1:]}"
-                    elif "Calculated packet loss" in line:
-                        packet_loss.append(float(line.split(':')[-1][1:-1]))
-                    elif "Time factor" in line:
-                        time_factor.append(float(regex.findall(r'Time factor: \d+\.\d+', line)[0].split(':')[1][1:]))
-                    elif "Actual frequency" in line:
-                        actual_freq.append(float(line.split(':')[-1][1:-3]))
-                    elif "Frequency factor" in line:
-                        freq_factor.append(float(line.split(':')[-1][1:-1]))
-                        if repetition == 10:
-                            execution_details_lut[uuid] = f"{client_amount};{cpu_performance};{tcp_algorithm};{queue_size};{qos_level};{payload_size};{frequency}"
-                            if results["server"][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["done"] == False:
-                                print(f"Added server log data for run {uuid}")
-                                results["server"][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["done"] = True
-                                results["server"][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["uuid"] = uuid
-                                results["server"][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["loss"] = round(statistics.mean(packet_loss),3)
-                                results["server"][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["timefactor"] = round(statistics.mean(time_factor),3)
-                                results["server"][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freq"] = round(statistics.mean(actual_freq),3)
-                                results["server"][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["freqfactor"] = round(statistics.mean(freq_factor),3)
-                            packet_loss = []
-                            time_factor = []
-                            actual_freq = []
-                            freq_factor = []
-        
-        with open("scripts/execution_details_lut.json", "w") as lut_file:
-            json.dump(execution_details_lut, lut_file, indent=4)
-            lut_file.close()
-        print("[LFP] Information added to LUT file.")
-
-    elif device == "clients":
-        with open("scripts/execution_details_lut.json", "r") as lut_file:
-            execution_details_lut = json.load(lut_file)
-            lut_file.close()
-
-        for client in range(10):
-            print(f"[LFP] Processing client {client} logs...")
-            client_log_list = os.listdir(f"logs/client-{client}")
-
-            log_counter = 0
-            for log_file_name in client_log_list:
-                if "-main-" in log_file_name:
-                    log_counter += 1
-                    print(f"[LFP] [{log_counter}/{len(client_log_list)}] Processing {log_file_name}...")
-
-                    log_data = open(f"logs/client-{client}/{log_file_name}").read().splitlines()
-
-                    client_amount = ""
-                    cpu_performance = ""
-                    tcp_algorithm = ""
-                    queue_size = ""
-                    qos_level = ""
-                    payload_size = ""
-                    frequency = ""
-                    uuid = ""
-                    invalid = False
-
-                    freqclient = []
-
-                    for line in log_data:
-                        if "Run UUID" in line:
-                            uuid = line[-36:]
-                            if uuid in execution_details_lut:
-                                details = execution_details_lut[uuid].split(';')
-                                invalid = False
-                                client_amount = details[0]
-                                cpu_performance = details[1]
-                                tcp_algorithm = details[2]
-                                queue_size = details[3]
-                                qos_level = details[4]
-                                payload_size = details[5]
-                                frequency = details[6]
-                            else:
-                                invalid = True
-                        # TODO - INVESTIGATE POSSIBILITY OF BAD LOGIC HERE, AS IT MAY BE COUNTING RESULTS FROM SERVER-ONLY INVALID RUNS,
-                        # SUCH AS WHEN EXECUTION TIME IS TOO LOW, AND THEREFORE MAY BE SKIPPING ACTUAL VALID RESULTS
-                        # CHECK FOR RUNS IN THE DATASET WITH 11 CAPTURE FILES AND DOUBLE CHECK THE RESULTS ON THE CLIENT SIDE, AND UPDATE CODE TO AVOID THOSE
-                        elif "Actual frequency (from the client)" in line and invalid == False:
-                            freqclient.append(float(line.split(':')[-1][1:-3]))
-                            if len(freqclient) == 10:
-                                results["clients"][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["done"] = True
-                                results["clients"][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency]["uuid"] = uuid
-                                results["clients"][client_amount][cpu_performance][tcp_algorithm][queue_size][qos_level][payload_size][frequency][f"freqc{client}"] = round(statistics.mean(freqclient),3)
-                                freqclient = []
-
-    with open("scripts/dataset_results.json", "w") as results_file:
-        json.dump(results, results_file, indent=4)
-        results_file.close()
-    print("[LFP] Log results added to results file.")
+        skipped_counter = 0
+        for log_file_name in log_list:
+            log_counter += 1
+            log_path = f"{log_folder}/{log_file_name}"
+            log_stat = os.stat(log_path)
+            resume = manifest_resume(store, log_path, log_stat)
+            if resume is None:
+                skipped_counter += 1
+                continue
+            offset, state = resume
+            if offset > 0:
+                print(f"[LFP] [{log_counter}/{len(log_list)}] Processing {log_file_name} from byte {offset}...")
+            else:
+                print(f"[LFP] [{log_counter}/{len(log_list)}] Processing {log_file_name}...")
+
+            with open(log_path, "rb") as log_file:
+                log_file.seek(offset)
+                for raw_line in log_file:
+                    if not raw_line.endswith(b"\n"):
+                        break
+                    offset += len(raw_line)
+                    line = raw_line.decode("utf-8", "replace").rstrip("\r\n")
+                    if device == "server":
+                        server_line_parser(store, line, state, skip_uuids)
+                    else:
+                        client_line_parser(store, line, state, client, skip_uuids)
+            store.upsert_manifest(log_path, log_stat.st_ino, log_stat.st_size, log_stat.st_mtime_ns, offset, state.get("uuid"), state)
+        if skipped_counter > 0:
+            print(f"[LFP] {skipped_counter} unchanged log files skipped")
+
+    store.close()
+    print("[LFP] Log results added to results store.")
 
 def zip_organizer():
     print("[ZO] Organizing zip files...")
-    with open("scripts/execution_details_lut.json", "r") as lut_file:
-        execution_details_lut = json.load(lut_file)
-        lut_file.close()
+    store = results_store_opener()
 
     device_folder_list = os.listdir("dumpcap/server")
     for client_amount in device_folder_list:
@@ -232,43 +291,37 @@ def zip_organizer():
                 zip_counter += 1
                 uuid = zip_file.split('U')[-1][:-4]
 
-                if uuid in execution_details_lut:
-                    qos = execution_details_lut[uuid].split(';')[4]
+                run = store.run(uuid)
+                if run is not None and run["complete"] == 1:
+                    qos = run["qos_level"]
                     
                     rezip = False
                     print(f"[ZO] [{zip_counter}/{len(zip_list)}] Checking {zip_file} for duplicate executions...")
                     with zipfile.ZipFile(f"dumpcap/server/{client_amount}/{zip_file}", 'r') as open_zip:
                         file_list = open_zip.namelist()
-                        
-                        if len(file_list) > 10:
+
+                        # Since runs with adaptive repetitions don't have a fixed amount of capture files, duplicates are found by their repetition number
+                        # For every repetition with more than one capture, only the latest one (by capture timestamp) is kept, with all its ring buffer files
+                        delete = set()
+                        latest = {}
+                        for repetition, capture_files in capture_groups(file_list):
+                            if repetition in latest:
+                                delete.update(latest[repetition])
+                            latest[repetition] = capture_files
+
+                        if len(delete) > 0:
                             rezip = True
-                            previous_filename = ""
-                            previous_repetition = ""
-
-                            for filename in file_list:
-                                repetition = filename.split('-')[6]
-                                if repetition == previous_repetition:
-                                    delete = previous_filename
-                                    break
-                                previous_filename = filename
-                                previous_repetition = repetition
-                            
-                            print(f"[ZO] {zip_file} has more than 10 capture files. Removing {delete}...")
-                            open_zip.extractall(f"dumpcap/server/{client_amount}/unzipped")
-                            os.remove(f"dumpcap/server/{client_amount}/unzipped/{delete}")
-                            open_zip.close()
+                            # The zip file is rewritten without the duplicates, streaming every other member from the old zip file to a new one
+                            print(f"[ZO] {zip_file} has duplicate capture files. Removing {', '.join(sorted(delete))}...")
+                            with zipfile.ZipFile(f"dumpcap/server/{client_amount}/{zip_file}.tmp", 'w', zipfile.ZIP_DEFLATED) as new_zip:
+                                for member in open_zip.infolist():
+                                    if member.filename not in delete:
+                                        with open_zip.open(member) as source, new_zip.open(member.filename, 'w', force_zip64=True) as destination:
+                                            shutil.copyfileobj(source, destination, capture_buffer)
                             
                     if rezip == True:
-                        os.remove(f"dumpcap/server/{client_amount}/{zip_file}")
-                        file_list = os.listdir(f"dumpcap/server/{client_amount}/unzipped")
-
-                        with zipfile.ZipFile(f"dumpcap/server/{client_amount}/{zip_file}", 'a', zipfile.ZIP_DEFLATED) as open_zip:
-                            for file in file_list:
-                                open_zip.write(f"dumpcap/server/{client_amount}/unzipped/{file}", file)
-                                os.remove(f"dumpcap/server/{client_amount}/unzipped/{file}")
-                            open_zip.close()
+                        os.replace(f"dumpcap/server/{client_amount}/{zip_file}.tmp", f"dumpcap/server/{client_amount}/{zip_file}")
                         print(f"[ZO] {zip_file} reorganized.")
-                        os.rmdir(f"dumpcap/server/{client_amount}/unzipped")
 
                     print(f"[ZO] [{zip_counter}/{len(zip_list)}] Moving {zip_file} to respective folder...")
                     try:
@@ -281,146 +334,241 @@ def zip_organizer():
                     except FileExistsError:
                         print(f"[ZO] [{zip_counter}/{len(zip_list)}] Duplicate {zip_file} in destination folder, deleting...")
                         os.remove(f"dumpcap/server/{client_amount}/{zip_file}")
+    store.close()
 
 def remaining_run_checker():
-    print(f"[RRC] Checking results file for missing runs...")
-    with open("scripts/dataset_results.json", "r") as results_file:
-        results = json.load(results_file)
-        results_file.close()
-    
-    for v1 in variables["client_amount"]:
-        for v2 in variables["cpu_performance"]:
-            for v3 in variables["tcp_algorithm"]:
-                for v4 in variables["queue_size"]:
-                    for v5 in variables["qos_level"]:
-                        for v6 in variables["payload_size"]:
-                            for v7 in variables["frequency"]:
-                                done = results["server"][v1][v2][v3][v4][v5][v6][v7]["done"]
-                                processed = results["server"][v1][v2][v3][v4][v5][v6][v7]["processed"]
-
-                                if done and not processed:
-                                    print(f"[RRC] Run with details {v1};{v2};{v3};{v4};{v5};{v6};{v7} done but not processed yet")
-                                # if not done and not processed:
-                                #     print(f"[RRC] Run with details {v1};{v2};{v3};{v4};{v5};{v6};{v7} not done yet")
-
-def pcap_file_processor(clients, qos):
-    print(f"[PFP] Processing {clients} {qos} capture files...")
-    with open("scripts/dataset_results.json", "r") as results_file:
-        results = json.load(results_file)
-        results_file.close()
-    with open("scripts/execution_details_lut.json", "r") as lut_file:
-        execution_details_lut = json.load(lut_file)
-        lut_file.close()
-
-    zip_list = os.listdir(f"dumpcap/server/{clients}/{qos}")
-
+    print(f"[RRC] Checking results store for missing runs...")
+    store = results_store_opener()
+    for run in store.runs(done=1, processed=0):
+        print(f"[RRC] Run with details {';'.join(run[name] for name in results_store.dimensions)} done but not processed yet")
+    store.close()
+
+# Prints the mean results of every combination of dimensions, for the server and for the clients, from the done runs of the results store
+def results_printer():
+    print(f"[RP] Mean results of every combination of dimensions...")
+    store = results_store_opener()
+    server_metrics = [name for name in ("loss", "timefactor", "freq", "freqfactor", "ooomsgs", "rtt") if name in store.table_columns("results")]
+    for result in store.aggregate(server_metrics, client="server"):
+        details = ';'.join(result[name] for name in results_store.dimensions)
+        print(f"[RP] Server {details}: " + " | ".join(f"{name} {round(result[f'{name}_mean'],3) if result[f'{name}_mean'] is not None else '-'}" for name in server_metrics))
+    if "freq" in store.table_columns("results"):
+        for result in store.aggregate(["freq"], group_by=results_store.dimensions + ("client",)):
+            if result["client"] != "server":
+                details = ';'.join(result[name] for name in results_store.dimensions)
+                print(f"[RP] {result['client']} {details}: freq {round(result['freq_mean'],3)}")
+    store.close()
+
+# Calculates the statistics of every metric over the repetitions of every combination of dimensions (and client), with the statistics engine
+# The statistics are written to a CSV file, with one line per group and a column per metric statistic, to be loaded by the chart notebook
+# The outliers (repetitions outside the Tukey fences of their group) are printed, so they can be checked in the logs
+def statistics_exporter(resamples=1000):
+    print(f"[SE] Calculating statistics of every combination of dimensions...")
+    store = results_store_opener()
+    # The broker telemetry metrics (dropped publishes and stored messages) tell apart the loss from broker queue overflows and from the network,
+    # and the host telemetry metrics (broker and host CPU) tie performance drops to saturated resources
+    metrics = [name for name in ("loss", "timefactor", "freq", "freqfactor", "ooomsgs", "rtt", "rtt_p99", "broker_sys_publish_dropped", "broker_sys_stored",
+                                 "resources_mosquitto_cpu_mean", "resources_host_cpu_max") if name in store.table_columns("results")]
+    start_time = time.monotonic()
+    group_by = results_store.dimensions + ("client",)
+    statistics, outliers = stats_engine.dataset_statistics(store, metrics, group_by, resamples=resamples)
+    store.close()
+    print(f"[SE] Statistics of {len(metrics)} metrics for {len(statistics)} groups calculated in {round(time.monotonic()-start_time,2)} seconds")
+    with open(statistics_file, "w", newline="") as open_file:
+        writer = csv.DictWriter(open_file, list(group_by) + [f"{metric}_{name}" for metric in metrics for name in stats_engine.statistic_names])
+        writer.writeheader()
+        writer.writerows(statistics)
+    print(f"[SE] Statistics written to {statistics_file}")
+    for outlier in outliers:
+        print(f"[SE] Outlier {outlier['metric']} {outlier['value']} in run {outlier['uuid']} repetition {outlier['repetition']} ({outlier['client']})")
+    print(f"[SE] {len(outliers)} outliers found")
+
+# Groups the members of a zip file by capture, as a list of (repetition, [members]) tuples, sorted by repetition and capture start time
+# A capture is identified by its repetition and start timestamp (-R<repetition>-T<timestamp>), and has more than one member when
+# Dumpcap wrote it as a ring buffer (name_00001_<timestamp>.pcap, name_00002_<timestamp>.pcap, ...), which are sorted in the order they were written
+# The captures are sorted by their timestamp (and not by the order of the zip members, since the archiver workers can add them in any order),
+# so the last capture of a repetition is always the latest one
+# Members without a repetition in the name (older captures) are numbered in order
+def capture_groups(member_list):
+    groups = {}
+    for index, member in enumerate(member_list):
+        identity = regex.search(r'-R(\d+)-T(\d{2})-(\d{2})-(\d{4})_(\d{2}-\d{2}-\d{2})', member)
+        if identity is not None:
+            day, month, year = identity.group(2, 3, 4)
+            key = (int(identity.group(1)), f"{year}-{month}-{day}_{identity.group(5)}")
+        else:
+            key = (index+1, member)
+        groups.setdefault(key, []).append(member)
+    return [(key[0], sorted(groups[key])) for key in sorted(groups)]
+
+# Reads the packets of the members of a capture one after the other, as a single stream
+# The capture files are decompressed on the fly while they are read from the zip file, without extracting them to disk
+def capture_packets(open_zip, capture_files):
+    for capture_file in capture_files:
+        with io.BufferedReader(archiver.open_member(open_zip, capture_file), capture_buffer) as capture:
+            yield from pcap_reader.read_packets(capture)
+
+# Analyzes a single capture (one or more ring buffer files) of a zip file, returning its amount of out of order messages and its RTT samples (in milliseconds)
+# This is the unit of work of the process pool, so it opens the zip file on its own and only returns the partial results of the capture
+def capture_analyzer(zip_path, capture_files, qos_level):
+    ooo_messages = 0
+    rtt = array('d')
+    last_message_number = {}
+    ports = {}
+    messages = {}
+
+    # The capture is read as a stream of TCP segments, which are used for the ACK round trip times (QoS 0),
+    # and reassembled into MQTT packets, which are used for the PUBLISH to PUBACK/PUBCOMP round trip times (QoS 1 and 2) and the out of order messages
+    ack_rtt = pcap_reader.AckRttTracker()
+    reassembler = pcap_reader.MQTTReassembler()
+    segment_counter = 0
+    with zipfile.ZipFile(zip_path, 'r') as open_zip:
+        for segment in pcap_reader.tcp_segments(capture_packets(open_zip, capture_files)):
+            segment_counter += 1
+            if qos_level == "QoS 0":
+                segment_rtt = ack_rtt.segment(segment)
+                if segment_rtt is not None:
+                    rtt.append(segment_rtt/1000000)
+            for message in reassembler.segment(segment):
+                match message.packet_type:
+                    case pcap_reader.mqtt_publish:
+                        if message.topic is None or 'main_topic' not in message.topic:
+                            continue
+                        client_id = message.topic.split('/')[-1]
+                        if qos_level != "QoS 0":
+                            if message.sport not in ports:
+                                ports[message.sport] = client_id
+                            if client_id not in messages:
+                                messages[client_id] = {}
+                            messages[client_id][message.msgid] = message.timestamp
+                        if client_id not in last_message_number:
+                            last_message_number[client_id] = 0
+                        # The sequence number is read from the payload header, or from the last 2 bytes for legacy payloads
+                        if message.payload is not None and payload.decode_header(message.payload) is not None:
+                            msg_num = payload.message_sequence(message.payload)+1
+                        elif message.tail is not None:
+                            msg_num = payload.message_sequence(message.tail)+1
+                        else:
+                            continue
+                        if msg_num > last_message_number[client_id]:
+                            last_message_number[client_id] = msg_num
+                        else:
+                            ooo_messages += 1
+                    case pcap_reader.mqtt_puback | pcap_reader.mqtt_pubcomp:
+                        if qos_level != "QoS 0" and message.dport in ports:
+                            if message.msgid in messages[ports[message.dport]]:
+                                rtt.append((message.timestamp - messages[ports[message.dport]][message.msgid])/1000000)
+    return ooo_messages, rtt, segment_counter
+
+# Processes the capture files of the given client amounts and QoS levels (folders such as "10C" and "QoS 2")
+# Every capture of every zip file not yet processed is analyzed in parallel by a pool of processes, one capture (all its ring buffer files) per task
+# The results of every capture are stored in its own (run UUID, repetition, server) row of the results store as soon as it is analyzed,
+# so the results don't depend on which process finishes first, and the run is marked as processed once all its captures are analyzed
+def pcap_file_processor(client_list, qos_list, workers=None):
+    store = results_store_opener()
+
+    # Builds the list of zip files to process, with their run details and capture files
+    pending_zips = {}
+    for clients in client_list:
+        for qos in qos_list:
+            if not os.path.isdir(f"dumpcap/server/{clients}/{qos}"):
+                continue
+            print(f"[PFP] Listing {clients} {qos} capture files...")
+            for zip_file in sorted(os.listdir(f"dumpcap/server/{clients}/{qos}")):
+                if "server-" in zip_file:
+                    uuid = zip_file.split('U')[-1][:-4]
+                    run = store.run(uuid)
+                    if run is None:
+                        print(f"[PFP] {zip_file} has no run in the results store. Skipping...")
+                        continue
+                    if run["processed"] == 0:
+                        zip_path = f"dumpcap/server/{clients}/{qos}/{zip_file}"
+                        try:
+                            with zipfile.ZipFile(zip_path, 'r') as open_zip:
+                                capture_list = capture_groups(open_zip.namelist())
+                        except (OSError, zipfile.BadZipFile) as error:
+                            print(f"[PFP] {zip_file} can't be read ({error}). Skipping...")
+                            continue
+                        # A zip file without captures has nothing to analyze, so its run is marked as processed right away instead of being listed every time
+                        if len(capture_list) == 0:
+                            print(f"[PFP] {zip_file} has no capture files. Marking as processed...")
+                            store.upsert_run(uuid, processed=1)
+                            continue
+                        pending_zips[zip_path] = {"run": run, "captures": capture_list, "partial": {}, "failed": []}
+                    else:
+                        print(f"[PFP] {zip_file} already processed. Skipping...")
+
+    capture_amount = sum(len(pending_zip["captures"]) for pending_zip in pending_zips.values())
+    workers = workers or os.cpu_count()
+    print(f"[PFP] Processing {capture_amount} captures from {len(pending_zips)} zip files with {workers} processes...")
+    start_time = time.monotonic()
+    capture_counter = 0
     zip_counter = 0
-    unzipped_folder = False
-    for zip_file in zip_list:
-        if "server-" in zip_file:
-            zip_counter += 1
-            print(f"[PFP] [{zip_counter}/{len(zip_list)}] Processing {zip_file}...")
-        
-            uuid = zip_file.split('U')[-1][:-4]
-            details = execution_details_lut[uuid].split(';')
-
-            if results["server"][details[0]][details[1]][details[2]][details[3]][details[4]][details[5]][details[6]]["processed"] == False:
-                os.makedirs(f"dumpcap/server/{clients}/{qos}/unzipped", exist_ok=True)
-                unzipped_folder = True
-
-                with zipfile.ZipFile(f"dumpcap/server/{clients}/{qos}/{zip_file}", 'r') as zip_file:
-                    zip_file.extractall(f"dumpcap/server/{clients}/{qos}/unzipped")
-                    zip_file.close()
-
-                ooo_messages = 0
-                rtt = []
-
-                capture_list = os.listdir(f"dumpcap/server/{clients}/{qos}/unzipped")
-                capture_counter = 0
-                for capture_file in capture_list:
-                    capture_counter += 1
-                    print(f"[PFP] [{capture_counter}/{len(capture_list)}] Processing {capture_file}...")
-
-                    last_message_number = {}
-                    ports = {}
-                    messages = {}
-
-                    capture = pyshark.FileCapture(f"dumpcap/server/{clients}/{qos}/unzipped/{capture_file}")
-                    capture.load_packets()
-                    packet_counter = 0
-                    for packet in capture:
-                        packet_counter += 1
-                        print(f"[PFP] Processing packet {packet_counter}...", end='\r')
-                        match details[4]:
-                            case "QoS 0":
-                                if 'analysis_ack_rtt' in dir(packet.tcp):
-                                    rtt.append(float(packet.tcp.analysis_ack_rtt)*1000)
-                            case "QoS 1" | "QoS 2":
-                                if 'mqtt' in dir(packet):
-                                    match packet.mqtt.msgtype:
-                                        case '3':
-                                            if 'topic' in dir(packet.mqtt):
-                                                if 'main_topic' in packet.mqtt.topic:
-                                                    client_id = packet.mqtt.topic.split('/')[-1]
-                                                    if 'srcport' in dir(packet.tcp):
-                                                        if packet.tcp.srcport not in ports:
-                                                            try:
-                                                                ports[packet.tcp.srcport] = client_id
-                                                            except:
-                                                                print(f"[PFP] Error: {packet}")
-                                                        
-                                                        if client_id not in messages:
-                                                            messages[client_id] = {}
-                                                        
-                                                        messages[client_id][packet.mqtt.msgid] = float(packet.sniff_timestamp)
-                                        case '4' | '7':
-                                            if 'dstport' in dir(packet.tcp):
-                                                if packet.tcp.dstport in ports:
-                                                    if packet.mqtt.msgid in messages[ports[packet.tcp.dstport]]:
-                                                        rtt.append(float(float(packet.sniff_timestamp) - messages[ports[packet.tcp.dstport]][packet.mqtt.msgid])*1000)
-                            
-                        if 'mqtt' in dir(packet) and 'topic' in dir(packet.mqtt):	
-                                if packet.mqtt.msgtype == '3' and 'main_topic' in packet.mqtt.topic:
-                                    client = packet.mqtt.topic.split('/')[-1]
-                                    if client not in last_message_number:
-                                        last_message_number[client] = 0
-
-                                    msg_num = packet.mqtt.msg.hex_value+1
-                                    if msg_num > last_message_number[client]:
-                                        last_message_number[client] = msg_num
-                                    else:
-                                        ooo_messages += 1
-                    
-                    capture.close()
-                    os.remove(f"dumpcap/server/{clients}/{qos}/unzipped/{capture_file}")
-
-                with open("scripts/dataset_results.json", "r") as results_file:
-                    results = json.load(results_file)
-                    results_file.close()
-                
-                results["server"][details[0]][details[1]][details[2]][details[3]][details[4]][details[5]][details[6]]["processed"] = True
-                results["server"][details[0]][details[1]][details[2]][details[3]][details[4]][details[5]][details[6]]["ooomsgs"] = ooo_messages
-                results["server"][details[0]][details[1]][details[2]][details[3]][details[4]][details[5]][details[6]]["rtt"] = round(statistics.mean(rtt),3)
-
-                with open("scripts/dataset_results.json", "w") as results_file:
-                    json.dump(results, results_file, indent=4)
-                    results_file.close()
-                print("[PFP] Capture file results added to results file.")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        tasks = {}
+        for zip_path, pending_zip in pending_zips.items():
+            for capture_index, (repetition, capture_files) in enumerate(pending_zip["captures"]):
+                task = executor.submit(capture_analyzer, zip_path, capture_files, pending_zip["run"]["qos_level"])
+                tasks[task] = (zip_path, capture_index)
+        for task in concurrent.futures.as_completed(tasks):
+            zip_path, capture_index = tasks[task]
+            pending_zip = pending_zips[zip_path]
+            pending_zip["partial"][capture_index] = True
+            capture_counter += 1
+            elapsed = time.monotonic() - start_time
+            repetition, capture_files = pending_zip["captures"][capture_index]
+            capture_name = capture_files[0] if len(capture_files) == 1 else f"{capture_files[0]} (+{len(capture_files)-1} ring files)"
+            # A corrupt or truncated capture only fails its own task, so it is reported and skipped without stopping the other captures
+            try:
+                ooo_messages, rtt, segment_counter = task.result()
+            except Exception as error:
+                pending_zip["failed"].append(capture_name)
+                print(f"[PFP] [{capture_counter}/{capture_amount}] Failed to process {capture_name} ({type(error).__name__}: {error}). Skipping...")
             else:
-                print(f"[PFP] {zip_file} already processed. Skipping...")
-    
-    if unzipped_folder == True:
-        os.rmdir(f"dumpcap/server/{clients}/{qos}/unzipped")
-
-if len(sys.argv) == 1:
-    print(f"[DP] Executing step 1")
-    results_file_builder()
-    log_file_processor("server")
-    log_file_processor("clients")
-    zip_organizer()
-elif len(sys.argv) == 3:
-    print(f"[DP] Executing step 2")
-    pcap_file_processor(f"{sys.argv[1]}C", f"QoS {sys.argv[2]}")
-elif len(sys.argv) == 2 and sys.argv[1] == "rrc":
-    print(f"[DP] Executing step 3")
-    remaining_run_checker()
\ No newline at end of file
+                print(f"[PFP] [{capture_counter}/{capture_amount}] Processed {capture_name} ({segment_counter} packets, {round(elapsed)} seconds elapsed)")
+
+                # Every capture is a repetition of the run, and its results are stored right away, with the statistics of its RTT samples and the amount of samples
+                rtt_statistics = stats_engine.sample_statistics(rtt) or {}
+                store.upsert_result(pending_zip["run"]["uuid"], repetition, "server", ooomsgs=ooo_messages, rtt=rtt_statistics.get("mean"),
+                                    rtt_median=rtt_statistics.get("median"), rtt_p95=rtt_statistics.get("p95"), rtt_p99=rtt_statistics.get("p99"),
+                                    rtt_std=rtt_statistics.get("std"), rtt_samples=len(rtt))
+
+            if len(pending_zip["partial"]) == len(pending_zip["captures"]):
+                del pending_zips[zip_path]
+                zip_counter += 1
+                # All the captures of the zip file are analyzed, so the run is marked as processed
+                # In case any capture failed, the run is left unprocessed, so the failed captures are analyzed again the next time
+                if len(pending_zip["failed"]) == 0:
+                    store.upsert_run(pending_zip["run"]["uuid"], processed=1)
+                    print(f"[PFP] [{zip_counter} zip files done] {os.path.basename(zip_path)} results added to results store.")
+                else:
+                    print(f"[PFP] [{zip_counter} zip files done] {os.path.basename(zip_path)} results added to results store, " +
+                          f"left unprocessed due to {len(pending_zip['failed'])} failed captures: {', '.join(pending_zip['failed'])}")
+    store.close()
+
+# The processing steps are only executed when the file is run directly, since the processes of the pool import this file as well
+# Step 2 can process a single client amount and QoS level, such as "10 2", or every capture file with "all"
+# In both cases, the amount of processes can be given as an extra argument, and defaults to the amount of CPU cores
+# The statistics of the results are exported with "stats", with the amount of bootstrap resamples as an optional extra argument
+if __name__ == "__main__":
+    if len(sys.argv) == 1:
+        print(f"[DP] Executing step 1")
+        results_file_processor("server")
+        results_file_processor("clients")
+        log_file_processor("server")
+        log_file_processor("clients")
+        zip_organizer()
+    elif sys.argv[1] == "all" and len(sys.argv) <= 3:
+        print(f"[DP] Executing step 2")
+        pcap_file_processor([client_amount.replace(" clients", "C") for client_amount in variables["client_amount"]], variables["qos_level"],
+                            int(sys.argv[2]) if len(sys.argv) == 3 else None)
+    elif sys.argv[1] == "stats" and len(sys.argv) <= 3:
+        statistics_exporter(int(sys.argv[2]) if len(sys.argv) == 3 else 1000)
+    elif len(sys.argv) in (3, 4):
+        print(f"[DP] Executing step 2")
+        pcap_file_processor([f"{sys.argv[1]}C"], [f"QoS {sys.argv[2]}"], int(sys.argv[3]) if len(sys.argv) == 4 else None)
+    elif len(sys.argv) == 2 and sys.argv[1] == "rrc":
+        print(f"[DP] Executing step 3")
+        remaining_run_checker()
+    elif len(sys.argv) == 2 and sys.argv[1] == "results":
+        results_printer()
+
@@ -0,0 +1,455 @@
+# Import of all necessary packages and libraries
+import struct
+
+# Streaming reader of capture files, used by the dataset processor instead of pyshark/tshark
+# The capture is read one packet at a time, and every layer is decoded with struct in a chain of generators:
+# - read_packets -> reads the pcap or pcapng records of a capture file object, yielding (timestamp in ns, link type, data, original length)
+# - tcp_segments -> decodes the link, IP and TCP headers of every packet, yielding Segment objects
+# - MQTTReassembler -> reassembles the TCP byte stream of every direction and decodes the MQTT fixed header of every packet in it
+# Only the beginning of every MQTT packet (topic, packet id and the start of the payload) and its last 2 bytes are kept,
+# so big payloads (125 KB, for example) are never stored in memory, even when split across many TCP segments
+
+# Magic numbers of the pcap format, with the byte order and the amount of nanoseconds of the fractional part of the timestamp
+pcap_magics = {b"\xd4\xc3\xb2\xa1": ("<", 1000), b"\xa1\xb2\xc3\xd4": (">", 1000),
+               b"\x4d\x3c\xb2\xa1": ("<", 1), b"\xa1\xb2\x3c\x4d": (">", 1)}
+pcapng_magic = b"\x0a\x0d\x0d\x0a"
+pcapng_byteorder = 0x1A2B3C4D
+
+# Link types supported by the decoder (Ethernet, Linux cooked captures from the "any" interface, raw IP and BSD loopback)
+linktype_null = 0
+linktype_ethernet = 1
+linktype_raw = 101
+linktype_linux_sll = 113
+linktype_ipv4 = 228
+linktype_ipv6 = 229
+linktype_linux_sll2 = 276
+
+# TCP flags used by the reassembly and the ACK analysis
+tcp_fin = 0x01
+tcp_syn = 0x02
+tcp_ack = 0x10
+
+# MQTT control packet types relevant for the dataset processing
+mqtt_publish = 3
+mqtt_puback = 4
+mqtt_pubrec = 5
+mqtt_pubrel = 6
+mqtt_pubcomp = 7
+
+# Amount of bytes kept from the beginning of every MQTT packet, enough for the topic, packet id and payload header
+head_limit = 1024
+# Amount of out of order segments held per direction while waiting for a missing one, before the missing bytes are assumed lost
+pending_limit = 256
+
+ipv4_header = struct.Struct(">BBHHHBBH4s4s")
+ipv6_header = struct.Struct(">IHBB16s16s")
+tcp_header = struct.Struct(">HHIIBBH")
+
+# Reads the packets of a pcap or pcapng capture file, which must be opened in binary mode
+# Yields a tuple of (timestamp in nanoseconds, link type, packet data, original packet length) for every packet
+def read_packets(capture_file):
+    magic = capture_file.read(4)
+    if magic in pcap_magics:
+        yield from read_pcap(capture_file, magic)
+    elif magic == pcapng_magic:
+        yield from read_pcapng(capture_file)
+    elif len(magic) > 0:
+        raise ValueError(f"Unknown capture file format with magic {magic.hex()}")
+
+# Reads the records of a pcap file, after the magic number
+def read_pcap(capture_file, magic):
+    byteorder, fraction_ns = pcap_magics[magic]
+    global_header = struct.Struct(byteorder + "HHiIII")
+    record_header = struct.Struct(byteorder + "IIII")
+    linktype = global_header.unpack(capture_file.read(global_header.size))[5] & 0x0FFFFFFF
+    while True:
+        record = capture_file.read(record_header.size)
+        if len(record) < record_header.size:
+            return
+        seconds, fraction, captured_length, original_length = record_header.unpack(record)
+        data = capture_file.read(captured_length)
+        if len(data) < captured_length:
+            return
+        yield seconds*1000000000 + fraction*fraction_ns, linktype, data, original_length
+
+# Reads the blocks of a pcapng file, after the block type of the first section header block (which is the magic number)
+# Every interface description block defines the link type and the timestamp resolution of the packets captured on that interface
+def read_pcapng(capture_file):
+    # The first section header block starts right after the block type, with the block length followed by the byte order magic
+    section_start = capture_file.read(8)
+    interfaces = []
+    last_timestamp = 0
+    while True:
+        if section_start is not None:
+            # The byte order of a section is given by the byte order magic right after the block length
+            if len(section_start) < 8:
+                return
+            byteorder = "<" if struct.unpack("<I", section_start[4:8])[0] == pcapng_byteorder else ">"
+            block_length = struct.unpack(byteorder + "I", section_start[0:4])[0]
+            capture_file.read(block_length - 12)
+            interfaces = []
+            section_start = None
+            block_id = None
+        else:
+            block_length = struct.unpack(byteorder + "I", block_start[4:8])[0]
+            body = capture_file.read(block_length - 8)
+            if len(body) < block_length - 8:
+                return
+            block_id = struct.unpack(byteorder + "I", block_type)[0]
+        if block_id == 1:
+            # Interface description block, with the link type, the snapshot length and the options (if_tsresol is option 9)
+            linktype, snaplen = struct.unpack_from(byteorder + "HxxI", body, 0)
+            resolution = 1000000
+            position = 8
+            while position + 4 <= len(body) - 4:
+                option_code, option_length = struct.unpack_from(byteorder + "HH", body, position)
+                if option_code == 0:
+                    break
+                if option_code == 9:
+                    value = body[position+4]
+                    resolution = 2**(value & 0x7F) if value & 0x80 else 10**value
+                position += 4 + ((option_length + 3) & ~3)
+            interfaces.append((linktype, resolution, snaplen))
+        elif block_id == 6 or block_id == 2:
+            # Enhanced packet block (or the obsolete packet block), with the interface, timestamp and lengths of the packet
+            if block_id == 6:
+                interface, timestamp_high, timestamp_low, captured_length, original_length = struct.unpack_from(byteorder + "IIIII", body, 0)
+            else:
+                interface, drops, timestamp_high, timestamp_low, captured_length, original_length = struct.unpack_from(byteorder + "HHIIII", body, 0)
+            linktype, resolution, snaplen = interfaces[interface]
+            timestamp = (timestamp_high << 32) | timestamp_low
+            last_timestamp = timestamp*1000000000//resolution if resolution <= 1000000000 else timestamp//(resolution//1000000000)
+            yield last_timestamp, linktype, body[20:20+captured_length], original_length
+        elif block_id == 3:
+            # Simple packet block, without timestamp, so the timestamp of the previous packet is used
+            linktype, resolution, snaplen = interfaces[0]
+            original_length = struct.unpack_from(byteorder + "I", body, 0)[0]
+            captured_length = min(original_length, snaplen) if snaplen > 0 else original_length
+            yield last_timestamp, linktype, body[4:4+captured_length], original_length
+        block_start = capture_file.read(8)
+        if len(block_start) < 8:
+            return
+        block_type = block_start[0:4]
+        if block_type == pcapng_magic:
+            # A new section starts, and its byte order magic comes right after the block length
+            section_start = block_start[4:8] + capture_file.read(4)
+
+# TCP segment class, with the fields of the IP and TCP headers needed by the processing
+# The length is the TCP payload length from the IP header, while data only has the captured part of the payload,
+# which is shorter when the capture was done with a snapshot length smaller than the packets
+class Segment:
+    __slots__ = ("timestamp", "src", "sport", "dst", "dport", "seq", "ack", "flags", "length", "data")
+
+    def __init__(self, timestamp, src, sport, dst, dport, seq, ack, flags, length, data):
+        self.timestamp = timestamp
+        self.src = src
+        self.sport = sport
+        self.dst = dst
+        self.dport = dport
+        self.seq = seq
+        self.ack = ack
+        self.flags = flags
+        self.length = length
+        self.data = data
+
+    # Identifier of the direction of the TCP connection of this segment, and of the opposite direction
+    def flow(self):
+        return (self.src, self.sport, self.dst, self.dport)
+
+    def reverse_flow(self):
+        return (self.dst, self.dport, self.src, self.sport)
+
+# Decodes the link layer of a packet, returning the offset of the IP header, or None in case it's not an IP packet
+def network_offset(linktype, data):
+    if linktype == linktype_ethernet:
+        offset = 12
+        ethertype = int.from_bytes(data[offset:offset+2], "big")
+        # VLAN tags are skipped (802.1Q and 802.1ad)
+        while ethertype in (0x8100, 0x88A8) and len(data) >= offset + 6:
+            offset += 4
+            ethertype = int.from_bytes(data[offset:offset+2], "big")
+        return offset + 2 if ethertype in (0x0800, 0x86DD) else None
+    elif linktype == linktype_linux_sll:
+        return 16 if int.from_bytes(data[14:16], "big") in (0x0800, 0x86DD) else None
+    elif linktype == linktype_linux_sll2:
+        return 20 if int.from_bytes(data[0:2], "big") in (0x0800, 0x86DD) else None
+    elif linktype in (linktype_raw, linktype_ipv4, linktype_ipv6):
+        return 0
+    elif linktype == linktype_null:
+        return 4
+    return None
+
+# Decodes the IP and TCP headers of every packet, yielding a Segment for every TCP packet
+# Fragmented IPv4 packets and IPv6 packets with extension headers are skipped, since they don't happen with MQTT over a local network
+def tcp_segments(packets):
+    for timestamp, linktype, data, original_length in packets:
+        offset = network_offset(linktype, data)
+        if offset is None or len(data) < offset + 20:
+            continue
+        version = data[offset] >> 4
+        if version == 4:
+            version_ihl, tos, total_length, identification, fragment, ttl, protocol, checksum, src, dst = ipv4_header.unpack_from(data, offset)
+            if protocol != 6 or fragment & 0x3FFF:
+                continue
+            ip_header_length = (version_ihl & 0x0F)*4
+            # Captures done on the sending host with segmentation offload can have a total length of 0, in which case the original length is used
+            ip_end = offset + total_length if total_length > 0 else original_length
+            tcp_offset = offset + ip_header_length
+        elif version == 6:
+            if len(data) < offset + 40:
+                continue
+            flow, payload_length, next_header, hop_limit, src, dst = ipv6_header.unpack_from(data, offset)
+            if next_header != 6:
+                continue
+            ip_end = offset + 40 + payload_length
+            tcp_offset = offset + 40
+        else:
+            continue
+        if len(data) < tcp_offset + 20:
+            continue
+        sport, dport, seq, ack, data_offset, flags, window = tcp_header.unpack_from(data, tcp_offset)
+        payload_offset = tcp_offset + (data_offset >> 4)*4
+        yield Segment(timestamp, src, sport, dst, dport, seq, ack, flags, max(ip_end - payload_offset, 0), data[payload_offset:min(ip_end, len(data))])
+
+# Difference between two TCP sequence numbers, taking the wrap around of the 32-bit sequence space into account
+def seq_diff(first, second):
+    return ((first - second + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+# ACK round trip time tracker, equivalent to the tcp.analysis.ack_rtt field of Wireshark
+# For every direction, the segments with data not yet acknowledged are kept in order, and when an ACK in the opposite direction
+# acknowledges exactly the end of one of them, the round trip time is the time between that segment and the ACK
+# Retransmitted segments are not added again, so their ACK is measured from the original transmission, as Wireshark does
+class AckRttTracker:
+    def __init__(self):
+        self.unacked = {}
+        self.next_seq = {}
+
+    # Processes a segment, returning the round trip time in nanoseconds in case it acknowledges a segment, or None otherwise
+    def segment(self, segment):
+        rtt = None
+        if segment.flags & tcp_ack:
+            pending = self.unacked.get(segment.reverse_flow())
+            if pending:
+                acked = None
+                index = 0
+                while index < len(pending) and seq_diff(segment.ack, pending[index][0]) >= 0:
+                    acked = pending[index]
+                    index += 1
+                if index > 0:
+                    del pending[:index]
+                    if acked[0] == segment.ack:
+                        rtt = segment.timestamp - acked[1]
+        seq_length = segment.length + (1 if segment.flags & tcp_syn else 0) + (1 if segment.flags & tcp_fin else 0)
+        if seq_length > 0:
+            flow = segment.flow()
+            seq_end = (segment.seq + seq_length) & 0xFFFFFFFF
+            highest = self.next_seq.get(flow)
+            if highest is None or seq_diff(seq_end, highest) > 0:
+                self.next_seq[flow] = seq_end
+                self.unacked.setdefault(flow, []).append((seq_end, segment.timestamp))
+        return rtt
+
+# MQTT message class, with the decoded fields of a complete MQTT packet
+# - timestamp -> time of the segment in which the last byte of the packet was received, like Wireshark does for reassembled packets
+# - packet_type and flags -> from the first byte of the fixed header
+# - length -> remaining length of the packet (everything after the fixed header)
+# - topic, qos and msgid -> for PUBLISH packets, msgid is also set for PUBACK, PUBREC, PUBREL and PUBCOMP
+# - payload -> first bytes of the PUBLISH payload, up to the head limit
+# - tail -> last 2 bytes of the packet, used for the legacy payloads with the counter at the end
+# Fields that were not captured (due to the snapshot length or packet loss in the capture) are None
+class MQTTMessage:
+    __slots__ = ("timestamp", "src", "sport", "dst", "dport", "packet_type", "flags", "length", "topic", "qos", "msgid", "payload", "tail")
+
+    def __init__(self, timestamp, segment, packet_type, flags, length, head, tail):
+        self.timestamp = timestamp
+        self.src = segment.src
+        self.sport = segment.sport
+        self.dst = segment.dst
+        self.dport = segment.dport
+        self.packet_type = packet_type
+        self.flags = flags
+        self.length = length
+        self.topic = None
+        self.qos = None
+        self.msgid = None
+        self.payload = None
+        self.tail = tail
+        if packet_type == mqtt_publish:
+            self.qos = (flags >> 1) & 3
+            if head is not None and len(head) >= 2:
+                topic_end = 2 + int.from_bytes(head[0:2], "big")
+                if len(head) >= topic_end:
+                    self.topic = bytes(head[2:topic_end]).decode("utf-8", "replace")
+                    if self.qos > 0:
+                        if len(head) >= topic_end + 2:
+                            self.msgid = int.from_bytes(head[topic_end:topic_end+2], "big")
+                        topic_end += 2
+                    self.payload = bytes(head[topic_end:])
+        elif mqtt_puback <= packet_type <= mqtt_pubcomp:
+            if head is not None and len(head) >= 2:
+                self.msgid = int.from_bytes(head[0:2], "big")
+
+# Checks if a byte can be the first byte of an MQTT fixed header, which is used to detect when the parser lost track of the packets
+# Types 0 and 15 are reserved, PUBLISH can have any flags except QoS 3, PUBREL, SUBSCRIBE and UNSUBSCRIBE have flags 2, and the rest have flags 0
+def valid_first_byte(value):
+    packet_type = value >> 4
+    flags = value & 0x0F
+    if packet_type == 0 or packet_type == 15:
+        return False
+    if packet_type == mqtt_publish:
+        return (flags >> 1) & 3 != 3
+    if packet_type in (mqtt_pubrel, 8, 10):
+        return flags == 2
+    return flags == 0
+
+# MQTT stream parser class, used for one direction of a TCP connection
+# The bytes of the stream are fed in order, and the fixed header of every packet is decoded to know where the next one starts
+# Bytes missing from the capture are skipped with the gap function, and in case the missing bytes include a fixed header,
+# the parser loses track of the packets and waits for the start of the next segment, which is assumed to be the start of a packet
+# (paho writes every packet with a separate send call, so packets usually start at the beginning of a segment)
+class MQTTStream:
+    def __init__(self):
+        self.header = bytearray()
+        self.remaining = None
+        self.length = 0
+        self.head = bytearray()
+        self.head_open = True
+        self.tail = b""
+        self.synced = False
+
+    # Starts a new packet in the stream, after the previous one was completed or the stream lost sync
+    def reset(self):
+        self.header.clear()
+        self.remaining = None
+        self.head = bytearray()
+        self.head_open = True
+        self.tail = b""
+
+    # Completes the current packet, returning its (packet type, flags, length, head, tail) tuple
+    # The head can be shorter than the head limit in case part of the packet was not captured, and the tail is None in case its last 2 bytes were not captured
+    def complete(self):
+        message = (self.header[0] >> 4, self.header[0] & 0x0F, self.length, self.head, self.tail if len(self.tail) == 2 else None)
+        self.reset()
+        return message
+
+    # Feeds contiguous bytes of the stream, which start at the beginning of a TCP segment, returning the list of completed packets
+    def feed(self, data):
+        messages = []
+        if self.synced is False:
+            self.reset()
+            self.synced = True
+        view = memoryview(data)
+        position = 0
+        size = len(data)
+        while position < size:
+            if self.remaining is None:
+                # The fixed header is one byte with the type and flags, followed by the remaining length in 1 to 4 bytes
+                self.header.append(data[position])
+                position += 1
+                if len(self.header) == 1 and valid_first_byte(self.header[0]) is False:
+                    self.synced = False
+                    return messages
+                if len(self.header) >= 2 and self.header[-1] < 0x80:
+                    self.length = 0
+                    for index in range(len(self.header)-1, 0, -1):
+                        self.length = (self.length << 7) | (self.header[index] & 0x7F)
+                    self.remaining = self.length
+                elif len(self.header) == 5:
+                    self.synced = False
+                    return messages
+            else:
+                take = min(self.remaining, size - position)
+                if self.head_open and len(self.head) < head_limit:
+                    self.head += view[position:position+min(take, head_limit-len(self.head))]
+                if take >= 2:
+                    self.tail = bytes(view[position+take-2:position+take])
+                else:
+                    self.tail = (self.tail + bytes(view[position:position+take]))[-2:]
+                position += take
+                self.remaining -= take
+            if self.remaining == 0:
+                messages.append(self.complete())
+        return messages
+
+    # Skips bytes of the stream that were not captured, returning the packet in case the gap completes it
+    def gap(self, length):
+        if self.synced is False or length <= 0:
+            return []
+        if self.remaining is not None and length <= self.remaining:
+            # The bytes after the gap are not contiguous with the beginning of the packet, so the head stops growing
+            self.head_open = False
+            self.tail = b""
+            self.remaining -= length
+            if self.remaining == 0:
+                return [self.complete()]
+            return []
+        self.synced = False
+        return []
+
+# TCP stream class, which puts the segments of one direction of a TCP connection in order before they are fed to the MQTT stream parser
+# Retransmitted bytes are ignored, and segments received after a missing one are held until it arrives (or the hold limit is reached)
+class TCPStream:
+    def __init__(self):
+        self.next_seq = None
+        self.pending = {}
+        self.parser = MQTTStream()
+
+    # Processes a segment of this direction, returning the list of (segment, message tuple) of every completed packet
+    def segment(self, segment):
+        if segment.flags & tcp_syn:
+            self.next_seq = (segment.seq + 1) & 0xFFFFFFFF
+            self.pending = {}
+            self.parser = MQTTStream()
+            return []
+        if segment.length == 0:
+            return []
+        if self.next_seq is None:
+            # The capture started in the middle of the connection, so the stream starts at the first segment seen
+            self.next_seq = segment.seq
+        messages = []
+        if seq_diff(segment.seq, self.next_seq) > 0:
+            self.pending[segment.seq] = segment
+            if len(self.pending) <= pending_limit:
+                return messages
+            # Too many segments held, so the missing bytes are assumed to be lost from the capture
+            earliest = min(self.pending, key=lambda seq: seq_diff(seq, self.next_seq))
+            messages += [(self.pending[earliest], message) for message in self.parser.gap(seq_diff(earliest, self.next_seq))]
+            self.next_seq = earliest
+        else:
+            messages += self.deliver(segment)
+        # Delivers all the held segments that are now in order
+        while self.pending:
+            earliest = min(self.pending, key=lambda seq: seq_diff(seq, self.next_seq))
+            if seq_diff(earliest, self.next_seq) > 0:
+                break
+            messages += self.deliver(self.pending.pop(earliest))
+        return messages
+
+    # Feeds the new bytes of an in order segment to the parser, skipping bytes already received and the bytes that were not captured
+    def deliver(self, segment):
+        skip = seq_diff(self.next_seq, segment.seq)
+        if skip >= segment.length:
+            return []
+        captured = len(segment.data)
+        messages = []
+        if skip < captured:
+            messages += self.parser.feed(segment.data[skip:] if skip > 0 else segment.data)
+        messages += self.parser.gap(segment.length - max(skip, captured))
+        self.next_seq = (segment.seq + segment.length) & 0xFFFFFFFF
+        return [(segment, message) for message in messages]
+
+# MQTT reassembler class, which keeps one TCP stream per direction of every TCP connection on the MQTT port
+class MQTTReassembler:
+    def __init__(self, port=1883):
+        self.port = port
+        self.streams = {}
+
+    # Processes a segment, returning the list of MQTTMessage objects completed by it
+    def segment(self, segment):
+        if segment.sport != self.port and segment.dport != self.port:
+            return []
+        flow = segment.flow()
+        stream = self.streams.get(flow)
+        if stream is None:
+            stream = self.streams[flow] = TCPStream()
+        return [MQTTMessage(last.timestamp, last, *message) for last, message in stream.segment(segment)]
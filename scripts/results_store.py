@@ -0,0 +1,167 @@
+# Import of all necessary packages and libraries
+import json
+import re
+import sqlite3
+
+# Results store of the dataset processor, an SQLite database that replaces the nested dataset_results.json and the execution details LUT
+# It has two tables:
+# - runs -> one row per run UUID, with the dimensions of the run (client amount, CPU performance, etc.) and its flags:
+#   complete (all repetitions were executed), done (first complete run of its dimensions, used in the results) and processed (capture files analyzed)
+# - manifest -> one row per log file already ingested, with its inode, size, modification time, the byte offset up to which it was parsed,
+#   the last run UUID found in it and the state of the parser at that offset, so only new files and appended lines are parsed
+# - results -> one row per (run UUID, repetition, client), with a copy of the dimensions of the run and a column for every metric
+# Dimension and metric columns are created the first time they are used, so new dimensions or metrics don't need any schema changes,
+# and every dimension column of the results table is indexed for the grouped queries
+# The database uses write-ahead logging, so it can be read while being written, and every write is done in a transaction
+
+# Dimensions of the runs, in the order used by the results queries and the remaining run checker
+dimensions = ("client_amount", "cpu_performance", "tcp_algorithm", "queue_size", "qos_level", "payload_size", "frequency")
+
+# Column names are used directly in the SQL statements, so only simple identifiers are accepted
+column_pattern = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+# Results store class, which keeps one connection to the database
+class ResultsStore:
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.row_factory = sqlite3.Row
+        self.columns = {}
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS runs (uuid TEXT PRIMARY KEY, complete INTEGER NOT NULL DEFAULT 0, done INTEGER NOT NULL DEFAULT 0, "
+                                    "processed INTEGER NOT NULL DEFAULT 0)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS results (uuid TEXT NOT NULL, repetition INTEGER NOT NULL, client TEXT NOT NULL, "
+                                    "PRIMARY KEY (uuid, repetition, client))")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS manifest (path TEXT PRIMARY KEY, inode INTEGER, size INTEGER, mtime INTEGER, "
+                                    "offset INTEGER, last_uuid TEXT, state TEXT)")
+            self.ensure_dimensions(dimensions)
+
+    # Gets the columns of a table, cached after the first call
+    def table_columns(self, table):
+        if table not in self.columns:
+            self.columns[table] = {row["name"] for row in self.connection.execute(f"PRAGMA table_info({table})")}
+        return self.columns[table]
+
+    # Adds the missing columns to a table, with the given SQL type
+    def ensure_columns(self, table, names, column_type):
+        for name in names:
+            if column_pattern.match(name) is None:
+                raise ValueError(f"Invalid column name {name}")
+            if name not in self.table_columns(table):
+                self.connection.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+                self.table_columns(table).add(name)
+
+    # Adds the missing dimension columns to both tables, and the indexes of the results table
+    def ensure_dimensions(self, names):
+        self.ensure_columns("runs", names, "TEXT")
+        self.ensure_columns("results", names, "TEXT")
+        for name in names:
+            self.connection.execute(f"CREATE INDEX IF NOT EXISTS results_{name} ON results ({name})")
+
+    # Inserts or updates a run, with its dimensions and/or flags (complete, done, processed)
+    def upsert_run(self, uuid, run_dimensions=None, **flags):
+        values = dict(run_dimensions or {})
+        values.update(flags)
+        with self.connection:
+            self.ensure_dimensions([name for name in (run_dimensions or {}) if name not in self.table_columns("runs")])
+            self.upsert("runs", ("uuid",), {"uuid": uuid, **values})
+
+    # Inserts or updates the metrics of a (run UUID, repetition, client) row
+    # In case the dimensions are not given, they are copied from the run, which must have been inserted before
+    def upsert_result(self, uuid, repetition, client, run_dimensions=None, **metrics):
+        with self.connection:
+            if run_dimensions is None:
+                run = self.run(uuid)
+                run_dimensions = {name: run[name] for name in self.dimension_columns()} if run is not None else {}
+            else:
+                self.ensure_dimensions([name for name in run_dimensions if name not in self.table_columns("results")])
+            self.ensure_columns("results", metrics, "REAL")
+            self.upsert("results", ("uuid", "repetition", "client"), {"uuid": uuid, "repetition": repetition, "client": client, **run_dimensions, **metrics})
+
+    # Builds and executes the upsert statement of a row, only updating the given columns in case the row already exists
+    def upsert(self, table, keys, values):
+        names = list(values)
+        updates = ", ".join(f"{name}=excluded.{name}" for name in names if name not in keys)
+        statement = f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' for name in names)}) ON CONFLICT ({', '.join(keys)}) "
+        statement += f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        self.connection.execute(statement, [values[name] for name in names])
+
+    # Gets the dimension columns of the runs table, including the ones added after the default dimensions
+    def dimension_columns(self):
+        return [name for name in self.table_columns("runs") if name not in ("uuid", "complete", "done", "processed")]
+
+    # Gets a run as a dictionary, or None in case it doesn't exist
+    def run(self, uuid):
+        row = self.connection.execute("SELECT * FROM runs WHERE uuid = ?", (uuid,)).fetchone()
+        return dict(row) if row is not None else None
+
+    # Gets the runs that match the given column values, as a list of dictionaries
+    def runs(self, **filters):
+        where, parameters = self.where(filters)
+        return [dict(row) for row in self.connection.execute(f"SELECT * FROM runs{where} ORDER BY rowid", parameters)]
+
+    # Builds the WHERE clause of the given column values
+    def where(self, filters, prefix=""):
+        for name in filters:
+            if column_pattern.match(name) is None:
+                raise ValueError(f"Invalid column name {name}")
+        if not filters:
+            return "", []
+        return " WHERE " + " AND ".join(f"{prefix}{name} = ?" for name in filters), list(filters.values())
+
+    # Calculates grouped aggregates of the given metrics, returning a list of dictionaries with the group columns and,
+    # for every metric, its mean, min, max and count (as <metric>_mean, <metric>_min, <metric>_max and <metric>_count)
+    # By default only the results of done runs are used, and the results can be filtered by any column (client="server", for example)
+    def aggregate(self, metrics, group_by=dimensions, done_only=True, **filters):
+        for name in list(metrics) + list(group_by):
+            if column_pattern.match(name) is None:
+                raise ValueError(f"Invalid column name {name}")
+        missing = [name for name in metrics if name not in self.table_columns("results")]
+        if missing:
+            raise ValueError(f"Unknown metrics {missing}")
+        columns = [f"results.{name} AS {name}" for name in group_by]
+        for name in metrics:
+            columns += [f"AVG(results.{name}) AS {name}_mean", f"MIN(results.{name}) AS {name}_min",
+                        f"MAX(results.{name}) AS {name}_max", f"COUNT(results.{name}) AS {name}_count"]
+        where, parameters = self.where(filters, "results.")
+        if done_only:
+            where += (" AND" if where else " WHERE") + " runs.done = 1"
+        statement = f"SELECT {', '.join(columns)} FROM results JOIN runs ON runs.uuid = results.uuid{where}"
+        if group_by:
+            statement += f" GROUP BY {', '.join(f'results.{name}' for name in group_by)} ORDER BY {', '.join(f'results.{name}' for name in group_by)}"
+        return [dict(row) for row in self.connection.execute(statement, parameters)]
+
+    # Gets the given columns of every result row, as a list of tuples, with the same filters as the aggregates
+    # Used by the statistics engine, which needs every repetition and not only the aggregates
+    def rows(self, columns, done_only=True, **filters):
+        for name in columns:
+            if column_pattern.match(name) is None:
+                raise ValueError(f"Invalid column name {name}")
+        missing = [name for name in columns if name not in self.table_columns("results")]
+        if missing:
+            raise ValueError(f"Unknown columns {missing}")
+        where, parameters = self.where(filters, "results.")
+        if done_only:
+            where += (" AND" if where else " WHERE") + " runs.done = 1"
+        statement = f"SELECT {', '.join(f'results.{name}' for name in columns)} FROM results JOIN runs ON runs.uuid = results.uuid{where}"
+        return [tuple(row) for row in self.connection.execute(statement + " ORDER BY results.rowid", parameters)]
+
+    # Gets the manifest entry of a log file as a dictionary, with the parser state already decoded, or None in case it was never ingested
+    def manifest_entry(self, path):
+        row = self.connection.execute("SELECT * FROM manifest WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["state"] = json.loads(entry["state"]) if entry["state"] else {}
+        return entry
+
+    # Inserts or updates the manifest entry of a log file, once it was parsed up to the given offset
+    def upsert_manifest(self, path, inode, size, mtime, offset, last_uuid, state):
+        with self.connection:
+            self.upsert("manifest", ("path",), {"path": path, "inode": inode, "size": size, "mtime": mtime, "offset": offset,
+                                                "last_uuid": last_uuid, "state": json.dumps(state)})
+
+    # Closes the connection to the database
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,104 @@
+import warnings
+import numpy
+
+# Statistics engine of the dataset processor, which calculates the statistics of every metric for every combination of dimensions with NumPy
+# Instead of one statistics.mean call per metric and group, the values of all groups are packed into a single matrix per metric
+# (one row per group, padded with NaN up to the biggest group), so every statistic is calculated for the whole dataset in a single call
+# The statistics of every metric are:
+# - count, mean, median, 5th/95th/99th percentiles and sample standard deviation
+# - bootstrap confidence interval of the mean (percentile method), with all the resamples of all the groups drawn at once
+# - outliers, flagged with the Tukey fences (below Q1 - 1.5 IQR or above Q3 + 1.5 IQR of their own group)
+statistic_names = ("count", "mean", "median", "p5", "p95", "p99", "std", "ci_low", "ci_high", "outliers")
+
+# Maximum amount of resampled values held in memory at once by the bootstrap, the groups are resampled in chunks below this size
+bootstrap_chunk = 8*1024*1024
+
+# Packs the values of every group into a matrix with one row per group, with the values at the start of the row and NaN after them
+# Missing values (NaN) are dropped before packing, so the count of every group is the amount of actual values
+# Also returns the count of every group and the (row, column) position of every value, used to map the outlier flags back to the values
+def group_matrix(group_index, values, group_amount):
+    values = numpy.asarray(values, dtype=numpy.float64)
+    group_index = numpy.asarray(group_index, dtype=numpy.int64)
+    valid = ~numpy.isnan(values)
+    order = numpy.flatnonzero(valid)[numpy.argsort(group_index[valid], kind="stable")]
+    groups = group_index[order]
+    counts = numpy.bincount(groups, minlength=group_amount)
+    starts = numpy.cumsum(counts) - counts
+    columns = numpy.arange(len(order)) - starts[groups]
+    matrix = numpy.full((group_amount, max(int(counts.max(initial=0)), 1)), numpy.nan)
+    matrix[groups, columns] = values[order]
+    return matrix, counts, order, columns
+
+# Calculates the bootstrap confidence interval of the mean of every row of a packed matrix
+# Every resample draws count values with replacement from the first count columns of its row, and the interval is taken from the
+# percentiles of the resampled means, so rows with less than 2 values get a NaN interval
+def bootstrap_interval(matrix, counts, resamples, confidence, generator):
+    group_amount, width = matrix.shape
+    low = numpy.full(group_amount, numpy.nan)
+    high = numpy.full(group_amount, numpy.nan)
+    chunk = max(bootstrap_chunk // (resamples*width), 1)
+    columns = numpy.arange(width)
+    for first in range(0, group_amount, chunk):
+        rows = numpy.arange(first, min(first+chunk, group_amount))
+        rows = rows[counts[rows] >= 2]
+        if len(rows) == 0:
+            continue
+        row_counts = counts[rows]
+        draws = (generator.random((len(rows), resamples, width)) * row_counts[:, None, None]).astype(numpy.int64)
+        resampled = matrix[rows[:, None, None], draws]
+        resampled = numpy.where(columns[None, None, :] < row_counts[:, None, None], resampled, 0)
+        means = resampled.sum(axis=2) / row_counts[:, None]
+        low[rows], high[rows] = numpy.percentile(means, [(100-confidence)/2, 100-(100-confidence)/2], axis=1)
+    return low, high
+
+# Calculates every statistic of every row of a packed matrix, returning a dictionary of arrays (one value per group)
+# and the outlier flag of every value of the matrix
+def matrix_statistics(matrix, counts, resamples=1000, confidence=95, generator=None):
+    generator = generator or numpy.random.default_rng(0)
+    with warnings.catch_warnings(), numpy.errstate(invalid="ignore", divide="ignore"):
+        # Groups without values (or with a single value, for the standard deviation) give NaN, without the NumPy warnings
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        result = {"count": counts, "mean": numpy.nanmean(matrix, axis=1), "median": numpy.nanmedian(matrix, axis=1)}
+        result["p5"], result["p95"], result["p99"], q1, q3 = numpy.nanpercentile(matrix, [5, 95, 99, 25, 75], axis=1)
+        result["std"] = numpy.nanstd(matrix, axis=1, ddof=1)
+        result["std"][counts < 2] = numpy.nan
+        iqr = q3 - q1
+        flags = (matrix < (q1 - 1.5*iqr)[:, None]) | (matrix > (q3 + 1.5*iqr)[:, None])
+    result["ci_low"], result["ci_high"] = bootstrap_interval(matrix, counts, resamples, confidence, generator)
+    result["outliers"] = flags.sum(axis=1)
+    return result, flags
+
+# Calculates the statistics of a single sample, such as the RTT values of a capture file, as a dictionary of rounded values
+# The bootstrap interval is not calculated, since the samples of a capture are not independent repetitions
+def sample_statistics(values, digits=3):
+    values = numpy.asarray(values, dtype=numpy.float64)
+    if len(values) == 0:
+        return None
+    p5, p50, p95, p99 = numpy.percentile(values, [5, 50, 95, 99])
+    result = {"mean": values.mean(), "median": p50, "p5": p5, "p95": p95, "p99": p99,
+              "std": values.std(ddof=1) if len(values) > 1 else numpy.nan}
+    return {name: round(float(value), digits) if not numpy.isnan(value) else None for name, value in result.items()}
+
+# Calculates the statistics of every metric of the results store, for every combination of the group columns, in a single pass
+# All the rows are loaded with one query, grouped once, and every metric is then calculated for all the groups at once
+# Returns a list of dictionaries with the group columns and, for every metric, its statistics (as <metric>_<statistic>, like the store aggregates),
+# and a list of the outlier values, as dictionaries with the run UUID, repetition, client, metric and value
+def dataset_statistics(store, metrics, group_by, done_only=True, resamples=1000, confidence=95, seed=0, **filters):
+    rows = store.rows(("uuid", "repetition", "client") + tuple(group_by) + tuple(metrics), done_only, **filters)
+    groups = {}
+    group_index = numpy.fromiter((groups.setdefault(tuple(row[3:3+len(group_by)]), len(groups)) for row in rows), dtype=numpy.int64, count=len(rows))
+    generator = numpy.random.default_rng(seed)
+    results = [dict(zip(group_by, key)) for key in groups]
+    outliers = []
+    for metric_index, metric in enumerate(metrics):
+        column = 3 + len(group_by) + metric_index
+        values = numpy.fromiter((row[column] if row[column] is not None else numpy.nan for row in rows), dtype=numpy.float64, count=len(rows))
+        matrix, counts, order, columns = group_matrix(group_index, values, len(groups))
+        statistics, flags = matrix_statistics(matrix, counts, resamples, confidence, generator)
+        for name in statistic_names:
+            for group, value in enumerate(statistics[name].tolist()):
+                results[group][f"{metric}_{name}"] = value if value == value else None
+        for position in numpy.flatnonzero(flags[group_index[order], columns]).tolist():
+            row = rows[order[position]]
+            outliers.append({"uuid": row[0], "repetition": row[1], "client": row[2], "metric": metric, "value": row[column]})
+    return results, outliers
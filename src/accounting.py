@@ -0,0 +1,52 @@
+# Import of all necessary packages and libraries
+import re
+from array import array
+
+# Sequence tracker class, used by the server to account for every message of a run by its sequence number, as soon as it is received
+# For every client there is a preallocated slot of msg_amount bytes, with the amount of times each sequence number was received (up to 255)
+# With this, the server can report lost, duplicate and reordered messages at the end of every repetition, without the need of the capture files
+class SequenceTracker:
+    def __init__(self, client_amount, msg_amount):
+        self.client_amount = client_amount
+        self.msg_amount = msg_amount
+        self.counts = bytearray(client_amount*msg_amount)
+        self.delivered = array('q', bytes(8*client_amount))
+        self.highest = array('q', [-1])*client_amount
+        self.reordered = array('q', bytes(8*client_amount))
+        self.out_of_range = 0
+
+    # Records the delivery of a sequence number for a client slot
+    # A first delivery with a sequence number lower than the highest one already received from that client counts as a reordered message
+    def record(self, slot, sequence):
+        if sequence < 0 or sequence >= self.msg_amount:
+            self.out_of_range += 1
+            return
+        index = slot*self.msg_amount + sequence
+        count = self.counts[index]
+        if count < 255:
+            self.counts[index] = count + 1
+        self.delivered[slot] += 1
+        if count == 0:
+            if sequence < self.highest[slot]:
+                self.reordered[slot] += 1
+            else:
+                self.highest[slot] = sequence
+
+    # Gets the ranges of sequence numbers that were never received from a client slot, as a list of (first, last) tuples
+    def missing_ranges(self, slot):
+        client_counts = self.counts[slot*self.msg_amount:(slot+1)*self.msg_amount]
+        return [(match.start(), match.end()-1) for match in re.finditer(b"\x00+", client_counts)]
+
+    # Calculates the totals of a client slot, as a tuple of (unique, missing, duplicates, reordered)
+    def client_summary(self, slot):
+        missing = self.counts.count(0, slot*self.msg_amount, (slot+1)*self.msg_amount)
+        unique = self.msg_amount - missing
+        return unique, missing, self.delivered[slot] - unique, self.reordered[slot]
+
+# Formats a list of missing ranges into a short string for the logs, such as "10-15, 200, 340-341"
+# Only the first few ranges are shown, to avoid huge log lines for runs with high loss
+def format_ranges(ranges, limit=20):
+    text = ", ".join(f"{first}" if first == last else f"{first}-{last}" for first, last in ranges[:limit])
+    if len(ranges) > limit:
+        text += f", ... ({len(ranges)-limit} more ranges)"
+    return text
@@ -0,0 +1,183 @@
+# Import of all necessary packages and libraries
+import hashlib
+import json
+import os
+import queue
+import threading
+import zipfile
+import campaign
+# The zstd and lz4 codecs are optional, and only needed when selected in the config file (and by the dataset processor to read their captures)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Size of the chunks in which the capture files are read, compressed and verified
+chunk_size = 1024*1024
+
+# Codecs of the capture files, with the extension added to the name of the zip member:
+# - deflate -> regular zip compression, readable by any zip tool, but the slowest
+# - stored -> no compression, the capture file is only moved into the zip file
+# - zstd/lz4 -> the capture file is compressed as a zstd or lz4 frame, much faster than deflate, stored in the zip file without zip compression
+codec_extensions = {"deflate": "", "stored": "", "zstd": ".zst", "lz4": ".lz4"}
+
+# Checks if a codec can be used, since zstd and lz4 need their packages to be installed
+def codec_available(codec):
+    if codec == "zstd":
+        return zstandard is not None
+    if codec == "lz4":
+        return lz4 is not None
+    return codec in codec_extensions
+
+# Opens a zip member for reading, decompressing zstd and lz4 frames on the fly according to the extension of the member
+def open_member(open_zip, name):
+    member = open_zip.open(name)
+    if name.endswith(".zst"):
+        return zstandard.ZstdDecompressor().stream_reader(member, closefd=True)
+    if name.endswith(".lz4"):
+        return lz4.frame.LZ4FrameFile(member, "rb")
+    return member
+
+# Opens a writer for a zip member, compressing the written data with the codec
+def open_writer(member, codec, level):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).stream_writer(member, closefd=False)
+    if codec == "lz4":
+        return lz4.frame.LZ4FrameFile(member, "wb", compression_level=level)
+    return member
+
+# Removes a member from a zip file, by streaming every other member to a new zip file which then replaces the original one
+def remove_member(zip_path, name):
+    with zipfile.ZipFile(zip_path, "r") as open_zip:
+        if name not in open_zip.namelist():
+            return
+        with zipfile.ZipFile(zip_path + ".tmp", "w") as new_zip:
+            for info in open_zip.infolist():
+                if info.filename != name:
+                    with open_zip.open(info) as source, new_zip.open(info, "w", force_zip64=True) as destination:
+                        for chunk in iter(lambda: source.read(chunk_size), b""):
+                            destination.write(chunk)
+    os.replace(zip_path + ".tmp", zip_path)
+
+# Adds a capture file to a zip file with the codec, and verifies it by reading it back from the zip file, returning the name of the zip member
+# The SHA-256 of the capture file is calculated while it is compressed, and compared with the SHA-256 of the decompressed member
+# The capture file is only deleted once the member is verified, otherwise the member is removed from the zip file (so it is never read
+# as a valid capture), an OSError is raised and the capture file is kept
+def archive_capture(zip_path, capture_path, codec="deflate", level=None):
+    name = os.path.basename(capture_path) + codec_extensions[codec]
+    compression = zipfile.ZIP_DEFLATED if codec == "deflate" else zipfile.ZIP_STORED
+    capture_hash = hashlib.sha256()
+    member_hash = hashlib.sha256()
+    try:
+        with zipfile.ZipFile(zip_path, "a", compression, compresslevel=level if codec == "deflate" else None) as open_zip:
+            with open(capture_path, "rb") as capture, open_zip.open(name, "w", force_zip64=True) as member:
+                writer = open_writer(member, codec, level if level is not None else 3)
+                for chunk in iter(lambda: capture.read(chunk_size), b""):
+                    capture_hash.update(chunk)
+                    writer.write(chunk)
+                if writer is not member:
+                    writer.close()
+        with zipfile.ZipFile(zip_path, "r") as open_zip:
+            with open_member(open_zip, name) as member:
+                for chunk in iter(lambda: member.read(chunk_size), b""):
+                    member_hash.update(chunk)
+    except Exception as error:
+        remove_member(zip_path, name)
+        raise OSError(f"Archiving of {name} in {os.path.basename(zip_path)} failed ({error}), keeping {os.path.basename(capture_path)}")
+    if member_hash.digest() != capture_hash.digest():
+        remove_member(zip_path, name)
+        raise OSError(f"Verification of {name} in {os.path.basename(zip_path)} failed, keeping {os.path.basename(capture_path)}")
+    os.remove(capture_path)
+    return name
+
+# Archiver class, used by the client and the server to compress the capture files in the background, so the next repetition can start right away
+# Capture files are queued and compressed by a pool of worker threads (compression releases the GIL, so the threads run in parallel)
+# Every zip file has its own lock, since zip files can't be appended by more than one writer at the same time, while different zip files
+# are compressed in parallel
+# The log function is called with (level, message) from the worker threads, once a capture file is archived or fails
+# The queued capture files are kept in a journal file until they are archived, so the capture files left by an interrupted execution
+# (still queued, or failed) are queued again once the archiver is started with the same journal
+class Archiver:
+    def __init__(self, codec, level, workers, log, journal_path=None):
+        self.codec = codec
+        self.level = level
+        self.log = log
+        self.queue = queue.Queue()
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+        self.journal_path = journal_path
+        self.journal = []
+        self.journal_lock = threading.Lock()
+        self.workers = [threading.Thread(target = self.worker, args = (), daemon = True) for worker in range(max(workers, 1))]
+        for worker in self.workers:
+            worker.start()
+        for zip_path, capture_path in self.journal_load():
+            if os.path.isfile(capture_path):
+                self.log("info", f"Queued {os.path.basename(capture_path)} left from a previous execution to be zipped into {os.path.basename(zip_path)}")
+                self.submit(zip_path, capture_path)
+        self.journal_save()
+
+    # Loads the capture files of the journal, as a list of (zip path, capture path) pairs, or an empty list without a valid journal
+    def journal_load(self):
+        if self.journal_path is None or not os.path.isfile(self.journal_path):
+            return []
+        try:
+            with open(self.journal_path, "r") as journal_file:
+                return [tuple(job) for job in json.load(journal_file)]
+        except (OSError, ValueError, TypeError):
+            return []
+
+    # Saves the journal atomically, so an interruption at any point leaves a complete journal
+    def journal_save(self):
+        if self.journal_path is None:
+            return
+        with self.journal_lock:
+            campaign.atomic_write(self.journal_path, json.dumps(self.journal))
+
+    # Gets the lock of a zip file, creating it in case it doesn't exist
+    def zip_lock(self, zip_path):
+        with self.locks_lock:
+            return self.locks.setdefault(zip_path, threading.Lock())
+
+    # Queues a capture file to be added to a zip file, returning right away
+    def submit(self, zip_path, capture_path):
+        with self.journal_lock:
+            self.journal.append([zip_path, capture_path])
+        self.journal_save()
+        self.queue.put((zip_path, capture_path))
+
+    # Gets the amount of capture files waiting to be (or being) archived
+    def pending(self):
+        return self.queue.unfinished_tasks
+
+    # Worker thread, which archives the queued capture files until it gets None
+    def worker(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                return
+            zip_path, capture_path = job
+            try:
+                with self.zip_lock(zip_path):
+                    name = archive_capture(zip_path, capture_path, self.codec, self.level)
+                self.log("info", f"Archived and verified {name} in {os.path.basename(zip_path)}")
+                with self.journal_lock:
+                    self.journal.remove([zip_path, capture_path])
+                self.journal_save()
+            except Exception as error:
+                self.log("error", f"Could not archive {os.path.basename(capture_path)}: {error}")
+            self.queue.task_done()
+
+    # Waits for every queued capture file to be archived and stops the worker threads
+    # Should always be called before exiting (even when interrupted), since the worker threads don't keep the process alive,
+    # and a zip file left in the middle of an append loses every member it had
+    def close(self):
+        for worker in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
@@ -0,0 +1,81 @@
+# Import of all necessary packages and libraries
+import hashlib
+import json
+import os
+
+# Writes a file atomically, so a crash at any point leaves either the previous or the new content, never a partial file
+# The content is written to a temporary file and synced to disk, which then replaces the original file, and the directory is synced
+# so the rename itself is durable
+def atomic_write(path, content):
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as temporary_file:
+        temporary_file.write(content)
+        temporary_file.flush()
+        os.fsync(temporary_file.fileno())
+    os.replace(temporary_path, path)
+    directory = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+# Calculates the identifier of a run plan, used to only resume a campaign with the exact same runs in the same order
+def plan_id(run_plan):
+    return hashlib.sha256(json.dumps(run_plan, sort_keys=True).encode()).hexdigest()
+
+# Campaign state class, used by the server to keep the progress of an execution in a file, updated after every valid repetition
+# The state holds, for every started run of the plan, its UUID and the completed repetitions with the metrics tracked for convergence,
+# as well as the index of the current run, so a restarted server resumes exactly where it stopped, with the same run UUID
+# (and therefore the same zip files), without repeating any finished repetition
+# The state is only resumed for the same run plan, a different plan (or a finished campaign) starts a new campaign
+class CampaignState:
+    def __init__(self, path, run_plan):
+        self.path = path
+        self.plan = plan_id(run_plan)
+        self.resumed = False
+        self.state = None
+        if os.path.isfile(path):
+            try:
+                with open(path, "r") as state_file:
+                    state = json.load(state_file)
+                if state.get("plan") == self.plan and state.get("finished") is False:
+                    self.state = state
+                    self.resumed = True
+            except (OSError, ValueError):
+                self.state = None
+        if self.state is None:
+            self.state = {"plan": self.plan, "finished": False, "current_run": 0, "runs": {}}
+
+    # Saves the state to the campaign file
+    def save(self):
+        atomic_write(self.path, json.dumps(self.state, indent=1))
+
+    # Gets the index of the run the campaign should continue from
+    def current_run(self):
+        return self.state["current_run"]
+
+    # Gets the state of a run, as a dictionary with its UUID, its completed repetitions and if it's complete, or None in case it wasn't started
+    def run_state(self, run):
+        return self.state["runs"].get(str(run))
+
+    # Records the start of a run with its UUID
+    def run_started(self, run, run_uuid):
+        self.state["runs"][str(run)] = {"uuid": run_uuid, "repetitions": [], "last": False}
+        self.save()
+
+    # Records a completed repetition of a run, with its tracked metrics and if it was the last repetition of the run
+    def repetition_done(self, run, repetition, metrics, last):
+        run_state = self.state["runs"][str(run)]
+        run_state["repetitions"].append({"repetition": repetition, "metrics": metrics})
+        run_state["last"] = last
+        self.save()
+
+    # Records the end of a run, moving the campaign to the next one
+    def run_done(self, run):
+        self.state["current_run"] = run + 1
+        self.save()
+
+    # Records the end of the campaign, so the next execution starts a new one
+    def campaign_done(self):
+        self.state["finished"] = True
+        self.save()
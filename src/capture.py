@@ -0,0 +1,78 @@
+# Import of all necessary packages and libraries
+import glob
+import os
+import subprocess
+import threading
+import payload
+
+# Largest headers that can come before the MQTT packet in a captured frame: Ethernet with a VLAN tag, and IPv4 and TCP with all their options
+link_header_size = 14 + 4
+network_header_size = 60
+transport_header_size = 60
+
+# Calculates the snaplen that keeps every header needed by the dataset processor, in case the PUBLISH packet is at the start of the TCP segment:
+# - link, IP and TCP headers (with options, for the TCP RTT and the reassembly)
+# - MQTT fixed header (type, flags and up to 4 bytes of remaining length), topic (length and name) and packet id
+# - payload header, with the sequence number and send time
+# Payloads are cut right after the header, which removes almost all the bytes of the big payloads from the capture
+def header_snaplen(topic_length):
+    return link_header_size + network_header_size + transport_header_size + 5 + 2 + topic_length + 2 + payload.header_size
+
+# Builds the Dumpcap options of a capture profile, returning the capture filter and the extra options of the profile
+# A capture profile is a dictionary with:
+# - snaplen -> None to capture full packets, "header" to only keep the headers (see header_snaplen), or a fixed amount of bytes
+# - ring_filesize/ring_files -> None, or the size (in KB) after which Dumpcap switches to a new file and the maximum amount of files
+#   (with a maximum amount of files, the oldest files are deleted, so it should only be used when losing the start of the capture is acceptable)
+# - filters -> None to use the default capture filter, or a list with the capture filter of every QoS level
+def profile_options(profile, qos, topic_length, default_filter):
+    options = []
+    if profile['snaplen'] == "header":
+        options += ["-s", str(header_snaplen(topic_length))]
+    elif profile['snaplen'] is not None:
+        options += ["-s", str(profile['snaplen'])]
+    if profile['ring_filesize'] is not None:
+        options += ["-b", f"filesize:{profile['ring_filesize']}"]
+    if profile['ring_files'] is not None:
+        options += ["-b", f"files:{profile['ring_files']}"]
+    capture_filter = profile['filters'][qos] if profile['filters'] is not None else default_filter
+    return capture_filter, options
+
+# Gets the files written by a Dumpcap capture, in the order they were written
+# With a ring buffer, Dumpcap writes numbered files named after the output file (name_00001_YYYYMMDDhhmmss.ext) instead of the output file itself
+def capture_files(path):
+    if os.path.isfile(path):
+        return [path]
+    root, extension = os.path.splitext(path)
+    return sorted(glob.glob(glob.escape(root) + "_*" + extension))
+
+# Dumpcap capture class, used by the client and the server to start a Dumpcap capture and know when it is actually capturing packets
+# Dumpcap writes "Capturing on '<interface>'" to its standard error once the capture is running, which is read by a small thread
+# The same thread keeps reading the standard error until Dumpcap exits, so the pipe never fills up and blocks the capture
+class DumpcapCapture:
+    def __init__(self, dumpcap_call):
+        self.process = subprocess.Popen(dumpcap_call, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        self.capturing = threading.Event()
+        self.reader = threading.Thread(target = self.stderr_reader, args = (), daemon = True)
+        self.reader.start()
+
+    # Reads the standard error of Dumpcap line by line, and signals as soon as the capture is running
+    def stderr_reader(self):
+        for line in self.process.stderr:
+            if "Capturing on" in line:
+                self.capturing.set()
+        self.process.stderr.close()
+
+    # Waits until Dumpcap is capturing, returning False in case it doesn't start within the timeout or exits before that
+    def wait_capturing(self, timeout):
+        return self.capturing.wait(timeout) and self.process.poll() is None
+
+    # Checks if the Dumpcap process is still running, returning None if it is (same as the Popen poll)
+    def poll(self):
+        return self.process.poll()
+
+    # Stops the capture and waits for Dumpcap to exit, which guarantees the capture file is complete and closed
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+        self.process.wait()
+        self.reader.join()
@@ -7,10 +7,16 @@ import logging
 import sys
 import netifaces
 import threading
+import multiprocessing
 import os
-import pause
-import subprocess
-import zipfile
+import payload
+import pacing
+import recorder
+import latency
+import capture
+import archiver
+import results
+import telemetry
 
 # Reads the configuration file, and imports it into a dictionary, which includes information about:
 # - Logging paths and names
@@ -21,32 +27,47 @@ with open("conf/config.json", "r") as config_file:
     config = json.load(config_file)
 
 # Stores all static variables needed from the configuration dictionary, adapted to the client
-# Also calculates the client-id using the local IP address of the Ethernet network adapter, to be used in the MQTT client
+# Also calculates the host number using the local IP address of the Ethernet network adapter, which is used to calculate the client-id of the MQTT clients
 dumpcap_interface = config['dumpcap']['interface']['client']
-client_number = int(netifaces.ifaddresses(dumpcap_interface)[netifaces.AF_INET][0]['addr'][-1])
-client_id = "client-"+ str(client_number)
-log_folder = str(config['logging']['folder']).replace("#", client_id)
+host_number = int(netifaces.ifaddresses(dumpcap_interface)[netifaces.AF_INET][0]['addr'][-1])
+client_hosts = config['virtual_clients']['hosts']
+virtual_amount = config['virtual_clients']['amount']
+virtual_workers = config['virtual_clients']['workers']
 main_logger = config['logging']['main']
 timestamp_logger = config['logging']['timestamp']
 broker_address = config['broker_address']
-main_topic = str(config['topics']['main_topic']).replace("#", client_id)
 begin_client = config['topics']['begin_client']
 void_run = config['topics']['void_run']
 finish_client = config['topics']['finish_client']
 client_done = config['topics']['client_done']
+clock_ping = config['topics']['clock_ping']
+clock_pong = config['topics']['clock_pong']
+client_ready = config['topics']['client_ready']
+start_publish = config['topics']['start_publish']
+run_drained = config['topics']['run_drained']
 dumpcap_enabled = config['dumpcap']['enable']
-dumpcap_folder = str(config['dumpcap']['folder']).replace("#", client_id)
 dumpcap_filter = config['dumpcap']['filter']
+dumpcap_profile = config['dumpcap']['profile']
+dumpcap_profiles = config['dumpcap']['profiles']
 dumpcap_ext = config['dumpcap']['extension']
 dumpcap_buffer = config['dumpcap']['buffer_size']
+compression_codec = config['dumpcap']['compression']['codec']
+compression_level = config['dumpcap']['compression']['level']
+compression_workers = config['dumpcap']['compression']['workers']
 rtx_times = config['rtx_times']
+ready_timeout = config['drain']['ready_timeout']
+connect_retry = config['drain']['connect_retry']
+pacing_policy = config['pacing']['policy']
+pacing_spin_time = config['pacing']['spin_time']
+host_telemetry_enabled = config['telemetry']['host']['enable']
+host_interval = config['telemetry']['host']['interval']
 
 # Class of the MQTT client code
 class MQTT_Client:
     # Configures all the loggers to log and store every execution detail in appropriate files for future analysis
     # There are a total of two distinct loggers:
     # main_logger - used for all normal execution logging, regarding execution information and results reporting
-    # timestamp_logger - used to have an output of all timestamps of messages published to the broker
+    # timestamp_logger - used to keep track of the binary timestamp files of every run, which hold the timestamps of messages published to the broker
     def logger_setup(self):
         # Gathers current GMT/UTC datetime in string format, to append to the logger file name
         # This will allow distinction between different runs, as well as make it easy to locate the parity between client and server
@@ -56,45 +77,52 @@ class MQTT_Client:
         formatter = logging.Formatter('[%(asctime)s] %(levelname)s: %(message)s')
         formatter.converter = time.gmtime
         # Setup of the file handler, to output the logging into the propperly named files
-        main_log = log_folder + client_id + "-main-T" + str(append_time) + ".log"
+        main_log = self.log_folder + self.client_id + "-main-T" + str(append_time) + ".log"
         main_handler = logging.FileHandler(main_log, mode = 'a')
         main_handler.setFormatter(formatter)
-        self.main_logger = logging.getLogger(main_logger)
+        self.main_logger = logging.getLogger(f"{main_logger}-{self.client_id}")
         self.main_logger.setLevel(logging.DEBUG)
         self.main_logger.addHandler(main_handler)
-        timestamp_log = log_folder + client_id + "-timestamp-T" + str(append_time) + ".log"
+        timestamp_log = self.log_folder + self.client_id + "-timestamp-T" + str(append_time) + ".log"
         timestamp_handler = logging.FileHandler(timestamp_log, mode = 'a')
         timestamp_handler.setFormatter(formatter)
-        self.timestamp_logger = logging.getLogger(timestamp_logger)
+        self.timestamp_logger = logging.getLogger(f"{timestamp_logger}-{self.client_id}")
         self.timestamp_logger.setLevel(logging.DEBUG)
         self.timestamp_logger.addHandler(timestamp_handler)
         # An additional handler is added, for terminal output of the main logger, along with the file output
         # This is useful for the user to keep track of the execution status of a run without having to open the log files (very useful in SSH)
-        stdout_handler = logging.StreamHandler(sys.stdout)
-        stdout_handler.setFormatter(formatter)
-        self.main_logger.addHandler(stdout_handler)
+        # When running virtual clients, only the first client of the host outputs to the terminal, to keep it readable
+        if self.capture_owner is True:
+            stdout_handler = logging.StreamHandler(sys.stdout)
+            stdout_handler.setFormatter(formatter)
+            self.main_logger.addHandler(stdout_handler)
         # self.timestamp_logger.addHandler(stdout_handler)
 
     # Callback for when the client object successfully connects to the broker with specified address
     def on_connect(self, client, userdata, flags, rc):
         if rc==0:
             # Upon successful connection to the broker, the client does the following:
-            # - defines too needed variables, for the zip file of the network capture files, and to signal if it's connected (for the cleanup)
+            # - defines a needed variable, to signal if it's connected (for the cleanup)
             # - subscribes to the begin_client and finish_client topics, used to receive orders from the server
             self.main_logger.info(f"Connected to the broker at {broker_address}")
             self.mqtt_connected = True
             self.connect_count += 1
-            self.zip = None
             self.client.subscribe(begin_client, qos=0)
             self.main_logger.info(f"Subscribed to {begin_client} topic with QoS 0")
             self.client.subscribe(finish_client, qos=0)
             self.main_logger.info(f"Subscribed to {finish_client} topic with QoS 0")
             self.client.subscribe(void_run, qos=0)
             self.main_logger.info(f"Subscribed to {void_run} topic with QoS 0")
+            self.client.subscribe(clock_ping, qos=0)
+            self.main_logger.info(f"Subscribed to {clock_ping} topic with QoS 0")
+            self.client.subscribe(start_publish, qos=0)
+            self.main_logger.info(f"Subscribed to {start_publish} topic with QoS 0")
+            self.client.subscribe(run_drained, qos=0)
+            self.main_logger.info(f"Subscribed to {run_drained} topic with QoS 0")
             # If the client reconnects to the broker, it sends a void run message to all clients and the server, which allows this run to be discarded
             if self.connect_count > 1:
                 self.main_logger.warning(f"Client reconnected to broker, telling server to void current run")
-                self.client.publish(void_run, payload=client_id, qos=0)
+                self.client.publish(void_run, payload=self.client_id, qos=0)
                 self.void_run = True
         else:
             # In case of error during connection the log will contain the error code for debugging
@@ -110,18 +138,34 @@ class MQTT_Client:
 
     # Callback for the when the client object successfully completes the publish of a message (including necessary handshake for QoS levels 1 and 2)
     def on_publish(self, client, userdata, mid):
+        # Only the messages of the publish loop are counted, control messages published outside of it (ready, clock pong, done) are ignored
+        if self.publish_counting is False:
+            return
         # For every run, the client contains an internal counter of published messages, used for internal measurements
         self.sent_counter += 1
         # Upon the first message published in each run, the client measures datetime at that point
         if self.sent_counter == 1:
             self.publish_begin = datetime.datetime.now()
-        self.timestamp_logger.info(f"Published message #{self.sent_counter} to the {main_topic} topic")
+        # The publish timestamp is stored in the timestamp recorder, which is only written to a file at the end of the run
+        # The completions of QoS 1 and 2 messages arrive out of order, so the sequence number of the message is taken from its message id,
+        # which the publish loop stores once the publish call returns
+        # For QoS 0, the publish can complete inside the publish call, before its sequence number is known, so it is filled in by the publish loop
+        done_time = time.monotonic_ns()
+        with self.sequence_lock:
+            sequence = self.mid_sequences.pop(mid, None)
+            index = self.timestamp_recorder.record(-1 if sequence is None else sequence, recorder.event_published, self.client_number, done_time)
+            if sequence is None:
+                self.mid_indexes[mid] = index
+        # The completion time is also given to the handshake tracker, to calculate how long the publish of this message id took to complete
+        self.handshake_tracker.completed(mid, done_time)
         # When all messages are published to the broker, a the final datetime is measured, in order to have a client-side publish time
         # Changes the pub_complete flag to true in order to make the client proceed
         if self.sent_counter == self.msg_amount:
             self.publish_end = datetime.datetime.now()
             self.main_logger.info(f"Publish of all {self.msg_amount} messages complete")
             self.pub_complete = True
+            self.publish_counting = False
+            self.publish_event.set()
 
     # Callback for when the client receives a message on the topic begin client
     def on_beginclient(self, client, userdata, msg):
@@ -133,12 +177,22 @@ class MQTT_Client:
         # In order to help with run automation, the clients use one variable from the run configuration to check if they will be used for the received run
         # That variable is the client_amount, which indicates how many clients are used to this run
         # Since all clients have the same nomenclature (client-X), and start from 0, a quick string comparison can be used to check if the client will be used or not
-        self.main_logger.info(f"Verifying if {client_id} will be used for this run")
+        self.main_logger.info(f"Verifying if {self.client_id} will be used for this run")
         client_amount = int(client_config['client_amount'])
-        if client_number >= client_amount:
+        # The server resends the start order until every client is ready, so the same order can be received more than once
+        # In that case, the client only repeats the ready message, if it is already capturing
+        run_key = (client_config['uuid'], client_config['repetition'])
+        if self.client_number >= client_amount:
             # This client is not going to be used for this run, skipping
-            self.main_logger.info(f"{client_id} will not be used for this run, skipping and waiting for next start order")
-        elif client_number < client_amount:
+            self.main_logger.info(f"{self.client_id} will not be used for this run, skipping and waiting for next start order")
+        elif run_key == self.run_key:
+            self.main_logger.info(f"Start order already received for this run")
+            if self.client_ready is True and self.start_event.is_set() is False:
+                self.publish_ready()
+        elif self.run_thread is not None and self.run_thread.is_alive():
+            # If the previous run is still being finished (compressing the capture file, for example), the order is ignored and the client waits for it to be resent
+            self.main_logger.warning(f"Previous run is still finishing, waiting for the start order to be resent")
+        elif self.client_number < client_amount:
             # This client is going to be used for this run, proceeding as normal
             # Every run has a unique UUID for easier identification in the logs. Every repetition has the same UUID
             self.run_uuid = client_config['uuid']
@@ -149,15 +203,21 @@ class MQTT_Client:
             self.timestamp_logger.info(f"STARTING NEW RUN")
             self.timestamp_logger.info(f"Run UUID: {self.run_uuid}")
             # Declares the thread where the run handler function will run. Has to be done everytime a new run is received
-            self.run_thread = None
+            # Also creates the events used to signal the thread of the start order, of the publish completion and of the end of the run
+            self.run_key = run_key
+            self.client_ready = False
+            self.start_event = threading.Event()
+            self.publish_event = threading.Event()
+            self.drained_event = threading.Event()
             self.run_thread = threading.Thread(target = self.run_handler, args = ())
             # Stores all needed run message settings, as well as calculates sleep periods for normal publish
             self.run_repetition = client_config['repetition']
+            self.main_logger.info(f"Run repetition: {self.run_repetition+1}")
+            self.client_amount = client_amount
             self.msg_qos = client_config['msg_qos']
             self.msg_amount = client_config['msg_amount']
             self.msg_size = client_config['msg_size']
             self.msg_freq = client_config['msg_freq']
-            self.sleep_time = (1000000/self.msg_freq)+20
             self.rtx_sleep = rtx_times[self.msg_qos]
             self.sent_counter = 0
             self.void_run = False
@@ -171,9 +231,10 @@ class MQTT_Client:
             # - SX -> indicates the payload size of each message published for this run
             # - FX -> indicates the publish frequency used for this run
             # Creates the logs folder in case it doesn't exist
-            if dumpcap_enabled is True:
-                os.makedirs(dumpcap_folder.replace("*C", f"{client_amount}C"), exist_ok=True)
-                self.basename = dumpcap_folder.replace("*C", f"{client_amount}C") + client_id + "-Q" + str(self.msg_qos) + "-A" + str(self.msg_amount) + \
+            # When running virtual clients, only the first client of the host performs the capture, as it includes the traffic of all clients in the host
+            if self.capture_enabled is True:
+                os.makedirs(self.dumpcap_folder.replace("*C", f"{client_amount}C"), exist_ok=True)
+                self.basename = self.dumpcap_folder.replace("*C", f"{client_amount}C") + self.client_id + "-Q" + str(self.msg_qos) + "-A" + str(self.msg_amount) + \
                     "-S" + str(int(self.msg_size)) + "-F" + str(self.msg_freq)
                 # On the zip file, the run UUID and propper extension is added
                 self.zip_file =  self.basename + "-U" + self.run_uuid + ".zip"
@@ -188,19 +249,27 @@ class MQTT_Client:
                 # Using the Subprocess module, starts a Dumpcap capture with the following options:
                 # - interface -> taken from the config file, usually eth0
                 # - capture filter -> taken from the config file, should be "tcp port 1883" to only capture traffic on this port and protocol
+                #   the capture profile can have a tighter filter for each QoS level
                 # - output file -> defined before the thread was started, is the file name to which the capture will be output
-                # - duration -> the amount of time the sniffing will run, calculated from the expected time and extra setup delays
+                # - duration -> the maximum amount of time the sniffing will run, calculated from the expected time and extra setup delays
+                #   the capture is normally stopped earlier, once the server informs the run is drained
                 # - buffer size -> in order to avoid publish interruptions due to disk writing of the packets, a big buffer is defined in order to store in memory before writing
-                sniff_duration = (self.msg_amount/self.msg_freq)+self.rtx_sleep
+                # - capture profile options -> snaplen (to only keep the headers of every packet) and ring buffer file rotation
+                #   the capture profile is sent by the server, and the snaplen is calculated for the longest topic of the run, since virtual clients share the capture
+                sniff_duration = (self.msg_amount/self.msg_freq)+self.rtx_sleep+ready_timeout
+                capture_profile = client_config.get('capture_profile', dumpcap_profile if type(dumpcap_profile) != list else "full")
+                topic_length = len(str(config['topics']['main_topic']).replace("#", f"client-{client_amount-1}"))
+                capture_filter, profile_options = capture.profile_options(dumpcap_profiles[capture_profile], self.msg_qos, topic_length, dumpcap_filter)
                 self.main_logger.info(f"Setting up Dumpcap capture")
                 self.main_logger.info(f"Interface: {dumpcap_interface}")
-                self.main_logger.info(f"Capture filter: {dumpcap_filter}")
+                self.main_logger.info(f"Capture profile: {capture_profile} {' '.join(profile_options)}")
+                self.main_logger.info(f"Capture filter: {capture_filter}")
                 self.main_logger.info(f"Capture file: {os.path.basename(self.dumpcap_file)}")
                 self.main_logger.info(f"Sniffing duration: {round(sniff_duration,2)} seconds")
-                dumpcap_call = ["dumpcap", "-i", dumpcap_interface, "-P", "-f", dumpcap_filter,
-                                "-a", f"duration:{sniff_duration}", "-B", str(dumpcap_buffer), "-w", self.dumpcap_file]
-                self.dumpcap_subprocess = subprocess.Popen(dumpcap_call, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                if self.dumpcap_subprocess.poll() is None:
+                dumpcap_call = ["dumpcap", "-i", dumpcap_interface, "-P", "-f", capture_filter, "-a", f"duration:{sniff_duration}",
+                                "-B", str(dumpcap_buffer)] + profile_options + ["-w", self.dumpcap_file]
+                self.dumpcap_capture = capture.DumpcapCapture(dumpcap_call)
+                if self.dumpcap_capture.poll() is None:
                     self.main_logger.info(f"Dumpcap capture successfully started")
             self.run_thread.start()
 
@@ -216,7 +285,45 @@ class MQTT_Client:
         # When a run is void, the other clients receive that indication as well, to ignore the results and delete the capture file
         self.main_logger.warning(f"One of the clients has reconnected to the broker, voiding current run")
         self.void_run = True
+        # Wakes up the run thread in case it is waiting for any of the run events
+        if self.run_key is not None:
+            self.start_event.set()
+            self.publish_event.set()
+            self.drained_event.set()
+
+    # Callback for when the client receives a message on the start publish topic
+    # Once every client is ready for the run, the server sends the order to start publishing, with the run UUID and repetition
+    def on_startpublish(self, client, userdata, msg):
+        order = json.loads(msg.payload)
+        if (order['uuid'], order['repetition']) == self.run_key:
+            self.main_logger.info(f"Publish order received from the server using topic {str(msg.topic)}")
+            self.start_event.set()
+
+    # Callback for when the client receives a message on the run drained topic
+    # The server informs the clients once no more messages or retransmissions are seen for the run, which allows the capture to be stopped
+    def on_rundrained(self, client, userdata, msg):
+        order = json.loads(msg.payload)
+        if (order['uuid'], order['repetition']) == self.run_key:
+            self.drained_event.set()
+
+    # Publishes the ready message to the server, with the run UUID, repetition and the client number
+    def publish_ready(self):
+        ready = json.dumps({"uuid": self.run_key[0], "repetition": self.run_key[1], "client": self.client_number})
+        self.client.publish(client_ready, ready, qos=0)
+
+    # Publishes the done message to the server, with the run UUID, repetition, client number and whether the run was void for the client
+    def publish_done(self):
+        done = json.dumps({"uuid": self.run_key[0], "repetition": self.run_key[1], "client": self.client_number, "void": self.void_run})
+        self.client.publish(client_done, done, qos=0)
     
+    # Callback for when the client receives a message on the clock ping topic
+    def on_clockping(self, client, userdata, msg):
+        # Before every run, the server sends a few pings to estimate the offset between its clock and the clock of every client
+        # The client answers right away with the ping time, its client number and its own monotonic time of when the ping was received
+        receive_time = time.monotonic_ns()
+        ping_time = latency.ping_struct.unpack(msg.payload)[0]
+        self.client.publish(clock_pong, latency.pong_struct.pack(ping_time, self.client_number, receive_time), qos=0)
+
     # Cleanup function, used to gracefully clean everything MQTT related, using the previously mentioned connected flag
     def cleanup(self):
         # Removes all added callbacks, and in case the client is connected, unsubscribes from the topics and disconnects
@@ -232,37 +339,80 @@ class MQTT_Client:
     # Run handler function, used to execute each run with the information received from the server
     def run_handler(self):
         self.main_logger.info(f"Run thread started")
-        # In order to give the client some setup time for the Dumpcap capture, the client sleeps for 5 seconds before starting the run
-        time.sleep(5)
+        # Before publishing, the client informs the server that it is ready, once the Dumpcap capture is actually capturing packets
+        # The client then waits for the order to start publishing, which the server sends once every client of the run is ready
+        if self.capture_enabled is True and self.dumpcap_capture.wait_capturing(ready_timeout) is False:
+            self.main_logger.warning(f"Dumpcap did not report the capture running after {ready_timeout} seconds")
+        self.publish_ready()
+        self.client_ready = True
+        self.main_logger.info(f"Informed server that client is ready, waiting for publish order")
+        if self.start_event.wait(2*ready_timeout) is False:
+            self.main_logger.warning(f"Publish order not received after {2*ready_timeout} seconds, voiding current run")
+            self.void_run = True
+        # The host telemetry samples the client and Dumpcap processes, the host and the network interface during the publish
+        # When running virtual clients, only the first client of the host samples, since the host and the interface are shared
+        # (the other worker processes are only seen in the CPU usage of the host)
+        self.host_sampling = host_telemetry_enabled is True and self.capture_owner is True and self.void_run == False
+        if self.host_sampling is True:
+            self.host_telemetry.start({"client": os.getpid(), "dumpcap": self.dumpcap_capture.process.pid if self.capture_enabled is True else None})
         # Creates a payload with the appropriate size, and defines some variables, more specifically the publish_begin and publish_end
         # These is where the datetimes from the client-side publish measurement will be stored
         self.pub_complete = False
         self.publish_begin = None
         self.publish_end = None
+        # The payload builder preallocates a single buffer for the whole run, which has a header with the sequence number and send time
+        self.payload_builder = payload.PayloadBuilder(self.msg_size, self.client_number, self.run_uuid, self.run_repetition)
+        # The timestamp recorder keeps the timestamps of every published message in memory, to avoid writing to a file from the network thread
+        self.timestamp_recorder = recorder.TimestampRecorder(self.msg_amount)
+        # Sequence numbers of the message ids not completed yet, and recorder indexes of the completed message ids without a sequence number yet
+        self.mid_sequences = {}
+        self.mid_indexes = {}
+        # The handshake tracker keeps the send time of every message id, to calculate the publish completion latency of every message
+        self.handshake_tracker = latency.HandshakeTracker()
         self.main_logger.info(f"Starting publish of {self.msg_amount} messages with QoS level {self.msg_qos}")
-        # Since there is a specific publish frequency to be met, the publish function may need to sleep between publishes, using the beforementioned sleep period
-        # However, for better precision, instead of calculating the remaining time left for the function to sleep, the pause library is used
-        # This library works with datetime objects. In order to pause the function, before every execution, a deadline is calculated
-        # This deadline is increased with the sleep period everytime, and indicates until when the function must pause, with microsecond precision
-        deadline = datetime.datetime.now()
+        # Since there is a specific publish frequency to be met, the publish function needs to wait between publishes, which is done by the pacer
+        # The pacer calculates every deadline from the start of the run with the monotonic clock in nanoseconds, sleeping for most of the period
+        # and spinning for the last part of it, and records how late each message was released in relation to its deadline
+        pacer = pacing.Pacer(self.msg_freq, self.msg_amount, pacing_policy, pacing_spin_time)
+        self.publish_counting = self.void_run == False
+        # The publish has a deadline, from the expected publish time and the retransmission period of the QoS level, in case the publish never completes
+        publish_deadline = time.monotonic() + self.msg_amount/self.msg_freq + self.rtx_sleep
+        pacer.start()
+        self.handshake_tracker.begin()
         # A cycle is iterated as many times as messages that need to be published in this run
         for msg in range(self.msg_amount):
             if self.void_run == False:
-                # Updates the deadline of this iteration start with a current datetime object
-                deadline += datetime.timedelta(microseconds=(self.sleep_time))
-                # MQTT client publishes the messages to the main topic, with the built payload and correct QoS
-                payload = bytearray(self.msg_size-2)
-                payload.extend(msg.to_bytes(length=2, byteorder='big'))
-                self.client.publish(main_topic, payload, qos=self.msg_qos)
-                # Pauses the thread until the deadline specified is met
-                pause.until(deadline)
+                # Waits until the deadline of this message is met
+                pacer.wait()
+                # MQTT client publishes the messages to the main topic, with the payload built in place with the sequence number and send time
+                # QoS 0 payloads are copied into the outgoing packet inside the publish call, so the preallocated buffer can be reused right away
+                # For QoS 1 and 2, paho keeps a reference to the payload of queued and inflight messages, so a snapshot of the buffer is published instead
+                msg_payload, send_time = self.payload_builder.build(msg)
+                if self.msg_qos > 0:
+                    msg_payload = bytes(msg_payload)
+                msg_info = self.client.publish(self.main_topic, msg_payload, qos=self.msg_qos)
+                self.handshake_tracker.sent(msg_info.mid, send_time)
+                with self.sequence_lock:
+                    index = self.mid_indexes.pop(msg_info.mid, None)
+                    if index is None:
+                        self.mid_sequences[msg_info.mid] = msg
+                    else:
+                        self.timestamp_recorder.sequence[index] = msg
             else: 
                 # If the run is void, the client stops the loop and breaks out of it
                 self.main_logger.warning(f"Current run is void, aborting publish loop")
                 break
-        # Once the iteration is complete, simply waits for MQTT client that all messages have been sent, before proceeding to the next step
-        while (self.pub_complete != True) and (self.void_run != True):
-            time.sleep(2.5)
+        # Once the iteration is complete, waits for the MQTT client to signal that all messages have been sent, before proceeding to the next step
+        # For QoS 1 and 2 this means every PUBACK/PUBCOMP was received, so the client has no more messages inflight
+        # If the publish is not complete by the deadline (for example, the connection to the broker was lost), the run is void
+        if self.void_run == False:
+            if self.publish_event.wait(max(publish_deadline - time.monotonic(), 0)) is False:
+                self.main_logger.warning(f"Publish not complete after {round(self.msg_amount/self.msg_freq + self.rtx_sleep,2)} seconds ({self.sent_counter}/{self.msg_amount} messages), voiding current run")
+                self.client.publish(void_run, payload=self.client_id, qos=0)
+                self.void_run = True
+        self.publish_counting = False
+        if self.host_sampling is True:
+            self.host_telemetry.stop()
         # After all messages are sent, the client logs the total publish time from the client side, but for the amount of messages minus 1, to compare correctly
         # with the server logs and determine if any delays happened and where
         if self.void_run == False:
@@ -272,35 +422,88 @@ class MQTT_Client:
             self.main_logger.info(f"Publishing ended: {self.publish_end.strftime('%H:%M:%S.%f')[:-3]}")
             self.main_logger.info(f"Total publish time (for {self.msg_amount-1} messages): {round(pub_time.total_seconds(),3)} seconds")
             self.main_logger.info(f"Actual frequency (from the client): {pub_freq} Hz")
-            # In order to allow for any needed retransmission of the messages from the broker to the server, the thread sleeps for a specific period of time,
-            # which depends on QoS and is determined in the configuration file
-            self.main_logger.info(f"Sleeping for {self.rtx_sleep} seconds to allow for retransmission finishing for QoS {self.msg_qos}")
-            time.sleep(self.rtx_sleep)
-        if dumpcap_enabled is True:
+            # The scheduling lateness shows how precise the pacing of the publish loop was, independently of the broker
+            lateness = pacer.report()
+            self.main_logger.info(f"Scheduling lateness: mean {lateness['mean']} us | p50 {lateness['p50']} us | p99 {lateness['p99']} us | max {lateness['max']} us")
+            if pacing_policy == "skip":
+                self.main_logger.info(f"Skipped publish slots due to falling behind schedule: {lateness['skipped']}")
+            # The publish completion latency shows the cost of the QoS handshake from the client side, from the publish call until the PUBACK/PUBCOMP
+            # For QoS 0 it only includes the time until the message is written to the socket
+            handshake = self.handshake_tracker.histogram.report()
+            if handshake is not None:
+                self.main_logger.info(f"Publish completion latency: p50 {handshake['p50']} ms | p90 {handshake['p90']} ms | p99 {handshake['p99']} ms | p99.9 {handshake['p99.9']} ms | max {handshake['max']} ms")
+            # The per second series of the completion latency shows how it evolves along the run, for example when messages start queueing up
+            series_file = self.log_folder + self.client_id + "-handshake-U" + self.run_uuid + "-R" + str(self.run_repetition+1) + ".csv"
+            series_count = self.handshake_tracker.write_series(series_file)
+            self.timestamp_logger.info(f"Wrote {series_count} seconds of publish completion latency to {os.path.basename(series_file)}")
+            # Once the publish is over, the recorded timestamps are written to a binary file for this repetition
+            timestamp_file = self.log_folder + self.client_id + "-timestamp-U" + self.run_uuid + "-R" + str(self.run_repetition+1) + ".bin"
+            timestamp_count = self.timestamp_recorder.flush(timestamp_file)
+            self.timestamp_logger.info(f"Recorded {timestamp_count} publish timestamps to {os.path.basename(timestamp_file)}")
+            # The configuration and metrics of the repetition are also written to the results file, as a single JSON line
+            record = {"version": results.record_version, "device": self.client_id, "uuid": self.run_uuid, "repetition": self.run_repetition+1,
+                      "time": datetime.datetime.utcnow().isoformat(), "valid": True,
+                      "config": {"client_amount": self.client_amount, "msg_qos": self.msg_qos, "msg_amount": self.msg_amount,
+                                 "msg_size": self.msg_size, "msg_freq": self.msg_freq},
+                      "metrics": {"sent": self.sent_counter, "start_time": self.publish_begin.isoformat(), "finish_time": self.publish_end.isoformat(),
+                                  "publish_time": round(pub_time.total_seconds(),3), "freq": pub_freq, "lateness": lateness, "handshake": handshake}}
+            # The summary of the host telemetry is added to the metrics, and its series is written to its own file
+            if self.host_sampling is True:
+                resources = self.host_telemetry.summary()
+                self.main_logger.info(f"Client CPU: mean {resources['client']['cpu_mean']}% | max {resources['client']['cpu_max']}% | " +
+                                      f"Host CPU: mean {resources['host']['cpu_mean']}% | max {resources['host']['cpu_max']}%")
+                if resources['interface']['rx_dropped'] or resources['interface']['tx_dropped']:
+                    self.main_logger.warning(f"Interface {dumpcap_interface} dropped packets: {resources['interface']['rx_dropped']} received | {resources['interface']['tx_dropped']} sent")
+                record["metrics"]["resources"] = resources
+            try:
+                self.results_file.write(record)
+                if self.host_sampling is True:
+                    self.host_file.write({"version": results.record_version, "device": self.client_id, "uuid": self.run_uuid,
+                                          "repetition": self.run_repetition+1, "valid": True, **self.host_telemetry.series()})
+            except OSError as error:
+                self.main_logger.error(f"Could not write the results record: {error}")
+            # The client informs the server that it has finished publishing messages for this run, and has no more messages inflight
+            self.publish_done()
+            self.main_logger.info(f"Informed server that client is finished")
+        if self.capture_enabled is True:
+            if self.void_run == False:
+                # In order to capture any needed retransmission of the messages from the broker to the server, the capture keeps running until the server
+                # informs the run is drained, up to a maximum period of time which depends on QoS and is determined in the configuration file
+                self.main_logger.info(f"Waiting up to {self.rtx_sleep} seconds for the server to inform the run is drained for QoS {self.msg_qos}")
+                if self.drained_event.wait(self.rtx_sleep) is False:
+                    self.main_logger.warning(f"Run drained message not received, stopping capture")
+            self.dumpcap_capture.stop()
             if self.void_run == False:
-                # Since capture files can be quite big in size, as soon as a run is complete, the capture file is compressed into the previously mentioned zip file
-                # Once zipped, the original files are deleted, to free up the cached memory as well as storage space
-                self.main_logger.info(f"Zipping Dumpcap capture files to free up memory")
-                self.main_logger.info(f"Zip file: {os.path.basename(self.zip_file)}")
-                self.zip = zipfile.ZipFile(self.zip_file, "a", zipfile.ZIP_DEFLATED)
-                self.main_logger.info(f"Zipping and deleting {os.path.basename(self.dumpcap_file)}")
-                self.zip.write(self.dumpcap_file, os.path.basename(self.dumpcap_file))
-                self.zip.close()
+                # Since capture files can be quite big in size, as soon as a run is complete, the capture file is queued to be compressed into
+                # the previously mentioned zip file by the archiver, in the background, so the client is ready for the next repetition right away
+                # Once zipped and verified, the original file is deleted by the archiver, to free up the cached memory as well as storage space
+                # With a ring buffer, every file written by Dumpcap is queued
+                for capture_file in capture.capture_files(self.dumpcap_file):
+                    self.main_logger.info(f"Queued {os.path.basename(capture_file)} to be zipped into {os.path.basename(self.zip_file)} ({self.archiver.pending()} capture files already queued)")
+                    self.archiver.submit(self.zip_file, capture_file)
             elif self.void_run == True:
-                self.main_logger.info(f"Terminating Dumpcap capture due to void run")
-                self.dumpcap_subprocess.terminate()
+                self.main_logger.info(f"Terminated Dumpcap capture due to void run")
                 self.main_logger.info(f"Deleting Dumpcap capture file of current run due to being void")
-            os.remove(self.dumpcap_file)
-        # At least, the client has to inform the server that it has finished publishing messages for this run
-        # This is done by sending a None payload to the client done topic
-        if self.void_run == False:
-            self.client.publish(client_done, None, qos=0)
-            self.main_logger.info(f"Informed server that client is finished")
+                for capture_file in capture.capture_files(self.dumpcap_file):
+                    os.remove(capture_file)
+        # In case the run is void, the client still informs the server once it has stopped, so the server doesn't need to wait a fixed period before the next run
+        if self.void_run == True:
+            self.publish_done()
+            self.main_logger.info(f"Informed server that client has stopped the void run")
 
     # Starts the client class with all the variables necessary
-    def __init__(self):
+    # The client number is the X in client-X, calculated from the host number and the virtual client index of the host
+    def __init__(self, client_number):
+        # Stores all the variables that depend on the client number, such as the client-id, folders and topic
+        self.client_number = client_number
+        self.client_id = "client-" + str(client_number)
+        self.log_folder = str(config['logging']['folder']).replace("#", self.client_id)
+        self.main_topic = str(config['topics']['main_topic']).replace("#", self.client_id)
+        self.dumpcap_folder = str(config['dumpcap']['folder']).replace("#", self.client_id)
+        self.capture_owner = client_number == host_number
+        self.capture_enabled = dumpcap_enabled is True and self.capture_owner is True
         # Creates the logs folder in case it doesn't exist
-        os.makedirs(log_folder, exist_ok=True)
+        os.makedirs(self.log_folder, exist_ok=True)
         # Performs the logger setup
         self.logger_setup()
         self.main_logger.info(f"==================================================")
@@ -308,26 +511,80 @@ class MQTT_Client:
         self.finished = False
         self.mqtt_connected = False
         self.void_run = False
-        while self.finished is False:
-            # Starts the MQTT client with specified client ID, passed through the input arguments, and defines all callbacks
-            self.main_logger.info(f"Creating MQTT Client with ID {client_id}")
-            self.client = mqtt.Client(client_id=client_id)
-            self.client.on_connect = self.on_connect
-            self.client.on_disconnect = self.on_disconnect
-            self.client.on_publish = self.on_publish
-            self.client.message_callback_add(begin_client, self.on_beginclient)
-            self.client.message_callback_add(finish_client, self.on_finishclient)
-            self.client.message_callback_add(void_run, self.on_voidrun)
-            # The MQTT client connects to the broker and the network loop iterates forever until the cleanup function
-            # The keep alive is set to 1 minute
-            time.sleep(15)
-            self.connect_count = 0
-            self.client.connect(broker_address, 1883, 60)
-            self.client.loop_forever()
+        self.run_key = None
+        self.run_thread = None
+        self.client_ready = False
+        self.publish_counting = False
+        # Lock used to pair the message ids of the publish loop and the on_publish callback, to record the sequence number of every completed message
+        self.sequence_lock = threading.Lock()
+        # Machine readable results file, with one JSON line per repetition, read by the dataset processor instead of the main logs
+        self.results_file = results.ResultsFile(self.log_folder + self.client_id + "-results.jsonl")
+        # The host telemetry samples the resources of the client and Dumpcap processes from /proc during every repetition, with its series in its own file
+        self.host_telemetry = telemetry.HostTelemetry(host_interval, dumpcap_interface)
+        self.host_file = results.ResultsFile(self.log_folder + self.client_id + "-host.jsonl")
+        # The archiver compresses the capture files in the background, with a pool of worker threads, or with deflate in case the codec is not available
+        codec = compression_codec
+        if archiver.codec_available(codec) is False:
+            self.main_logger.warning(f"Capture compression codec {codec} not available, using deflate")
+            codec = "deflate"
+        # The capture files queued but not zipped by a previous execution of the client (interrupted or failed) are queued again
+        self.archiver = archiver.Archiver(codec, compression_level, compression_workers, lambda level, message: getattr(self.main_logger, level)(message),
+                                          self.log_folder + self.client_id + "-archiver.json")
+        try:
+            while self.finished is False:
+                # Starts the MQTT client with specified client ID, passed through the input arguments, and defines all callbacks
+                self.main_logger.info(f"Creating MQTT Client with ID {self.client_id}")
+                self.client = mqtt.Client(client_id=self.client_id)
+                self.client.on_connect = self.on_connect
+                self.client.on_disconnect = self.on_disconnect
+                self.client.on_publish = self.on_publish
+                self.client.message_callback_add(begin_client, self.on_beginclient)
+                self.client.message_callback_add(finish_client, self.on_finishclient)
+                self.client.message_callback_add(void_run, self.on_voidrun)
+                self.client.message_callback_add(clock_ping, self.on_clockping)
+                self.client.message_callback_add(start_publish, self.on_startpublish)
+                self.client.message_callback_add(run_drained, self.on_rundrained)
+                # The MQTT client connects to the broker and the network loop iterates forever until the cleanup function
+                # The keep alive is set to 1 minute
+                # In case the broker is not running yet, the connection is retried periodically instead of waiting a fixed period before connecting
+                self.connect_count = 0
+                while True:
+                    try:
+                        self.client.connect(broker_address, 1883, 60)
+                        break
+                    except OSError as error:
+                        self.main_logger.info(f"Broker at {broker_address} not available ({error}), retrying in {connect_retry} seconds")
+                        time.sleep(connect_retry)
+                self.client.loop_forever()
+        finally:
+            # Before exiting (even when interrupted or on any error), waits for the archiver to zip every queued capture file
+            self.main_logger.info(f"Waiting for {self.archiver.pending()} queued capture files to be zipped")
+            self.archiver.close()
+
+# Worker function, used to run one or more MQTT Client class objects in the same process, each one on its own thread
+# Every client has its own MQTT connection and client-id, and handles the run orders received from the server by itself
+def client_worker(client_numbers):
+    threads = [threading.Thread(target = MQTT_Client, args = (number,)) for number in client_numbers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
 
-# Starts one MQTT Client class object
+# Starts the MQTT Client class objects of this host
+# By default there is a single client per host, with the host number as client number
+# With virtual clients, the host runs several clients, spread through a pool of worker processes (one per CPU core by default)
+# The client numbers are interleaved between hosts (host + index * hosts), so a run with less clients still uses every host evenly
 # Small exception handler in case the user decides to use Ctrl-C to finish the program mid execution
 try:
-    mqtt_client = MQTT_Client()
+    client_numbers = [host_number + index*client_hosts for index in range(virtual_amount)]
+    if virtual_amount == 1:
+        mqtt_client = MQTT_Client(host_number)
+    else:
+        worker_amount = min(virtual_amount, virtual_workers or os.cpu_count())
+        workers = [multiprocessing.Process(target = client_worker, args = (client_numbers[worker::worker_amount],)) for worker in range(worker_amount)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
 except KeyboardInterrupt:
     print("Detected user interruption, shutting down...")
@@ -0,0 +1,86 @@
+# Import of all necessary packages and libraries
+import math
+
+# Two-sided critical values of the Student's t distribution, for 1 to 30 degrees of freedom, at the supported confidence levels
+# Above 30 degrees of freedom, the critical value is approximated from the normal one (see t_critical)
+t_table = {
+    90: (6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812, 1.796, 1.782, 1.771, 1.761, 1.753,
+         1.746, 1.740, 1.734, 1.729, 1.725, 1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697),
+    95: (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131,
+         2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042),
+    99: (63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250, 3.169, 3.106, 3.055, 3.012, 2.977, 2.947,
+         2.921, 2.898, 2.878, 2.861, 2.845, 2.831, 2.819, 2.807, 2.797, 2.787, 2.779, 2.771, 2.763, 2.756, 2.750),
+}
+z_table = {90: 1.645, 95: 1.960, 99: 2.576}
+
+# Gets the two-sided critical value of the Student's t distribution for a confidence level (90, 95 or 99) and the degrees of freedom
+# Above the table, the first order Cornish-Fisher expansion of the normal critical value is used, which is within 0.2% of the exact value
+def t_critical(confidence, degrees):
+    if degrees <= len(t_table[confidence]):
+        return t_table[confidence][degrees-1]
+    z = z_table[confidence]
+    return z + (z**3 + z) / (4*degrees)
+
+# Running statistics class, which keeps the mean and variance of a metric over the repetitions with Welford's algorithm
+# The values are never stored, and the update is numerically stable, unlike keeping the sum and the sum of squares
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    # Adds the value of a new repetition
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    # Gets the sample variance, or None with less than 2 values
+    def variance(self):
+        if self.count < 2:
+            return None
+        return self.m2 / (self.count-1)
+
+    # Gets the full width of the confidence interval of the mean, or None with less than 2 values
+    def interval_width(self, confidence):
+        variance = self.variance()
+        if variance is None:
+            return None
+        return 2 * t_critical(confidence, self.count-1) * math.sqrt(variance/self.count)
+
+# Convergence tracker class, used by the server to decide when a run configuration has enough repetitions
+# After every valid repetition, the running statistics of the tracked metrics are updated, and the run is converged once
+# the confidence interval of the mean of every tracked metric is narrower than its tolerance (in the units of the metric)
+# A run always has at least min_repetitions, and stops at max_repetitions even if it didn't converge
+class ConvergenceTracker:
+    def __init__(self, tolerances, confidence, min_repetitions, max_repetitions):
+        if confidence not in t_table:
+            raise ValueError(f"Unsupported confidence level {confidence}, should be one of {list(t_table)}")
+        self.tolerances = tolerances
+        self.confidence = confidence
+        self.min_repetitions = max(min_repetitions, 2)
+        self.max_repetitions = max(max_repetitions, self.min_repetitions)
+        self.repetitions = 0
+        self.stats = {name: RunningStats() for name in tolerances}
+
+    # Adds the metrics of a valid repetition, metrics without a value are ignored
+    def add(self, metrics):
+        self.repetitions += 1
+        for name in self.tolerances:
+            if metrics.get(name) is not None:
+                self.stats[name].add(float(metrics[name]))
+
+    # Gets the current confidence interval width of every tracked metric
+    def widths(self):
+        return {name: self.stats[name].interval_width(self.confidence) for name in self.tolerances}
+
+    # Checks if every tracked metric has converged, after the minimum amount of repetitions
+    def converged(self):
+        if self.repetitions < self.min_repetitions:
+            return False
+        return all(width is not None and width <= self.tolerances[name] for name, width in self.widths().items())
+
+    # Checks if the run needs no more repetitions, either because it converged or because it reached the maximum
+    def finished(self):
+        return self.converged() or self.repetitions >= self.max_repetitions
@@ -0,0 +1,171 @@
+# Import of all necessary packages and libraries
+import math
+import struct
+import threading
+import time
+from array import array
+
+# Payloads of the clock synchronization messages, exchanged between the server and the clients before every run:
+# - ping -> sent by the server, contains the monotonic time of the server when it was sent
+# - pong -> sent back by every client, contains the time of the ping, the client number and the monotonic time of the client when the ping was received
+ping_struct = struct.Struct(">q")
+pong_struct = struct.Struct(">qIq")
+
+# Clock synchronization class, used by the server to estimate the offset between its monotonic clock and the monotonic clock of every client
+# For every ping answered by a client, the offset is calculated assuming the client received the ping halfway through the round trip
+# The sample with the lowest round trip time is kept, since it is the one with the least queueing delay and therefore the lowest error
+class ClockSync:
+    def __init__(self):
+        self.samples = {}
+
+    # Processes a pong received at the given server time
+    def record(self, pong, receive_time):
+        ping_time, client_number, client_time = pong_struct.unpack(pong)
+        rtt = receive_time - ping_time
+        offset = client_time - (ping_time + rtt//2)
+        if client_number not in self.samples or rtt < self.samples[client_number][0]:
+            self.samples[client_number] = (rtt, offset)
+
+    # Gets the best (rtt, offset) sample of a client, or None in case the client never answered
+    def sample(self, client_number):
+        return self.samples.get(client_number)
+
+# Latency histogram class, a log bucketed histogram in the style of HDR histograms, used to calculate latency percentiles without storing every value
+# Values below 2^precision_bits have their own bucket, and every power of two above that is split in 2^(precision_bits-1) buckets,
+# which keeps the relative error of every value below 1/2^(precision_bits-1) (under 1.6% with the default precision of 7 bits)
+# Values are integers in nanoseconds, up to 2^max_bits (over 3 days with the default 48 bits), bigger values go to the last bucket
+class LatencyHistogram:
+    def __init__(self, precision_bits=7, max_bits=48):
+        self.precision_bits = precision_bits
+        self.sub_count = 1 << precision_bits
+        self.half_count = self.sub_count >> 1
+        self.size = self.sub_count + (max_bits-precision_bits)*self.half_count
+        self.counts = array('q', bytes(8*self.size))
+        self.total = 0
+        self.maximum = 0
+        self.negative = 0
+
+    # Records a latency value, negative values (which can happen due to errors in the clock offset) are counted and recorded as 0
+    def record(self, value):
+        if value < 0:
+            self.negative += 1
+            value = 0
+        if value < self.sub_count:
+            index = value
+        else:
+            shift = value.bit_length() - self.precision_bits
+            index = min(self.sub_count + (shift-1)*self.half_count + (value >> shift) - self.half_count, self.size-1)
+        self.counts[index] += 1
+        self.total += 1
+        if value > self.maximum:
+            self.maximum = value
+
+    # Gets the highest value that falls in a bucket
+    def bucket_value(self, index):
+        if index < self.sub_count:
+            return index
+        shift = (index-self.sub_count)//self.half_count + 1
+        mantissa = (index-self.sub_count) % self.half_count + self.half_count
+        return ((mantissa+1) << shift) - 1
+
+    # Calculates the value below which the given percentage of the recorded values fall
+    # The last bucket also holds every value above the range of the histogram, so its highest value is the maximum recorded value
+    def percentile(self, percentage):
+        if self.total == 0:
+            return None
+        target = max(math.ceil(percentage/100*self.total), 1)
+        cumulative = 0
+        for index in range(self.size):
+            cumulative += self.counts[index]
+            if cumulative >= target:
+                return self.maximum if index == self.size-1 else min(self.bucket_value(index), self.maximum)
+        return self.maximum
+
+    # Adds all the values of another histogram with the same precision to this one
+    def merge(self, other):
+        for index in range(self.size):
+            self.counts[index] += other.counts[index]
+        self.total += other.total
+        self.negative += other.negative
+        self.maximum = max(self.maximum, other.maximum)
+
+    # Calculates the percentiles reported at the end of every run, in milliseconds
+    def report(self):
+        if self.total == 0:
+            return None
+        report = {f"p{percentage:g}": round(self.percentile(percentage)/1000000, 3) for percentage in (50, 90, 99, 99.9)}
+        report["max"] = round(self.maximum/1000000, 3)
+        return report
+
+# Handshake tracker class, used by the client to measure how long the publish of every message takes to complete, from the publish call
+# until paho reports it as complete (PUBACK for QoS 1, PUBCOMP for QoS 2, or written to the socket for QoS 0)
+# Send and completion times are kept in two preallocated arrays indexed by the message id, which paho keeps in the 1 to 65535 range
+# Either side can happen first (QoS 0 messages complete inside the publish call, before the message id is returned to the publish loop),
+# so the latency is recorded by whichever side comes last, and both slots are cleared for when the message id is reused
+# Besides the histogram, a per second series is kept, with the amount, sum and maximum of the latencies of the publishes completed in every second of the run
+class HandshakeTracker:
+    def __init__(self, interval=1000000000):
+        self.send_time = array('q', bytes(8*65536))
+        self.done_time = array('q', bytes(8*65536))
+        self.lock = threading.Lock()
+        self.histogram = LatencyHistogram()
+        self.interval = interval
+        self.series_count = array('q')
+        self.series_sum = array('q')
+        self.series_max = array('q')
+        self.start = None
+
+    # Sets the start of the per second series, should be called right before the first publish
+    def begin(self):
+        self.start = time.monotonic_ns()
+
+    # Stores the send time of a message id, called by the publish loop once the publish call returns
+    def sent(self, mid, send_time):
+        with self.lock:
+            done_time = self.done_time[mid]
+            if done_time == 0:
+                self.send_time[mid] = send_time
+                return
+            self.done_time[mid] = 0
+            self.record(send_time, done_time)
+
+    # Stores the completion time of a message id, called from the on_publish callback
+    def completed(self, mid, done_time=None):
+        if done_time is None:
+            done_time = time.monotonic_ns()
+        with self.lock:
+            send_time = self.send_time[mid]
+            if send_time == 0:
+                self.done_time[mid] = done_time
+                return
+            self.send_time[mid] = 0
+            self.record(send_time, done_time)
+
+    # Records the latency of a completed publish in the histogram and in the second of the series in which it was completed
+    # The series arrays are extended in case the run takes longer than expected
+    def record(self, send_time, done_time):
+        value = done_time - send_time
+        self.histogram.record(value)
+        second = max((done_time-self.start)//self.interval, 0)
+        if second >= len(self.series_count):
+            extension = bytes(8*(second+1-len(self.series_count)))
+            for column in (self.series_count, self.series_sum, self.series_max):
+                column.frombytes(extension)
+        self.series_count[second] += 1
+        self.series_sum[second] += value
+        if value > self.series_max[second]:
+            self.series_max[second] = value
+
+    # Gets the per second series as a list of (second, amount, mean in ms, max in ms) tuples
+    def series(self):
+        return [(second, self.series_count[second], round(self.series_sum[second]/self.series_count[second]/1000000, 3) if self.series_count[second] > 0 else 0,
+                 round(self.series_max[second]/1000000, 3)) for second in range(len(self.series_count))]
+
+    # Writes the per second series to a CSV file, returning the amount of seconds written
+    def write_series(self, path):
+        series = self.series()
+        with open(path, "w") as series_file:
+            series_file.write("second,completed,mean_ms,max_ms\n")
+            for second, count, mean, maximum in series:
+                series_file.write(f"{second},{count},{mean},{maximum}\n")
+        return len(series)
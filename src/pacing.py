@@ -0,0 +1,58 @@
+# Import of all necessary packages and libraries
+import time
+from array import array
+
+# Policies available for when the publish loop falls behind its schedule:
+# - catchup -> keeps the original schedule, publishing back to back until every late message is sent and the loop is on time again
+# - skip -> drops the missed slots of the schedule, and continues from the next slot in the future, keeping the period between messages
+pacing_policies = ("catchup", "skip")
+
+# Pacer class, used by the client to publish at a precise frequency, with deadlines based on the monotonic clock in nanoseconds
+# Instead of relying on datetime objects and a fixed compensation of the sleep period, every deadline is calculated from the start of the run,
+# so timer errors don't accumulate between messages
+class Pacer:
+    # Stores the period in nanoseconds from the frequency, the behind schedule policy and the spin time, and preallocates the lateness array
+    # The spin time is the tail of every wait in which the thread busy waits instead of sleeping, since sleep wake-ups are not precise enough for high frequencies
+    def __init__(self, frequency, amount, policy="catchup", spin_time=0.0005):
+        if policy not in pacing_policies:
+            raise ValueError(f"Unknown pacing policy {policy}, should be one of {pacing_policies}")
+        self.period = round(1000000000/frequency)
+        self.policy = policy
+        self.spin_time = int(spin_time*1000000000)
+        self.lateness = array('q', bytes(8*amount))
+        self.count = 0
+        self.skipped = 0
+        self.deadline = None
+
+    # Sets the first deadline of the schedule to the current time, so the first message is published right away
+    def start(self):
+        self.deadline = time.monotonic_ns()
+
+    # Waits until the deadline of the next message, sleeping for most of the period and spinning for the last part of it
+    # Records how late the thread was released in relation to the deadline, and calculates the deadline of the following message
+    def wait(self):
+        remaining = self.deadline - time.monotonic_ns()
+        if remaining > self.spin_time:
+            time.sleep((remaining-self.spin_time)/1000000000)
+        now = time.monotonic_ns()
+        while now < self.deadline:
+            now = time.monotonic_ns()
+        self.lateness[self.count] = now - self.deadline
+        self.count += 1
+        self.deadline += self.period
+        # In case the skip policy is used and the loop is already behind the next deadline, the missed slots are skipped
+        if self.policy == "skip" and now > self.deadline:
+            missed = -(-(now-self.deadline)//self.period)
+            self.deadline += missed*self.period
+            self.skipped += missed
+
+    # Calculates the lateness statistics of the run, in microseconds, to be logged at the end of the run
+    def report(self):
+        if self.count == 0:
+            return None
+        lateness = sorted(self.lateness[:self.count])
+        return {"mean": round(sum(lateness)/self.count/1000, 1),
+                "p50": round(lateness[(self.count-1)//2]/1000, 1),
+                "p99": round(lateness[int((self.count-1)*0.99)]/1000, 1),
+                "max": round(lateness[-1]/1000, 1),
+                "skipped": self.skipped}
@@ -0,0 +1,59 @@
+# Import of all necessary packages and libraries
+import struct
+import time
+import zlib
+
+# Every message published on the main topic starts with a fixed binary header, followed by zero padding up to the configured payload size
+# The header is placed at the beginning of the payload so that it can be read without going through the whole payload, and contains:
+# - magic -> two bytes used to tell these payloads apart from the legacy ones (all zeros with a 2 byte counter at the end)
+# - version -> version of the header layout, in case it needs to change in the future
+# - header length -> size of the header in bytes, so readers can skip it even if they don't know a newer version
+# - sequence -> 64-bit message sequence number inside the run repetition, starting at 0
+# - send time -> monotonic time in nanoseconds of the publishing host, taken right before the publish call
+# - client index -> number of the client that published the message (the X in client-X)
+# - run hash -> CRC32 of the run UUID and repetition, used by the server to drop messages of any other run or repetition (late retransmissions, for example)
+header_magic = b"QS"
+header_version = 1
+header_struct = struct.Struct(">2sBBQqII")
+header_size = header_struct.size
+# Offsets of the fields that are rewritten for every message, used to pack them in place
+sequence_offset = 4
+sequence_struct = struct.Struct(">Qq")
+
+# Calculates the run hash of a run UUID and repetition, which is the same on the clients and the server
+# Every repetition of a run has the same UUID, so the repetition is part of the hash
+def run_hash(run_uuid, repetition):
+    return zlib.crc32(f"{run_uuid}-R{repetition}".encode("utf-8"))
+
+# Decodes the header of a received payload into a tuple of (sequence, send time, client index, run hash)
+# Returns None in case the payload is too small or doesn't start with the header magic (legacy payloads, for example)
+def decode_header(payload):
+    if len(payload) < header_size or payload[0:2] != header_magic:
+        return None
+    magic, version, length, sequence, send_time, client_index, hash_value = header_struct.unpack_from(payload, 0)
+    return sequence, send_time, client_index, hash_value
+
+# Gets only the sequence number of a payload, falling back to the legacy format (2 byte big endian counter at the end of the payload)
+# This allows the capture files from previous versions to still be processed
+def message_sequence(payload):
+    if len(payload) >= header_size and payload[0:2] == header_magic:
+        return sequence_struct.unpack_from(payload, sequence_offset)[0]
+    return int.from_bytes(payload[-2:], byteorder='big')
+
+# Payload builder class, used by the client to generate the payloads of a run without allocating new memory for every message
+class PayloadBuilder:
+    # Preallocates one buffer per run with the configured payload size, and writes the static part of the header once
+    # The payload size is a measured variable, so a size smaller than the header itself is rejected instead of enlarged
+    def __init__(self, msg_size, client_index, run_uuid, repetition):
+        if int(msg_size) < header_size:
+            raise ValueError(f"Payload size should be at least {header_size} bytes (the payload header), not {msg_size} bytes")
+        self.size = int(msg_size)
+        self.buffer = bytearray(self.size)
+        header_struct.pack_into(self.buffer, 0, header_magic, header_version, header_size, 0, 0, client_index, run_hash(run_uuid, repetition))
+
+    # Writes the sequence number and send timestamp in place on the preallocated buffer, and returns it ready to be published
+    # The send time is taken as close as possible to the publish call, and is returned as well so the caller can use it for its own measurements
+    def build(self, sequence):
+        send_time = time.monotonic_ns()
+        sequence_struct.pack_into(self.buffer, sequence_offset, sequence, send_time)
+        return self.buffer, send_time
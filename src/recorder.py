@@ -0,0 +1,86 @@
+# Import of all necessary packages and libraries
+import struct
+import sys
+import time
+from array import array
+
+# Types of events that can be recorded:
+# - published -> client side, the publish of a message was completed (including necessary handshake for QoS levels 1 and 2)
+# - received -> server side, a message was received from the broker
+event_published = 1
+event_received = 2
+event_names = {event_published: "published", event_received: "received"}
+
+# Every recording file starts with a fixed header, followed by the four columns of the recording, one after the other:
+# - magic and version -> used to identify the file format
+# - byte order -> byte order of the columns, as they are written with the native byte order of the host
+# - count -> amount of events in the file
+# - wall time and monotonic time -> taken at the same moment, allow the conversion of the monotonic timestamps to UTC datetimes
+# The columns are sequence (int64), timestamp in monotonic nanoseconds (int64), event type (int8) and source client number (int32)
+file_magic = b"QSTR"
+file_version = 1
+file_header = struct.Struct(">4sBcQqq")
+
+# Timestamp recorder class, used to store the timestamps of every message in memory during a run, instead of writing them to a log file one by one
+# The columns are preallocated arrays with the expected amount of events, so recording an event from the network thread is just a few assignments
+class TimestampRecorder:
+    def __init__(self, capacity):
+        self.capacity = max(int(capacity), 1)
+        self.sequence = array('q', bytes(8*self.capacity))
+        self.timestamp = array('q', bytes(8*self.capacity))
+        self.event = array('b', bytes(self.capacity))
+        self.source = array('i', bytes(4*self.capacity))
+        self.count = 0
+
+    # Records an event with the current monotonic time, or with the given timestamp in case the caller already has one
+    # In case more events than expected are recorded (duplicate deliveries, for example), the columns are doubled in size
+    # Returns the index of the event, in case its sequence needs to be filled in later
+    def record(self, sequence, event, source=0, timestamp=None):
+        index = self.count
+        if index == self.capacity:
+            self.sequence.frombytes(bytes(8*self.capacity))
+            self.timestamp.frombytes(bytes(8*self.capacity))
+            self.event.frombytes(bytes(self.capacity))
+            self.source.frombytes(bytes(4*self.capacity))
+            self.capacity *= 2
+        self.sequence[index] = sequence
+        self.timestamp[index] = time.monotonic_ns() if timestamp is None else timestamp
+        self.event[index] = event
+        self.source[index] = source
+        self.count = index + 1
+        return index
+
+    # Writes all the recorded events to a binary file, once the run is finished
+    def flush(self, path):
+        with open(path, "wb") as recording_file:
+            recording_file.write(file_header.pack(file_magic, file_version, sys.byteorder[0].encode("ascii"), self.count, time.time_ns(), time.monotonic_ns()))
+            for column in (self.sequence, self.timestamp, self.event, self.source):
+                column[:self.count].tofile(recording_file)
+        return self.count
+
+# Reads a recording file into a dictionary with the four columns, and the wall and monotonic times of the moment it was written
+def read_recording(path):
+    with open(path, "rb") as recording_file:
+        magic, version, byteorder, count, wall_time, monotonic_time = file_header.unpack(recording_file.read(file_header.size))
+        if magic != file_magic or version != file_version:
+            raise ValueError(f"{path} is not a timestamp recording file")
+        recording = {"wall_time": wall_time, "monotonic_time": monotonic_time}
+        for name, typecode in (("sequence", 'q'), ("timestamp", 'q'), ("event", 'b'), ("source", 'i')):
+            column = array(typecode)
+            column.fromfile(recording_file, count)
+            if byteorder.decode("ascii") != sys.byteorder[0]:
+                column.byteswap()
+            recording[name] = column
+    return recording
+
+# The recording files can be converted to CSV by running this file directly, with the recording file as argument
+# Monotonic timestamps are converted to UTC using the wall and monotonic times stored in the file
+# Example: python src/recorder.py logs/server/server-timestamp-U<uuid>-R1.bin > server-R1.csv
+if __name__ == "__main__":
+    recording = read_recording(sys.argv[1])
+    offset = recording["wall_time"] - recording["monotonic_time"]
+    print("sequence,timestamp_ns,utc_ns,event,source")
+    for index in range(len(recording["sequence"])):
+        timestamp = recording["timestamp"][index]
+        event = recording["event"][index]
+        print(f"{recording['sequence'][index]},{timestamp},{timestamp+offset},{event_names.get(event, event)},{recording['source'][index]}")
@@ -0,0 +1,40 @@
+# Import of all necessary packages and libraries
+import json
+import os
+
+# Version of the run result records, increased whenever a field is renamed or changes meaning, so the dataset processor can tell them apart
+record_version = 1
+
+# Results file class, used by the server and the clients to write one machine readable record per repetition, besides the human readable logs
+# The file is append-only JSON lines, one compact JSON object per line, so it can be loaded linearly by the dataset processor without any regex
+# Every record holds the full run configuration, the broker settings and all the metrics calculated for the repetition, such as:
+# {"version": 1, "device": "server", "uuid": "...", "repetition": 1, "repetitions": 10, "valid": true, "config": {...}, "broker": {...}, "metrics": {...}}
+# Records are written with a single write call and synced to disk, so a crash never leaves more than the last line incomplete
+class ResultsFile:
+    def __init__(self, path):
+        self.path = path
+
+    # Appends a record to the results file
+    def write(self, record):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with open(self.path, "a") as results_file:
+            results_file.write(line)
+            results_file.flush()
+            os.fsync(results_file.fileno())
+
+# Reads the records of a results file starting from a byte offset, yielding (record, offset after the record) tuples
+# Only complete lines are read, so a file still being written can be resumed later from the returned offset
+# Lines that are not valid JSON (such as a line cut by a crash and followed by new records) are skipped
+def read_records(path, offset=0):
+    with open(path, "rb") as results_file:
+        results_file.seek(offset)
+        for raw_line in results_file:
+            if not raw_line.endswith(b"\n"):
+                break
+            offset += len(raw_line)
+            try:
+                record = json.loads(raw_line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                yield record, offset
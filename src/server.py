@@ -10,7 +10,19 @@ import threading
 import os
 import uuid
 import subprocess
-import zipfile
+from array import array
+import payload
+import recorder
+import accounting
+import latency
+import capture
+import archiver
+import results
+import convergence
+import sweep
+import campaign
+import telemetry
+import throttle
 
 mosquitto_conf = "conf/mosquitto.conf"
 system_conf = "conf/config.json"
@@ -36,18 +48,50 @@ begin_client = config['topics']['begin_client']
 void_run = config['topics']['void_run']
 finish_client = config['topics']['finish_client']
 client_done = config['topics']['client_done']
+clock_ping = config['topics']['clock_ping']
+clock_pong = config['topics']['clock_pong']
+client_ready = config['topics']['client_ready']
+start_publish = config['topics']['start_publish']
+run_drained = config['topics']['run_drained']
+clock_pings = config['clock_sync']['pings']
+clock_interval = config['clock_sync']['interval']
+clock_timeout = config['clock_sync']['timeout']
 system_runs = config['system_details']['different_runs']
 run_repetitions = config['system_details']['run_repetitions']
+adaptive_enabled = config['system_details']['adaptive_repetitions']['enable']
+adaptive_min = config['system_details']['adaptive_repetitions']['min_repetitions']
+adaptive_max = config['system_details']['adaptive_repetitions']['max_repetitions']
+adaptive_confidence = config['system_details']['adaptive_repetitions']['confidence']
+adaptive_tolerance = config['system_details']['adaptive_repetitions']['tolerance']
 queue_size = config['system_details']['queue_size']
 tcp_delay = config['system_details']['tcp_delay']
+cpu_performance = config['system_details']['cpu_performance']
+cpu_affinity = config['system_details']['cpu_affinity']
+throttle_method = config['system_details']['cpu_throttle']['method']
+throttle_period = config['system_details']['cpu_throttle']['period']
 message_details = config['system_details']['message_details']
+sweep_config = config['sweep']
 dumpcap_enabled = config['dumpcap']['enable']
 dumpcap_folder = str(config['dumpcap']['folder']).replace("#", client_id)
 dumpcap_filter = config['dumpcap']['filter']
+dumpcap_profile = config['dumpcap']['profile']
+dumpcap_profiles = config['dumpcap']['profiles']
 dumpcap_ext = config['dumpcap']['extension']
 dumpcap_buffer = config['dumpcap']['buffer_size']
+compression_codec = config['dumpcap']['compression']['codec']
+compression_level = config['dumpcap']['compression']['level']
+compression_workers = config['dumpcap']['compression']['workers']
 dumpcap_interface = config['dumpcap']['interface']['server']
 rtx_times = config['rtx_times']
+drain_quiet = config['drain']['quiet_period']
+ready_timeout = config['drain']['ready_timeout']
+resend_interval = config['drain']['resend_interval']
+void_timeout = config['drain']['void_timeout']
+telemetry_enabled = config['telemetry']['broker']['enable']
+sys_interval = config['telemetry']['broker']['sys_interval']
+sys_topic = telemetry.sys_prefix + "#"
+host_telemetry_enabled = config['telemetry']['host']['enable']
+host_interval = config['telemetry']['host']['interval']
 
 # Gathers current GMT/UTC datetime in string format, to append to the logger file name
 # This will allow distinction between different runs, as well as make it easy to locate the parity between client and server
@@ -59,7 +103,7 @@ class MQTT_Server:
     # Configures all the loggers to log and store every execution detail in appropriate files for future analysis
     # There are a total of two distinct loggers:
     # main_logger - used for all normal execution logging, regarding execution information and results reporting
-    # timestamp_logger - used to have an output of all timestamps of messages received from the broker
+    # timestamp_logger - used to keep track of the binary timestamp files of every run, which hold the timestamps of messages received from the broker
     def logger_setup(self):
         # Setup of the formatter for the loggers, to display time, levelname and message, and converts logger timezone to GMT as well
         formatter = logging.Formatter('[%(asctime)s] %(levelname)s: %(message)s')
@@ -91,15 +135,19 @@ class MQTT_Server:
         # - log_dest -> sets the Mosquitto log destination to a file, associated with a start timestamp
         # - max_queued_messages -> sets the queue size for QoS 1 and 2 messages per client to be processed, dropping messages when the queue is exceeded
         # - set_tcp_nodelay -> whether or not to use Nagle's algorithm for latency reduction at the exchange of an increased packet count
+        # - sys_interval -> period of the $SYS topics, sampled by the server during every repetition, or 0 to disable them without broker telemetry
+        # The queue size and TCP no delay are taken from the broker settings of the next run, which only change between groups of runs of a sweep
         self.main_logger.info(f"Reading Mosquitto configuration file")
         with open(mosquitto_conf, "r+") as config_file:
             config_data = config_file.read()
             config_data = re.sub("log_dest file .+", f"log_dest file {mosquitto_folder}mosquitto-T{append_time}.log", config_data)
-            config_data = re.sub("max_queued_messages .+", f"max_queued_messages {queue_size}", config_data)
-            config_data = re.sub("set_tcp_nodelay .+", f"set_tcp_nodelay {tcp_delay}", config_data)
+            config_data = re.sub("max_queued_messages .+", f"max_queued_messages {self.broker_settings['queue_size']}", config_data)
+            config_data = re.sub("set_tcp_nodelay .+", f"set_tcp_nodelay {self.broker_settings['tcp_delay']}", config_data)
+            config_data = re.sub("sys_interval .+", f"sys_interval {sys_interval if telemetry_enabled is True else 0}", config_data)
             self.main_logger.info(f"Mosquitto log file: {log_folder.replace('server', 'mosquitto')}mosquitto-T{append_time}.log")
-            self.main_logger.info(f"Max queue size per client: {queue_size} messages")
-            self.main_logger.info(f"Using TCP no delay algorithm: {bool(tcp_delay)}")
+            self.main_logger.info(f"Max queue size per client: {self.broker_settings['queue_size']} messages")
+            self.main_logger.info(f"Using TCP no delay algorithm: {bool(self.broker_settings['tcp_delay'])}")
+            self.main_logger.info(f"Broker telemetry: {f'every {sys_interval} seconds' if telemetry_enabled is True else 'disabled'}")
             config_file.seek(0)
             config_file.truncate()
             config_file.write(config_data)
@@ -109,15 +157,37 @@ class MQTT_Server:
         self.main_logger.info(f"Launching Mosquitto broker")
         mosquitto_call = ["mosquitto", "-v", "-c", mosquitto_conf]
         self.mosquitto_process = subprocess.Popen(mosquitto_call, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # Right after launching, the broker is limited to the CPU performance of the broker settings (in percentage of one core, since Mosquitto
+        # runs on a single thread) and pinned to the cores of the CPU affinity, with a cgroup v2 quota or a SIGSTOP/SIGCONT duty cycle
+        self.main_logger.info(f"Broker CPU performance: {self.broker_settings['cpu_performance']}%")
+        self.main_logger.info(f"Broker CPU affinity: {self.broker_settings['cpu_affinity'] if self.broker_settings['cpu_affinity'] is not None else 'any core'}")
+        try:
+            self.broker_throttle, self.broker_throttle_method = throttle.throttle_process(self.mosquitto_process.pid, self.broker_settings['cpu_performance'],
+                                                                                         self.broker_settings['cpu_affinity'], throttle_method, throttle_period)
+            self.main_logger.info(f"Broker CPU throttling method: {self.broker_throttle_method}")
+        except (OSError, ValueError) as error:
+            self.main_logger.error(f"Problem limiting the broker CPU ({error}), exiting script")
+            self.mosquitto_process.terminate()
+            raise(KeyboardInterrupt)
         # Small 3 second wait to guarantee broker is up and running before the server tries to connect to it
         time.sleep(3)
         self.broker_running = self.mosquitto_process.poll() is None
         if self.broker_running:
             self.main_logger.info(f"Mosquitto broker successfully launched")
+            # Starts the broker watchdog thread, which signals the system handler as soon as the broker stops running
+            threading.Thread(target = self.broker_watchdog, args = (self.mosquitto_process,), daemon = True).start()
         else:
             self.main_logger.error(f"Problem launching Mosquitto broker, exiting script")
             raise(KeyboardInterrupt)
     
+    # Broker watchdog function, which waits for the Mosquitto process to end and wakes up the system handler in case it is waiting for a run
+    # Since a new process is created every time the broker is launched, the watchdog only acts if the process it watches is still the current one
+    def broker_watchdog(self, process):
+        process.wait()
+        if process is self.mosquitto_process:
+            self.broker_running = False
+            self.run_event.set()
+
     # Callback for when the client object successfully connects to the broker with specified address
     def on_connect(self, client, userdata, flags, rc):
         if rc==0:
@@ -132,8 +202,17 @@ class MQTT_Server:
             self.main_logger.info(f"Subscribed to {client_done} topic with QoS 0")
             self.client.subscribe(void_run, qos=0)
             self.main_logger.info(f"Subscribed to {void_run} topic with QoS 0")
+            self.client.subscribe(clock_pong, qos=0)
+            self.main_logger.info(f"Subscribed to {clock_pong} topic with QoS 0")
+            self.client.subscribe(client_ready, qos=0)
+            self.main_logger.info(f"Subscribed to {client_ready} topic with QoS 0")
+            # The $SYS topics are subscribed for the broker telemetry, forgetting the values of the previous broker (if it was restarted)
+            if telemetry_enabled is True:
+                self.broker_telemetry.reset()
+                self.client.subscribe(sys_topic, qos=0)
+                self.main_logger.info(f"Subscribed to {sys_topic} topic with QoS 0")
+            # There is no need to wait for the clients to connect, since the start order of every run is resent until all clients are ready
             if self.connect_count == 1:
-                time.sleep(30)
                 self.sys_thread.start()
             elif self.connect_count > 1:
                 # If the server reconnects to the broker, it sends a void run message to all clients, including itself, and marks run as finished
@@ -142,6 +221,7 @@ class MQTT_Server:
                 self.main_logger.info(f"Server reconnected to broker, voiding current run and informing clients")
                 self.client.publish(void_run, payload=client_id, qos=0)
                 self.run_finished = True
+                self.run_event.set()
         else:
             # In case of error during connection the log will contain the error code for debugging
             self.main_logger.info(f"Error connecting to broker, with code {rc}")
@@ -154,102 +234,144 @@ class MQTT_Server:
         else:
             self.main_logger.warning(f"Abnormal disconnection from broker, with code {rc}")
 
-    # Callback for when the server receives a message on the main topic, on any of the 10 clients
-    # Its a callback per client instead of calculating the client on the received message, to try and minimize processing overhead during the transmission period
-    def on_maintopic_c0(self, client, userdata, msg):
-        # For every message received, increases the counter slot for the specific client, and logs the received datetime
-        self.run_client_received[0] += 1
-        self.run_client_timestamps[0].append(datetime.datetime.utcnow())
-        self.timestamp_logger.info(f"Received message #{self.run_client_received[0]} from the {msg.topic} topic")
-    
-    def on_maintopic_c1(self, client, userdata, msg):
-        self.run_client_received[1] += 1
-        self.run_client_timestamps[1].append(datetime.datetime.utcnow())
-        self.timestamp_logger.info(f"Received message #{self.run_client_received[1]} from the {msg.topic} topic")
-    
-    def on_maintopic_c2(self, client, userdata, msg):
-        self.run_client_received[2] += 1
-        self.run_client_timestamps[2].append(datetime.datetime.utcnow())
-        self.timestamp_logger.info(f"Received message #{self.run_client_received[2]} from the {msg.topic} topic")
-    
-    def on_maintopic_c3(self, client, userdata, msg):
-        self.run_client_received[3] += 1
-        self.run_client_timestamps[3].append(datetime.datetime.utcnow())
-        self.timestamp_logger.info(f"Received message #{self.run_client_received[3]} from the {msg.topic} topic")
-    
-    def on_maintopic_c4(self, client, userdata, msg):
-        self.run_client_received[4] += 1
-        self.run_client_timestamps[4].append(datetime.datetime.utcnow())
-        self.timestamp_logger.info(f"Received message #{self.run_client_received[4]} from the {msg.topic} topic")
-    
-    def on_maintopic_c5(self, client, userdata, msg):
-        self.run_client_received[5] += 1
-        self.run_client_timestamps[5].append(datetime.datetime.utcnow())
-        self.timestamp_logger.info(f"Received message #{self.run_client_received[5]} from the {msg.topic} topic")
-    
-    def on_maintopic_c6(self, client, userdata, msg):
-        self.run_client_received[6] += 1
-        self.run_client_timestamps[6].append(datetime.datetime.utcnow())
-        self.timestamp_logger.info(f"Received message #{self.run_client_received[6]} from the {msg.topic} topic")
-    
-    def on_maintopic_c7(self, client, userdata, msg):
-        self.run_client_received[7] += 1
-        self.run_client_timestamps[7].append(datetime.datetime.utcnow())
-        self.timestamp_logger.info(f"Received message #{self.run_client_received[7]} from the {msg.topic} topic")
-    
-    def on_maintopic_c8(self, client, userdata, msg):
-        self.run_client_received[8] += 1
-        self.run_client_timestamps[8].append(datetime.datetime.utcnow())
-        self.timestamp_logger.info(f"Received message #{self.run_client_received[8]} from the {msg.topic} topic")
-    
-    def on_maintopic_c9(self, client, userdata, msg):
-        self.run_client_received[9] += 1
-        self.run_client_timestamps[9].append(datetime.datetime.utcnow())
-        self.timestamp_logger.info(f"Received message #{self.run_client_received[9]} from the {msg.topic} topic")
+    # Callback for when the server receives a message on the main topic, from any of the clients
+    # A single callback is used for every client, which gets the client slot from the topic using a table built at the start of the run
+    # This allows runs with any amount of clients, while keeping the processing overhead during the transmission period low
+    def on_maintopic(self, client, userdata, msg):
+        slot = self.run_topic_slots.get(msg.topic)
+        if slot is None:
+            return
+        # For every message received, increases the counter slot for the specific client, and stores the first and last receive timestamps
+        # The sequence number is read directly from the payload header, built by the client, and recorded in memory with the receive timestamp
+        # It is also accounted in the sequence tracker, to detect lost, duplicate and reordered messages
+        # The send time in the header is converted to the server clock with the estimated offset of the client, to calculate the one way latency
+        # Messages with the run hash of another run or repetition (late deliveries of a previous repetition, for example) are dropped and only counted
+        receive_time = time.monotonic_ns()
+        header = payload.decode_header(msg.payload)
+        if header is not None:
+            if header[3] != self.run_hash:
+                self.run_foreign_messages += 1
+                return
+            sequence = header[0]
+            if self.run_clock_synced[slot]:
+                self.latency_histogram.record(receive_time - (header[1] - self.run_clock_offsets[slot]))
+        else:
+            sequence = payload.message_sequence(msg.payload)
+        self.run_client_received[slot] += 1
+        if self.run_client_first[slot] == 0:
+            self.run_client_first[slot] = receive_time
+        self.run_client_last[slot] = receive_time
+        self.timestamp_recorder.record(sequence, recorder.event_received, slot, receive_time)
+        self.sequence_tracker.record(slot, sequence)
     
+    # Callback for when the server receives a message on the client ready topic
+    def on_clientready(self, client, userdata, msg):
+        # When a message in this topic is received, means a client is capturing and waiting for the publish order
+        # Once every client of the run is ready, the system handler is signaled to send the publish order
+        ready = json.loads(msg.payload)
+        if (ready['uuid'], ready['repetition']) == self.run_key:
+            self.run_clients_ready.add(ready['client'])
+            if len(self.run_clients_ready) == self.run_client_amount:
+                self.ready_event.set()
+
     # Callback for when the server receives a message on the client done topic
     def on_clientdone(self, client, userdata, msg):
-        # When a message in this topic is received, means a client has finished the publish and slept for the retransmission period
-        # A counter of done clients is incremented, and when it reaches the amount of clients for the run, it is considered finished
-        self.run_client_done += 1
-        if self.run_client_done == self.run_client_amount:
-            # When a run is finished, the server unsubscribes from the main topic, and changes a corresponding flag,
-            # in order to proceed with result calculation and logging
-            self.client.unsubscribe(main_topic)
-            self.run_finished = True
+        # When a message in this topic is received, means a client has finished the publish and has no more messages inflight,
+        # or has stopped after the run was void
+        # The client is added to the set of done clients, and when it has all the clients of the run, the run is considered finished
+        done = json.loads(msg.payload)
+        if (done['uuid'], done['repetition']) == self.run_key:
+            self.run_clients_done.add(done['client'])
+            if len(self.run_clients_done) == self.run_client_amount:
+                # When a run is finished, the server changes a corresponding flag, in order to proceed with result calculation and logging
+                self.run_finished = True
+                self.run_event.set()
+                self.idle_event.set()
     
+    # Callback for when the server receives a message on the $SYS topics of the broker, which only stores the latest value for the sampler
+    def on_sys(self, client, userdata, msg):
+        self.broker_telemetry.record(msg.topic, msg.payload.decode('utf-8', 'replace'))
+
+    # Callback for when the server receives a message on the clock pong topic, which are the answers of the clients to the clock pings
+    def on_clockpong(self, client, userdata, msg):
+        self.clock_sync.record(msg.payload, time.monotonic_ns())
+
+    # Clock synchronization function, used before the publish order of every run to estimate the offset between the clock of the server and the clocks of all clients
+    # The server publishes a few pings, spaced by a small interval, and waits for the answers of the clients before calculating the offsets
+    # The offsets are stored in an array with the same length as the client amount in the run, and clients that didn't answer are flagged,
+    # in which case the latency of their messages is not calculated
+    def clock_synchronization(self):
+        self.clock_sync = latency.ClockSync()
+        for ping in range(clock_pings):
+            self.client.publish(clock_ping, latency.ping_struct.pack(time.monotonic_ns()), qos=0)
+            time.sleep(clock_interval)
+        time.sleep(clock_timeout)
+        self.run_clock_offsets = array('q', bytes(8*self.run_client_amount))
+        self.run_clock_synced = bytearray(self.run_client_amount)
+        for client in range(self.run_client_amount):
+            sample = self.clock_sync.sample(client)
+            if sample is None:
+                self.main_logger.warning(f"client-{client} did not answer the clock synchronization, latency will not be calculated for it")
+            else:
+                self.run_clock_offsets[client] = sample[1]
+                self.run_clock_synced[client] = 1
+                self.main_logger.info(f"client-{client} clock offset: {round(sample[1]/1000000,3)} ms (best RTT: {round(sample[0]/1000000,3)} ms)")
+
     #Callback for when the server receives a message on the void run topic
     def on_voidrun(self, client, userdata, msg):
         # In case a client has a sudden reconnection to the broker, the run is void and repeated, in order to not halt progress
         self.main_logger.warning(f"{msg.payload.decode('utf-8')} reconnected to the broker, voiding current run")
         self.void_run = True
+        self.run_event.set()
     
+    # Drain wait function, used once all clients are done to wait until no messages are received from the broker for the quiet period
+    # Any message received, including retransmissions and duplicates, restarts the quiet period
+    # The wait is limited to the retransmission period of the QoS level, determined in the configuration file
+    def drain_wait(self):
+        drain_start = time.monotonic_ns()
+        drain_limit = drain_start + int(rtx_times[self.run_msg_qos]*1000000000)
+        quiet_period = int(drain_quiet*1000000000)
+        while True:
+            now = time.monotonic_ns()
+            quiet = now - max(max(self.run_client_last), drain_start)
+            if quiet >= quiet_period:
+                self.main_logger.info(f"Run drained after {round((now-drain_start)/1000000000,2)} seconds, no messages received for {drain_quiet} seconds")
+                return True
+            if now >= drain_limit:
+                self.main_logger.warning(f"Run not drained after {rtx_times[self.run_msg_qos]} seconds, proceeding")
+                return False
+            time.sleep(min(quiet_period-quiet, drain_limit-now)/1000000000)
+
+    # Converts a monotonic timestamp in nanoseconds of the current run to a UTC datetime, using the reference taken at the start of the run
+    def monotonic_to_datetime(self, timestamp):
+        return self.run_datetime_reference + datetime.timedelta(microseconds=(timestamp-self.run_monotonic_reference)/1000)
+
     # Result logging function, used to calculate and output every relevant metric and result to the logger once a run is complete
     def result_logging(self):
         # Since the client message counters are in an array, a sum of all elements is needed to get the total message amount received
         run_msg_counter = sum(self.run_client_received)
         run_packet_loss = round(100-((run_msg_counter/self.run_total_msg_amount)*100),2)
-        # The expected finish is the datetime start of the first received message for the client summed with the expected publish time
-        client_expected_finish = [[] for _ in range(self.run_client_amount)]
-        overall_start_time = None
-        overall_finish_time = None
-        # The run start and finish points are the datetime of the first received message overall and the last received message overall
-        # To calculate so, since datetimes of the messages are per client, the server has to find the lowest datetime out of all first
-        # elements of every timestamps array, and the highest datetime out of all elements of every timestamps array
-        for client in range(self.run_client_amount):
-            client_expected_finish[client] = min(self.run_client_timestamps[client]) + datetime.timedelta(seconds=self.run_expected_time)
-            if overall_start_time == None:
-                overall_start_time = min(self.run_client_timestamps[client])
-            else:
-                client_start_time = min(self.run_client_timestamps[client])
-                if client_start_time < overall_start_time:
-                    overall_start_time = client_start_time
-            if overall_finish_time == None:
-                overall_finish_time = max(self.run_client_timestamps[client])
-            else:
-                client_finish_time = max(self.run_client_timestamps[client])
-                if client_finish_time > overall_finish_time:
-                    overall_finish_time = client_finish_time
+        # The last repetition flag is only set once a valid repetition completes the run
+        self.run_last = False
+        # The metrics of the repetition are also gathered in a dictionary, written to the results file even for invalid repetitions
+        metrics = {"received": run_msg_counter, "total": self.run_total_msg_amount, "loss": run_packet_loss,
+                   "expected_time": round(self.run_expected_time,3)}
+        if telemetry_enabled is True:
+            metrics["broker_sys"] = self.telemetry_logging()
+        if host_telemetry_enabled is True:
+            metrics["resources"] = self.resources_logging()
+        # The run start and finish points are the timestamp of the first received message overall and the last received message overall
+        # Since the first and last timestamps are stored per client, the server finds the lowest of the first timestamps and the highest of the last timestamps
+        # The expected finish is the timestamp of the first received message for each client summed with the expected publish time
+        # Clients from which no message was received are not taken into account
+        active_clients = [client for client in range(self.run_client_amount) if self.run_client_received[client] > 0]
+        if len(active_clients) == 0:
+            self.main_logger.warning(f"No messages were received from any of the clients")
+            self.result_record(False, metrics, "no messages received")
+            return False
+        overall_start_time = self.monotonic_to_datetime(min(self.run_client_first[client] for client in active_clients))
+        overall_finish_time = self.monotonic_to_datetime(max(self.run_client_last[client] for client in active_clients))
+        client_expected_finish = [self.monotonic_to_datetime(self.run_client_first[client]) + datetime.timedelta(seconds=self.run_expected_time) for client in active_clients]
         # With the absolute start and finish, the other metrics are easily calculated and logged
         # These metrics include:
         # - Packet loss
@@ -260,6 +382,8 @@ class MQTT_Server:
         run_exec_time = (overall_finish_time-overall_start_time)
         if run_exec_time.total_seconds() < self.run_expected_time:
             self.main_logger.warning(f"Execution time is lower than expected time by {round(self.run_expected_time - run_exec_time.total_seconds(),3)} seconds")
+            metrics["exec_time"] = round(run_exec_time.total_seconds(),3)
+            self.result_record(False, metrics, "execution time lower than expected")
             return False
         elif run_exec_time.total_seconds() >= self.run_expected_time:
             run_actual_freq = round((self.run_msg_amount-1)/(run_exec_time.total_seconds()),2)
@@ -278,36 +402,223 @@ class MQTT_Server:
             self.main_logger.info(f"Time factor: {run_time_factor}x of the expected time")
             self.main_logger.info(f"Actual frequency: {run_actual_freq} Hz")
             self.main_logger.info(f"Frequency factor: {run_frequency_factor}%")
+            metrics.update(self.sequence_logging())
+            # The one way latency percentiles are calculated from the histogram filled during the run
+            latency_report = self.latency_histogram.report()
+            if latency_report is not None:
+                self.main_logger.info(f"One way latency: p50 {latency_report['p50']} ms | p90 {latency_report['p90']} ms | p99 {latency_report['p99']} ms | p99.9 {latency_report['p99.9']} ms | max {latency_report['max']} ms")
+                if self.latency_histogram.negative > 0:
+                    self.main_logger.warning(f"Messages with negative latency due to clock offset error: {self.latency_histogram.negative}")
+            metrics.update({"start_time": overall_start_time.isoformat(), "expected_finish_time": min(client_expected_finish).isoformat(),
+                            "finish_time": overall_finish_time.isoformat(), "exec_time": round(run_exec_time.total_seconds(),3),
+                            "timefactor": run_time_factor, "freq": run_actual_freq, "freqfactor": run_frequency_factor,
+                            "latency": latency_report, "latency_negative": self.latency_histogram.negative})
+            self.run_metrics = metrics
+            self.convergence_logging(metrics)
+            self.result_record(True, metrics)
             return True
 
-    # System handler function, used to iterate through the configuration runs and give orders to all clients with each run information
-    def sys_handler(self):
-        # Before the server starts ordering the runs, it will double check the config file to make 
-        # sure all lists have the correct size
-        # In case a parameter in the message details of the config is a simple int, it means that parameter is the same for all runs
-        self.wrong_config = False
+    # Telemetry logging function, used to output the summary of the $SYS topics sampled during the repetition, returned in a dictionary
+    # The dropped publishes are the messages discarded by the broker once the queue of a client is full (max_queued_messages),
+    # so any loss with no dropped publishes didn't come from a broker queue overflow
+    def telemetry_logging(self):
+        summary = self.broker_telemetry.summary()
+        self.main_logger.info(f"Broker messages received: {summary['messages_received']} | sent: {summary['messages_sent']} | " +
+                              f"max inflight: {summary['inflight']} | max stored: {summary['stored']}")
+        self.main_logger.info(f"Broker 1 minute load (max): received {summary['load_received']} | sent {summary['load_sent']} messages/minute")
+        if summary['publish_dropped']:
+            self.main_logger.warning(f"Broker dropped publishes (queue overflow): {int(summary['publish_dropped'])}")
+        return summary
+
+    # Resources logging function, used to output the summary of the processes and host resources sampled during the repetition, returned in a dictionary
+    # A process close to 100% CPU (or the host close to 100%) during the run points to a saturated resource instead of the network or the broker settings
+    def resources_logging(self):
+        summary = self.host_telemetry.summary()
+        for name in self.host_telemetry.processes:
+            self.main_logger.info(f"{name} CPU: mean {summary[name]['cpu_mean']}% | max {summary[name]['cpu_max']}% | max memory {summary[name]['rss_max']} KB | " +
+                                  f"context switches {summary[name]['voluntary']} voluntary, {summary[name]['nonvoluntary']} nonvoluntary")
+        self.main_logger.info(f"Host CPU: mean {summary['host']['cpu_mean']}% | max {summary['host']['cpu_max']}%")
+        interface = summary['interface']
+        self.main_logger.info(f"Interface {dumpcap_interface}: received {interface['rx_packets']} packets ({interface['rx_bytes']} bytes) | " +
+                              f"sent {interface['tx_packets']} packets ({interface['tx_bytes']} bytes)")
+        if interface['rx_dropped'] or interface['tx_dropped']:
+            self.main_logger.warning(f"Interface {dumpcap_interface} dropped packets: {interface['rx_dropped']} received | {interface['tx_dropped']} sent")
+        return summary
+
+    # Convergence logging function, used to decide if the current repetition is the last one of the run
+    # With a fixed amount of repetitions, the run ends after run_repetitions valid repetitions
+    # With adaptive repetitions, the running statistics of the tracked metrics are updated with this repetition, and the run ends
+    # once the confidence interval of every tracked metric is narrower than its tolerance, or the maximum amount of repetitions is reached
+    def convergence_logging(self, metrics):
+        self.convergence_tracker.add(metrics)
+        if adaptive_enabled is False:
+            self.run_last = self.convergence_tracker.repetitions >= run_repetitions
+            return
+        widths = self.convergence_tracker.widths()
+        self.main_logger.info(f"Confidence interval width ({adaptive_confidence}%): " +
+                              " | ".join(f"{name} {round(width,3) if width is not None else '-'} (tolerance {adaptive_tolerance[name]})" for name, width in widths.items()))
+        if self.convergence_tracker.converged():
+            self.main_logger.info(f"Run converged after {self.convergence_tracker.repetitions} repetitions")
+            self.run_last = True
+        elif self.convergence_tracker.finished():
+            self.main_logger.warning(f"Run not converged after the maximum of {adaptive_max} repetitions, proceeding")
+            self.run_last = True
+
+    # Result record function, used to write the configuration, broker settings and metrics of the current repetition to the results file
+    # Invalid repetitions are also written, with the reason, since they are repeated with the same UUID and repetition number
+    def result_record(self, valid, metrics, reason=None):
+        record = {"version": results.record_version, "device": client_id, "uuid": self.run_uuid, "repetition": self.run_key[1]+1,
+                  "repetitions": self.run_repetition_limit, "last": self.run_last, "time": datetime.datetime.utcnow().isoformat(), "valid": valid,
+                  "config": {"client_amount": self.run_client_amount, "msg_qos": self.run_msg_qos, "msg_amount": self.run_msg_amount,
+                             "msg_size": self.run_msg_size, "msg_freq": self.run_msg_freq},
+                  "broker": {**self.broker_settings, "tcp_delay": bool(self.broker_settings['tcp_delay']), "cpu_throttle": self.broker_throttle_method},
+                  "metrics": metrics}
+        if reason is not None:
+            record["reason"] = reason
+        try:
+            self.results_file.write(record)
+            # The series of the broker telemetry is written to its own file, with the UUID and repetition of the results record
+            if telemetry_enabled is True:
+                self.telemetry_file.write({"version": results.record_version, "device": client_id, "uuid": self.run_uuid,
+                                           "repetition": self.run_key[1]+1, "valid": valid, **self.broker_telemetry.series()})
+            if host_telemetry_enabled is True:
+                self.host_file.write({"version": results.record_version, "device": client_id, "uuid": self.run_uuid,
+                                      "repetition": self.run_key[1]+1, "valid": valid, **self.host_telemetry.series()})
+        except OSError as error:
+            self.main_logger.error(f"Could not write the results record: {error}")
+
+    # Sequence logging function, used to output the per message accounting of the run, using the sequence numbers of every received message
+    # These metrics include, per client and in total (returned in a dictionary):
+    # - Missing sequence ranges (messages never received)
+    # - Duplicate deliveries, which are expected to happen with QoS 1, but are a violation of the exactly once delivery with QoS 2
+    # - Reordered messages (received after a message with a higher sequence number from the same client)
+    def sequence_logging(self):
+        total_unique = 0
+        total_duplicates = 0
+        total_reordered = 0
+        for client in range(self.run_client_amount):
+            unique, missing, duplicates, reordered = self.sequence_tracker.client_summary(client)
+            total_unique += unique
+            total_duplicates += duplicates
+            total_reordered += reordered
+            if missing > 0:
+                ranges = accounting.format_ranges(self.sequence_tracker.missing_ranges(client))
+                self.main_logger.warning(f"client-{client} missing {missing} messages, sequence ranges: {ranges}")
+            if duplicates > 0 or reordered > 0:
+                self.main_logger.info(f"client-{client} duplicate deliveries: {duplicates} | reordered messages: {reordered}")
+        self.main_logger.info(f"Unique messages received: {total_unique} out of {self.run_total_msg_amount} messages")
+        self.main_logger.info(f"Duplicate deliveries: {total_duplicates}")
+        if self.run_msg_qos == 2 and total_duplicates > 0:
+            self.main_logger.warning(f"QoS 2 exactly once violations: {total_duplicates}")
+        self.main_logger.info(f"Reordered messages: {total_reordered}")
+        if self.sequence_tracker.out_of_range > 0:
+            self.main_logger.warning(f"Messages with sequence number out of the run range: {self.sequence_tracker.out_of_range}")
+        if self.run_foreign_messages > 0:
+            self.main_logger.warning(f"Messages from other runs or repetitions dropped: {self.run_foreign_messages}")
+        # The totals are returned to be added to the results record of the repetition
+        return {"unique": total_unique, "missing": self.run_total_msg_amount-total_unique, "duplicates": total_duplicates,
+                "reordered": total_reordered, "out_of_range": self.sequence_tracker.out_of_range}
+
+    # Archiver setup function, used to start the archiver with the codec of the config file, or with deflate in case the codec is not available
+    def archiver_setup(self):
+        codec = compression_codec
+        if archiver.codec_available(codec) is False:
+            self.main_logger.warning(f"Capture compression codec {codec} not available, using deflate")
+            codec = "deflate"
+        self.main_logger.info(f"Compressing capture files with {codec} using {compression_workers} background workers")
+        # The capture files queued but not zipped by a previous execution of the server (interrupted or failed) are queued again
+        return archiver.Archiver(codec, compression_level, compression_workers, lambda level, message: getattr(self.main_logger, level)(message),
+                                 log_folder + client_id + "-archiver.json")
+
+    # Run planner function, used to build the list of runs of the execution, returning an empty list in case of any issue with the config file
+    # Without a sweep, the runs are taken from the message details, where every parameter is a list with one entry per run or a simple int
+    # for all runs, and the broker settings are the same for every run
+    # With a sweep, the runs are the full or fractional factorial of its parameter space, ordered to restart the broker as few times as possible
+    def run_planner(self):
+        if sweep_config['enable'] is True:
+            try:
+                plan = sweep.space_plan(sweep_config)
+            except ValueError as error:
+                self.main_logger.warning(f"Problem in config file, {error}")
+                return []
+            self.main_logger.info(f"Sweep planned with {len(plan)} runs and {sweep.broker_changes(plan)} broker restarts")
+            return plan
+        # Before the server starts ordering the runs, it will double check the config file to make sure all lists have the correct size
+        wrong_details = False
         for detail in message_details:
             if type(message_details[detail]) == list and len(message_details[detail]) != system_runs:
-                self.wrong_config = True
+                wrong_details = True
                 self.main_logger.warning(f"Problem in config file, {detail} has incorrect number of entries ({len(message_details[detail])}/{system_runs})")
+        if wrong_details:
+            return []
+        return sweep.details_plan(message_details, system_runs, {"queue_size": queue_size, "tcp_delay": tcp_delay,
+                                                                 "cpu_performance": cpu_performance, "cpu_affinity": cpu_affinity})
+
+    # System handler function, used to iterate through the configuration runs and give orders to all clients with each run information
+    def sys_handler(self):
+        self.wrong_config = len(self.run_plan) == 0
+        if adaptive_confidence not in convergence.t_table:
+            self.wrong_config = True
+            self.main_logger.warning(f"Problem in config file, adaptive repetitions confidence should be one of {list(convergence.t_table)}")
+        # The capture profile is either the same for all runs, or a list with one entry per run
+        profile_names = dumpcap_profile if type(dumpcap_profile) == list else [dumpcap_profile]
+        if type(dumpcap_profile) == list and len(dumpcap_profile) != len(self.run_plan):
+            self.wrong_config = True
+            self.main_logger.warning(f"Problem in config file, capture profile has incorrect number of entries ({len(dumpcap_profile)}/{len(self.run_plan)})")
+        for profile_name in profile_names:
+            if profile_name not in dumpcap_profiles:
+                self.wrong_config = True
+                self.main_logger.warning(f"Problem in config file, capture profile {profile_name} is not defined")
+        # The payload size is a measured variable, so runs with payloads smaller than the payload header are rejected instead of enlarged
+        for run_number, run_details in enumerate(self.run_plan):
+            if int(run_details['msg_size']) < payload.header_size:
+                self.wrong_config = True
+                self.main_logger.warning(f"Problem in config file, run {run_number+1} has a payload size of {run_details['msg_size']} bytes (minimum {payload.header_size} bytes)")
         # In case any issue is found with the config file, performs cleanup and exits
         if self.wrong_config:
+            self.finished = True
             self.cleanup()
         else:
-            # The config file has a parameter with the amount of system runs to be performed, which will be iterated in here
-            # However, to get a statistically relevant average, every different configuration is ran 10 times
-            for run in range(self.current_run, system_runs):
+            # The run plan has every run to be performed, which will be iterated in here
+            # However, to get a statistically relevant average, every different configuration is ran 10 times (run_repetitions)
+            # With adaptive repetitions, every configuration is ran until its metrics converge, between the minimum and maximum repetitions
+            for run in range(self.current_run, len(self.run_plan)):
+                # Broker settings only change between groups of runs of a sweep, in which case the broker needs to be restarted
+                # The system handler exits like when the broker stops running (without ending the clients), and the execution is restarted
+                # from this run, with Mosquitto launched with the broker settings of the run
+                if self.run_plan[run]["broker"] != self.broker_settings:
+                    self.main_logger.info(f"Broker settings change for run {run+1}, restarting broker")
+                    self.cleanup(inform_clients=False)
+                    self.main_logger.info(f"Exiting system handler thread")
+                    sys.exit()
                 rep = 0
-                # Generates an unique UUID for every different run, for easier identification in the logs
-                self.run_uuid = str(uuid.uuid4())
-                while rep < run_repetitions:
+                # The convergence tracker keeps the running statistics of the valid repetitions of the run, used to decide when the run is complete
+                # With adaptive repetitions, the run can have from min_repetitions up to max_repetitions
+                self.convergence_tracker = convergence.ConvergenceTracker(adaptive_tolerance, adaptive_confidence, adaptive_min, adaptive_max)
+                self.run_repetition_limit = adaptive_max if adaptive_enabled is True else run_repetitions
+                self.run_last = False
+                # In case the run was already started (before a broker or server restart), it's resumed from the campaign state,
+                # with the same UUID and after its last completed repetition, whose tracked metrics are added back to the convergence tracker
+                # Otherwise, generates an unique UUID for every different run, for easier identification in the logs
+                run_state = self.campaign_state.run_state(run)
+                if run_state is not None:
+                    self.run_uuid = run_state['uuid']
+                    for repetition in run_state['repetitions']:
+                        self.convergence_tracker.add(repetition['metrics'])
+                    rep = len(run_state['repetitions'])
+                    self.run_last = run_state['last']
+                    self.main_logger.info(f"Resuming run {run+1} with UUID {self.run_uuid} after {rep} completed repetitions")
+                else:
+                    self.run_uuid = str(uuid.uuid4())
+                    self.campaign_state.run_started(run, self.run_uuid)
+                while rep < self.run_repetition_limit and self.run_last == False:
                     # Creates a unique UUID for the run, to allow for easier identification in the logs
                     # Indicates on the logger which run is currently being ran, for the user to keep track
                     self.main_logger.info(f"==================================================")
-                    self.main_logger.info(f"EXECUTING RUN {run+1}/{system_runs} | REPETITION {rep+1}/{run_repetitions}")
+                    self.main_logger.info(f"EXECUTING RUN {run+1}/{len(self.run_plan)} | REPETITION {rep+1}/{self.run_repetition_limit}")
                     self.main_logger.info(f"Run UUID: {self.run_uuid}")
                     self.timestamp_logger.info(f"==================================================")
-                    self.timestamp_logger.info(f"EXECUTING RUN {run+1}/{system_runs} | REPETITION {rep+1}/{run_repetitions}")
+                    self.timestamp_logger.info(f"EXECUTING RUN {run+1}/{len(self.run_plan)} | REPETITION {rep+1}/{self.run_repetition_limit}")
                     self.timestamp_logger.info(f"Run UUID: {self.run_uuid}")
                     # Gathers all the information for the next run to be performed, such as:
                     # - client amount
@@ -315,34 +626,33 @@ class MQTT_Server:
                     # - message amount
                     # - message payload size
                     # - publishing frequency
-                    if type(message_details['client_amount']) == list:
-                        self.run_client_amount = message_details['client_amount'][run]
-                    else:
-                        self.run_client_amount = message_details['client_amount']
-                    if type(message_details['msg_qos']) == list:
-                        self.run_msg_qos = message_details['msg_qos'][run]
-                    else:
-                        self.run_msg_qos = message_details['msg_qos']
-                    if type(message_details['msg_amount']) == list:
-                        self.run_msg_amount = message_details['msg_amount'][run]
-                    else:
-                        self.run_msg_amount = message_details['msg_amount']
-                    if type(message_details['msg_size']) == list:
-                        self.run_msg_size = message_details['msg_size'][run]
-                    else:
-                        self.run_msg_size = message_details['msg_size']
-                    if type(message_details['msg_freq']) == list:
-                        self.run_msg_freq = message_details['msg_freq'][run]
-                    else:
-                        self.run_msg_freq = message_details['msg_freq']
+                    self.run_client_amount = self.run_plan[run]['client_amount']
+                    self.run_msg_qos = self.run_plan[run]['msg_qos']
+                    self.run_msg_amount = self.run_plan[run]['msg_amount']
+                    self.run_msg_size = self.run_plan[run]['msg_size']
+                    self.run_msg_freq = self.run_plan[run]['msg_freq']
+                    self.run_capture_profile = dumpcap_profile[run] if type(dumpcap_profile) == list else dumpcap_profile
                     # Calculates the total expected messages as well as the theoretical execution time
                     self.run_total_msg_amount = self.run_msg_amount * self.run_client_amount
                     self.run_expected_time = (self.run_msg_amount-1) / self.run_msg_freq
-                    # Creates the counter and timestamp arrays, with the same length as client amount in the run
-                    self.run_client_received = [0 for _ in range(self.run_client_amount)]
-                    self.run_client_timestamps = [[] for _ in range(self.run_client_amount)]
-                    self.run_client_done = 0
-                    self.run_time_elapsed = 0
+                    # Creates the counter and first/last timestamp arrays, with the same length as client amount in the run
+                    # The clock offsets are only estimated once every client is ready, so until then no client is synchronized
+                    # Also builds the table used to get the client slot of every received message from its topic
+                    self.run_client_received = array('q', bytes(8*self.run_client_amount))
+                    self.run_clock_offsets = array('q', bytes(8*self.run_client_amount))
+                    self.run_clock_synced = bytearray(self.run_client_amount)
+                    self.run_client_first = array('q', bytes(8*self.run_client_amount))
+                    self.run_client_last = array('q', bytes(8*self.run_client_amount))
+                    self.run_topic_slots = {main_topic.replace("#", f"client-{client}"): client for client in range(self.run_client_amount)}
+                    # Reference datetime and monotonic timestamp of the run, used to convert the receive timestamps to datetimes
+                    self.run_datetime_reference = datetime.datetime.utcnow()
+                    self.run_monotonic_reference = time.monotonic_ns()
+                    # The timestamp recorder keeps the timestamps of every received message in memory, to avoid writing to a file from the network thread
+                    self.timestamp_recorder = recorder.TimestampRecorder(self.run_total_msg_amount)
+                    # The sequence tracker accounts for every sequence number received from every client during the run
+                    self.sequence_tracker = accounting.SequenceTracker(self.run_client_amount, self.run_msg_amount)
+                    # The latency histogram stores the one way latency of every received message, calculated with the clock offsets of the clients
+                    self.latency_histogram = latency.LatencyHistogram()
                     self.void_run = False
                     if dumpcap_enabled is True:
                         os.makedirs(dumpcap_folder.replace("*C", f"{self.run_client_amount}C"), exist_ok=True)
@@ -362,97 +672,178 @@ class MQTT_Server:
                     self.main_logger.info(f"Message size: {self.run_msg_size} bytes")
                     self.main_logger.info(f"Publishing frequency: {self.run_msg_freq} Hz")
                     self.main_logger.info(f"QoS level: {self.run_msg_qos}")
-                    # Dumps the information to a JSON payload to send to all the clients, and publishes it to the client topic
-                    client_config = json.dumps({"uuid": str(self.run_uuid), "repetition": rep, "client_amount": self.run_client_amount, "msg_qos": self.run_msg_qos, "msg_amount": self.run_msg_amount, "msg_size": self.run_msg_size, "msg_freq": self.run_msg_freq})
-                    self.client.publish(begin_client, client_config, qos=0)
-                    self.main_logger.info(f"Sent configuration and start order to all the clients")
+                    # Resets the run flags and events, and the sets of clients that are ready and done for this run
+                    # The run key (UUID and repetition) is used to ignore ready and done messages from previous runs
+                    self.run_key = (self.run_uuid, rep)
+                    self.run_hash = payload.run_hash(self.run_uuid, rep)
+                    self.run_foreign_messages = 0
+                    self.run_clients_ready = set()
+                    self.run_clients_done = set()
                     self.run_finished = False
+                    self.run_event.clear()
+                    self.ready_event.clear()
+                    self.idle_event.clear()
+                    # The run has a deadline, calculated from the expected publish time, the retransmission period and extra setup delays
+                    # If the run is not finished by then, it's assumed a void run message was lost
+                    sniff_duration = (self.run_msg_amount/self.run_msg_freq)+rtx_times[self.run_msg_qos]+ready_timeout+7.5
                     if dumpcap_enabled is True:
                         # Using the Subprocess module, starts a Dumpcap capture with the following options:
                         # - interface -> taken from the config file, usually eth0
                         # - capture filter -> taken from the config file, should be "tcp port 1883" to only capture traffic on this port and protocol
+                        #   the capture profile can have a tighter filter for each QoS level
                         # - output file -> defined before the thread was started, is the file name to which the capture will be output
-                        # - duration -> the amount of time the sniffing will run, calculated from the expected time and extra setup delays
+                        # - duration -> the maximum amount of time the sniffing will run, calculated from the expected time and extra setup delays
+                        #   the capture is normally stopped earlier, once the run is drained
                         # - buffer size -> in order to avoid publish interruptions due to disk writing of the packets, a big buffer is defined in order to store in memory before writing
-                        sniff_duration = (self.run_msg_amount/self.run_msg_freq)+rtx_times[self.run_msg_qos]+7.5
+                        # - capture profile options -> snaplen (to only keep the headers of every packet) and ring buffer file rotation
+                        #   the snaplen is calculated for the longest topic of the run, since the server captures the messages of every client
+                        # The capture is started before the start order, and the server waits for it to be capturing before the clients are ordered to publish
+                        topic_length = len(main_topic.replace("#", f"client-{self.run_client_amount-1}"))
+                        capture_filter, profile_options = capture.profile_options(dumpcap_profiles[self.run_capture_profile], self.run_msg_qos, topic_length, dumpcap_filter)
                         self.main_logger.info(f"Setting up Dumpcap capture")
                         self.main_logger.info(f"Interface: {dumpcap_interface}")
-                        self.main_logger.info(f"Capture filter: {dumpcap_filter}")
+                        self.main_logger.info(f"Capture profile: {self.run_capture_profile} {' '.join(profile_options)}")
+                        self.main_logger.info(f"Capture filter: {capture_filter}")
                         self.main_logger.info(f"Capture file: {os.path.basename(self.dumpcap_file)}")
                         self.main_logger.info(f"Sniffing duration: {round(sniff_duration,2)} seconds")
-                        dumpcap_call = ["dumpcap", "-i", dumpcap_interface, "-P", "-f", dumpcap_filter,
-                                        "-a", f"duration:{sniff_duration}", "-B", str(dumpcap_buffer), "-w", self.dumpcap_file]
-                        self.dumpcap_subprocess = subprocess.Popen(dumpcap_call, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                        if self.dumpcap_subprocess.poll() is None:
+                        dumpcap_call = ["dumpcap", "-i", dumpcap_interface, "-P", "-f", capture_filter, "-a", f"duration:{sniff_duration}",
+                                        "-B", str(dumpcap_buffer)] + profile_options + ["-w", self.dumpcap_file]
+                        self.dumpcap_capture = capture.DumpcapCapture(dumpcap_call)
+                        if self.dumpcap_capture.wait_capturing(ready_timeout):
                             self.main_logger.info(f"Dumpcap capture successfully started")
-                    # While the run is not finished, the thread waits and periodically checks if the run has ended
+                        else:
+                            self.main_logger.warning(f"Dumpcap did not report the capture running after {ready_timeout} seconds")
+                    # Dumps the information to a JSON payload to send to all the clients, and publishes it to the client topic
+                    # The start order is resent periodically until all clients of the run are ready (capturing and waiting for the publish order),
+                    # which also covers clients that connect to the broker after the first order was sent
+                    client_config = json.dumps({"uuid": str(self.run_uuid), "repetition": rep, "client_amount": self.run_client_amount, "msg_qos": self.run_msg_qos, "msg_amount": self.run_msg_amount, "msg_size": self.run_msg_size, "msg_freq": self.run_msg_freq,
+                                                "capture_profile": self.run_capture_profile})
+                    ready_deadline = time.monotonic() + ready_timeout
+                    while self.void_run == False:
+                        self.client.publish(begin_client, client_config, qos=0)
+                        self.main_logger.info(f"Sent configuration and start order to all the clients")
+                        if self.ready_event.wait(max(min(resend_interval, ready_deadline - time.monotonic()), 0)):
+                            break
+                        if time.monotonic() >= ready_deadline:
+                            self.main_logger.error(f"Only {len(self.run_clients_ready)} out of {self.run_client_amount} clients ready after {ready_timeout} seconds, voiding current run")
+                            self.client.publish(void_run, payload=client_id, qos=0)
+                            self.void_run = True
+                    if self.void_run == False:
+                        # Estimates the clock offsets of the clients once all of them are ready, so every client is connected and answers the pings
+                        # (after the server starts or the broker restarts, the clients may only connect while the start order is being resent)
+                        self.clock_synchronization()
+                        self.client.publish(start_publish, json.dumps({"uuid": str(self.run_uuid), "repetition": rep}), qos=0)
+                        self.main_logger.info(f"All {self.run_client_amount} clients ready, sent publish order")
+                        # The broker and host telemetry are sampled from the publish order until the run is drained
+                        # The host telemetry samples the broker, the server and the Dumpcap processes
+                        if telemetry_enabled is True:
+                            self.broker_telemetry.start()
+                        if host_telemetry_enabled is True:
+                            self.host_telemetry.start({"mosquitto": self.mosquitto_process.pid, "server": os.getpid(),
+                                                       "dumpcap": self.dumpcap_capture.process.pid if dumpcap_enabled is True else None})
+                    run_deadline = time.monotonic() + sniff_duration + 10
+                    # While the run is not finished, the thread waits for the run event, which is signaled when all clients are done,
+                    # when the run is void, or when the broker stops running, or until the run deadline is reached
                     while self.run_finished == False:
+                        self.run_event.wait(max(run_deadline - time.monotonic(), 0))
                         self.broker_running = self.mosquitto_process.poll() is None
                         if self.broker_running is False:
                             self.main_logger.error(f"Broker has stopped running, restarting execution from beggining of latest run")
+                            self.broker_telemetry.stop()
+                            self.host_telemetry.stop()
                             if dumpcap_enabled is True:
                                 self.main_logger.info(f"Terminating Dumpcap capture due to broker stopping")
-                                self.dumpcap_subprocess.terminate()
+                                self.dumpcap_capture.stop()
                                 self.main_logger.info(f"Deleting Dumpcap capture file of current run due to broker stopping")
-                                os.remove(self.dumpcap_file)
+                                for capture_file in capture.capture_files(self.dumpcap_file):
+                                    os.remove(capture_file)
                             self.cleanup()
                             self.main_logger.info(f"Exiting system handler thread")
                             sys.exit()
-                        if self.run_time_elapsed > (sniff_duration+10):
+                        if self.run_finished == False and time.monotonic() >= run_deadline:
                             self.main_logger.error(f"Run not yet finished after sniffing ended, assuming void run message was not received")
                             self.void_run = True
                         if self.void_run == True:
                             self.main_logger.info(f"Current run is void, exiting listening loop")
                             break
-                        time.sleep(20)
-                        self.current_run_time += 20
+                    if self.void_run == False:
+                        # Once all clients are done (no more messages inflight on their side), the server waits for the run to be drained,
+                        # meaning no more messages or retransmissions are received from the broker for the configured quiet period
+                        # After that, the server stops listening to the main topic and informs the clients, so they can stop their captures
+                        self.drain_wait()
+                        self.client.unsubscribe(main_topic)
+                        self.client.publish(run_drained, json.dumps({"uuid": str(self.run_uuid), "repetition": rep}), qos=0)
+                    # Since the quiet period of the drain is longer than the $SYS interval, the last sample has the counters after the last message
+                    self.broker_telemetry.stop()
+                    self.host_telemetry.stop()
+                    if dumpcap_enabled is True:
+                        self.dumpcap_capture.stop()
                     if self.void_run == False:
                         # Once the run is ended, all results are calculated and logged
                         # In case the run is deemed invalid, the repetition counter is not incremented and the run is repeated once more
                         run_result = self.result_logging()
+                        # The recorded timestamps are written to a binary file for this repetition
+                        timestamp_file = log_folder + client_id + "-timestamp-U" + self.run_uuid + "-R" + str(rep+1) + ".bin"
+                        timestamp_count = self.timestamp_recorder.flush(timestamp_file)
+                        self.timestamp_logger.info(f"Recorded {timestamp_count} receive timestamps to {os.path.basename(timestamp_file)}")
                         if run_result == True:
-                            # Since capture files can be quite big in size, as soon as a run is complete, the capture file is compressed into the previously mentioned zip file
-                            # Once zipped, the original files are deleted, to free up the cached memory as well as storage space
+                            # Since capture files can be quite big in size, as soon as a run is complete, the capture file is queued to be compressed into
+                            # the previously mentioned zip file by the archiver, in the background, so the next repetition can start right away
+                            # Once zipped and verified, the original file is deleted by the archiver, to free up the cached memory as well as storage space
+                            # With a ring buffer, every file written by Dumpcap is queued
                             if dumpcap_enabled is True:
-                                self.main_logger.info(f"Zipping Dumpcap capture files to free up memory")
-                                self.main_logger.info(f"Zip file: {os.path.basename(self.zip_file)}")
-                                self.zip = zipfile.ZipFile(self.zip_file, "a", zipfile.ZIP_DEFLATED)
-                                self.main_logger.info(f"Zipping and deleting {os.path.basename(self.dumpcap_file)}")
-                                self.zip.write(self.dumpcap_file, os.path.basename(self.dumpcap_file))
-                                self.zip.close()
+                                for capture_file in capture.capture_files(self.dumpcap_file):
+                                    self.main_logger.info(f"Queued {os.path.basename(capture_file)} to be zipped into {os.path.basename(self.zip_file)} ({self.archiver.pending()} capture files already queued)")
+                                    self.archiver.submit(self.zip_file, capture_file)
+                                self.dumpcap_file = None
                             rep += 1
+                            # The completed repetition is saved to the campaign state, with the metrics tracked for convergence
+                            self.campaign_state.repetition_done(run, rep, {name: self.run_metrics.get(name) for name in adaptive_tolerance}, self.run_last)
                     # If a run is deemed as void, the capture file will not be needed, and is deleted without being zipped
                     elif self.void_run == True and dumpcap_enabled is True:
                         self.main_logger.info(f"Deleting Dumpcap capture file of current run due to being void")
-                    if dumpcap_enabled is True:
-                        os.remove(self.dumpcap_file)
+                    if dumpcap_enabled is True and self.dumpcap_file is not None:
+                        for capture_file in capture.capture_files(self.dumpcap_file):
+                            os.remove(capture_file)
                     if self.void_run == True:
-                        self.main_logger.info(f"Waiting 60 seconds before sending next run order for synchronization purposes")
-                        time.sleep(60)
+                        # Before sending the next run order, the server waits for all clients to inform they have stopped the void run, up to a maximum period
+                        self.client.unsubscribe(main_topic)
+                        self.main_logger.info(f"Waiting up to {void_timeout} seconds for all clients to stop the void run")
+                        if self.idle_event.wait(void_timeout) is False:
+                            self.main_logger.warning(f"Only {len(self.run_clients_done)} out of {self.run_client_amount} clients stopped the void run, proceeding")
                 self.current_run += 1
+                self.campaign_state.run_done(run)
             # Once all runs are finished, cleans up everything and exits
+            self.campaign_state.campaign_done()
             self.finished = True
             self.cleanup()
     
     # Cleanup function, used to inform all clients to shutdown and gracefully clean everything MQTT related,
     # using the previously mentioned connected flag
-    def cleanup(self):
+    # For a broker restart, the clients are not informed, since they reconnect once the broker is running again
+    def cleanup(self, inform_clients=True):
         self.main_logger.info(f"==================================================")
         self.main_logger.info(f"Performing cleanup of MQTT connection, exiting and informing clients")
-        # Removes all added callbacks, and in case the client is connected, publishes a client_done message with None payload
-        # After that, unsubscribes from the topics, disconnects, and turns the flag to false
-        for client in range(10):
-            self.client.message_callback_remove(f"{main_topic}/client-{client}")
-        self.client.message_callback_remove(client_done)
+        # Removes all added callbacks, and in case the client is connected, publishes a finish_client message with None payload (unless the clients
+        # keep running, when the broker is only restarted with new settings)
+        # After that, unsubscribes from every topic subscribed on connection and by the system handler, and disconnects
+        for topic in (main_topic, client_done, void_run, clock_pong, client_ready, sys_topic):
+            self.client.message_callback_remove(topic)
         if self.mqtt_connected:
-            self.client.publish(finish_client, None, qos=0)
-            self.client.unsubscribe(main_topic)
-            self.client.unsubscribe(client_done)
+            if inform_clients:
+                self.client.publish(finish_client, None, qos=0)
+            self.client.unsubscribe([main_topic, client_done, void_run, clock_pong, client_ready, sys_topic])
         self.client.disconnect()
         # Manually closes the Mosquitto service to not leave it hanging and blocking the port for future runs
         if self.broker_running:
             self.main_logger.info(f"Closing Mosquitto service")
             self.mosquitto_process.terminate()
+            self.mosquitto_process.wait()
+            self.broker_running = False
+        # The CPU throttle of the broker is only removed once the broker has ended, since its cgroup can't be removed while the broker is in it
+        if self.broker_throttle is not None:
+            self.broker_throttle.close()
+            self.broker_throttle = None
 
     # Starts the server class with all the variables necessary
     def __init__(self):
@@ -468,34 +859,64 @@ class MQTT_Server:
         self.mqtt_connected = False
         self.current_run = 0
         self.void_run = False
-        # In case the broker shuts down mid execution, it will be automatically restarted and the 
-        while self.finished is False:
-            # Arranges the Mosquitto configuration file with the correct parameters, and launches the service
-            self.launch_mosquitto()
-            # Declares the thread where the system handler will run
-            self.sys_thread = threading.Thread(target = self.sys_handler, args=())
-            # Starts the MQTT client with specified ID, passed through the input arguments, and defines all callbacks
-            self.main_logger.info(f"Creating MQTT Client with ID {client_id}")
-            self.client = mqtt.Client(client_id=client_id)
-            self.client.on_connect = self.on_connect
-            self.client.on_disconnect = self.on_disconnect
-            self.client.message_callback_add(main_topic.replace("#", f"client-0"), self.on_maintopic_c0)
-            self.client.message_callback_add(main_topic.replace("#", f"client-1"), self.on_maintopic_c1)
-            self.client.message_callback_add(main_topic.replace("#", f"client-2"), self.on_maintopic_c2)
-            self.client.message_callback_add(main_topic.replace("#", f"client-3"), self.on_maintopic_c3)
-            self.client.message_callback_add(main_topic.replace("#", f"client-4"), self.on_maintopic_c4)
-            self.client.message_callback_add(main_topic.replace("#", f"client-5"), self.on_maintopic_c5)
-            self.client.message_callback_add(main_topic.replace("#", f"client-6"), self.on_maintopic_c6)
-            self.client.message_callback_add(main_topic.replace("#", f"client-7"), self.on_maintopic_c7)
-            self.client.message_callback_add(main_topic.replace("#", f"client-8"), self.on_maintopic_c8)
-            self.client.message_callback_add(main_topic.replace("#", f"client-9"), self.on_maintopic_c9)
-            self.client.message_callback_add(client_done, self.on_clientdone)
-            self.client.message_callback_add(void_run, self.on_voidrun)
-            # The MQTT client connects to the broker and the network loop iterates forever until the cleanup function
-            # The keep alive is set to 1 minute
-            self.connect_count = 0
-            self.client.connect(broker_address, 1883, 60)
-            self.client.loop_forever()
+        self.run_topic_slots = {}
+        # Event used to wake up the system handler when a run finishes, is void, or the broker stops running
+        self.run_event = threading.Event()
+        # Events used to wake up the system handler when all clients are ready for a run, and when all clients have stopped a run
+        self.ready_event = threading.Event()
+        self.idle_event = threading.Event()
+        self.run_key = None
+        self.run_hash = None
+        self.run_foreign_messages = 0
+        # Machine readable results file, with one JSON line per repetition, read by the dataset processor instead of the main logs
+        self.results_file = results.ResultsFile(log_folder + client_id + "-results.jsonl")
+        # The broker telemetry samples the $SYS topics of Mosquitto during every repetition, with its series written to its own file
+        self.broker_telemetry = telemetry.BrokerTelemetry(sys_interval)
+        self.telemetry_file = results.ResultsFile(log_folder + client_id + "-broker.jsonl")
+        # The host telemetry samples the resources of the processes and the host from /proc during every repetition, also with its own file
+        self.host_telemetry = telemetry.HostTelemetry(host_interval, dumpcap_interface)
+        self.host_file = results.ResultsFile(log_folder + client_id + "-host.jsonl")
+        # The archiver compresses the capture files of the valid repetitions in the background, with a pool of worker threads
+        self.archiver = self.archiver_setup()
+        # The plan of the execution is built once, and the broker settings start as the ones of the config file
+        self.run_plan = self.run_planner()
+        self.broker_settings = {"queue_size": queue_size, "tcp_delay": tcp_delay, "cpu_performance": cpu_performance, "cpu_affinity": cpu_affinity}
+        self.broker_throttle = None
+        self.broker_throttle_method = "none"
+        # The campaign state keeps the progress of the execution in a file, so a restarted server resumes the same plan where it stopped
+        self.campaign_state = campaign.CampaignState(log_folder + client_id + "-campaign.json", self.run_plan)
+        if self.campaign_state.resumed is True:
+            self.current_run = self.campaign_state.current_run()
+            self.main_logger.info(f"Resuming campaign from run {self.current_run+1}/{len(self.run_plan)}")
+        try:
+            # In case the broker shuts down mid execution, it will be automatically restarted and the 
+            while self.finished is False:
+                # Arranges the Mosquitto configuration file with the correct parameters (the broker settings of the next run), and launches the service
+                if self.current_run < len(self.run_plan):
+                    self.broker_settings = self.run_plan[self.current_run]["broker"]
+                self.launch_mosquitto()
+                # Declares the thread where the system handler will run
+                self.sys_thread = threading.Thread(target = self.sys_handler, args=())
+                # Starts the MQTT client with specified ID, passed through the input arguments, and defines all callbacks
+                self.main_logger.info(f"Creating MQTT Client with ID {client_id}")
+                self.client = mqtt.Client(client_id=client_id)
+                self.client.on_connect = self.on_connect
+                self.client.on_disconnect = self.on_disconnect
+                self.client.message_callback_add(main_topic, self.on_maintopic)
+                self.client.message_callback_add(client_done, self.on_clientdone)
+                self.client.message_callback_add(void_run, self.on_voidrun)
+                self.client.message_callback_add(clock_pong, self.on_clockpong)
+                self.client.message_callback_add(client_ready, self.on_clientready)
+                self.client.message_callback_add(sys_topic, self.on_sys)
+                # The MQTT client connects to the broker and the network loop iterates forever until the cleanup function
+                # The keep alive is set to 1 minute
+                self.connect_count = 0
+                self.client.connect(broker_address, 1883, 60)
+                self.client.loop_forever()
+        finally:
+            # Before exiting (even when interrupted or on any error), waits for the archiver to zip every queued capture file
+            self.main_logger.info(f"Waiting for {self.archiver.pending()} queued capture files to be zipped")
+            self.archiver.close()
 
 # Starts one MQTT Server class object
 # Small exception handler in case the user decides to use Ctrl-C to finish the program mid execution
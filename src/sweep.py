@@ -0,0 +1,67 @@
+# Sweep planner, used by the server to build the list of runs of an execution
+# Every run is a dictionary with the run parameters (sent to the clients) and the broker settings (applied to the Mosquitto configuration)
+# Runs are either taken from the parallel lists of the message details (one entry per run), or expanded from a declarative parameter space:
+# {"fraction": 1, "broker": {"queue_size": [1000, 100], "tcp_delay": [1, 0], ...}, "runs": {"client_amount": [1, 10], "msg_qos": [0, 1, 2], ...}}
+# where every parameter is a list of levels or a single value (the CPU affinity levels are lists of cores, or null for any core)
+
+# Parameters of a run, sent to the clients with the start order
+run_parameters = ("client_amount", "msg_qos", "msg_amount", "msg_size", "msg_freq")
+# Broker settings, which need the Mosquitto configuration to be rewritten (or its CPU limits to be applied) and the broker to be restarted to change
+broker_parameters = ("queue_size", "tcp_delay", "cpu_performance", "cpu_affinity")
+
+# Builds the runs of the message details of the config file, where every parameter is either a list with one entry per run, or a single value for all runs
+# The broker settings are the same for every run
+def details_plan(message_details, system_runs, broker_settings):
+    return [{"broker": dict(broker_settings), **{name: message_details[name][run] if type(message_details[name]) == list else message_details[name]
+                                                 for name in run_parameters}} for run in range(system_runs)]
+
+# Expands the level indexes of a list of factors (given as their amount of levels) in reflected order, where consecutive combinations
+# differ in a single factor (like a Gray code), with the first factor changing the least often
+def reflected_product(level_amounts):
+    combinations = [()]
+    for level_amount in level_amounts:
+        expanded = []
+        for index, combination in enumerate(combinations):
+            levels = range(level_amount) if index % 2 == 0 else range(level_amount-1, -1, -1)
+            expanded += [combination + (level,) for level in levels]
+        combinations = expanded
+    return combinations
+
+# Expands a parameter space into the runs of its full factorial, or of a fraction of it
+# The broker settings are the outer factors of the expansion, so all the runs with the same broker settings are consecutive,
+# and consecutive groups only differ in one broker setting, which keeps the broker restarts to the minimum (one per group)
+# Inside a group, consecutive runs also differ in a single parameter
+# With a fraction above 1, only the combinations with the sum of their level indexes divisible by the fraction are kept, which is a
+# regular fraction of the design (with 3 level factors and a fraction of 3, every pair of factors still has all its combinations of levels)
+def space_plan(space):
+    broker_space = space.get("broker", {})
+    run_space = space.get("runs", {})
+    fraction = space.get("fraction", 1)
+    unknown = [name for name in broker_space if name not in broker_parameters] + [name for name in run_space if name not in run_parameters]
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters {unknown}")
+    missing = [name for name in broker_parameters if name not in broker_space] + [name for name in run_parameters if name not in run_space]
+    if missing:
+        raise ValueError(f"Missing sweep parameters {missing}")
+    if type(fraction) != int or fraction < 1:
+        raise ValueError(f"Sweep fraction should be a positive integer, not {fraction}")
+    factors = [("broker", name, broker_space[name]) for name in broker_parameters] + [("runs", name, run_space[name]) for name in run_parameters]
+    factors = [(kind, name, levels if type(levels) == list else [levels]) for kind, name, levels in factors]
+    if any(len(levels) == 0 for kind, name, levels in factors):
+        raise ValueError(f"Sweep parameters without levels {[name for kind, name, levels in factors if len(levels) == 0]}")
+    plan = []
+    for combination in reflected_product([len(levels) for kind, name, levels in factors]):
+        if sum(combination) % fraction != 0:
+            continue
+        run = {"broker": {}}
+        for (kind, name, levels), level in zip(factors, combination):
+            if kind == "broker":
+                run["broker"][name] = levels[level]
+            else:
+                run[name] = levels[level]
+        plan.append(run)
+    return plan
+
+# Counts the broker restarts needed by a plan, which happen every time the broker settings change between consecutive runs
+def broker_changes(plan):
+    return sum(1 for previous, run in zip(plan, plan[1:]) if previous["broker"] != run["broker"])
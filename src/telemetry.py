@@ -0,0 +1,246 @@
+# Import of all necessary packages and libraries
+import os
+import threading
+import time
+
+# Prefix of the $SYS topics of Mosquitto, which the server subscribes to with $SYS/broker/#
+sys_prefix = "$SYS/broker/"
+
+# $SYS topics sampled during every repetition, with their name in the series and the summary, and how they are summarized:
+# - counter -> cumulative since the broker started, summarized as the increase during the repetition
+# - gauge -> current value (inflight and stored messages, connected clients), summarized as the maximum during the repetition
+# - load -> 1 minute moving average of a rate, summarized as the maximum during the repetition
+# Mosquitto 2 has no inflight topic, in which case the value is None
+sys_topics = {
+    "messages/received": ("messages_received", "counter"),
+    "messages/sent": ("messages_sent", "counter"),
+    "bytes/received": ("bytes_received", "counter"),
+    "bytes/sent": ("bytes_sent", "counter"),
+    "publish/messages/received": ("publish_received", "counter"),
+    "publish/messages/sent": ("publish_sent", "counter"),
+    "publish/messages/dropped": ("publish_dropped", "counter"),
+    "messages/inflight": ("inflight", "gauge"),
+    "store/messages/count": ("stored", "gauge"),
+    "store/messages/bytes": ("stored_bytes", "gauge"),
+    "clients/connected": ("clients_connected", "gauge"),
+    "load/messages/received/1min": ("load_received", "load"),
+    "load/messages/sent/1min": ("load_sent", "load"),
+    "load/publish/dropped/1min": ("load_dropped", "load"),
+    "load/bytes/received/1min": ("load_bytes_received", "load"),
+    "load/bytes/sent/1min": ("load_bytes_sent", "load"),
+}
+sys_names = [name for name, kind in sys_topics.values()]
+
+# Broker telemetry class, used by the server to sample the $SYS topics of Mosquitto into a time series during every repetition
+# Mosquitto publishes its $SYS topics every sys_interval seconds, and only the ones that changed, so the latest value of every topic is kept
+# (updated from the network thread), and a small sampler thread takes a snapshot of all of them every interval
+# The first snapshot is taken when the repetition starts, and is the baseline of the counters, and the last one when it stops
+class BrokerTelemetry:
+    def __init__(self, interval):
+        self.interval = interval
+        self.latest = {}
+        self.samples = []
+        self.stop_event = threading.Event()
+        self.sampler_thread = None
+
+    # Stores the value of a $SYS message, ignoring the topics that are not sampled and the values that are not numbers
+    def record(self, topic, value):
+        name = sys_topics.get(topic[len(sys_prefix):])
+        if name is None:
+            return
+        try:
+            self.latest[name[0]] = float(value.split()[0])
+        except (ValueError, IndexError):
+            pass
+
+    # Forgets the latest values, used when the server connects to a new broker, since its counters start from zero
+    # Since retained messages are disabled in the broker configuration, the values of the new broker are only received once they change
+    def reset(self):
+        self.latest = {}
+
+    # Takes a snapshot of the latest values, as a list with the elapsed time since the start of the repetition and one value per sampled name
+    def snapshot(self):
+        latest = dict(self.latest)
+        return [round((time.monotonic_ns()-self.start_time)/1000000000, 3)] + [latest.get(name) for name in sys_names]
+
+    # Starts sampling a repetition, with a new series
+    def start(self):
+        self.start_time = time.monotonic_ns()
+        self.samples = [self.snapshot()]
+        self.stop_event.clear()
+        self.sampler_thread = threading.Thread(target = self.sampler, args = (), daemon = True)
+        self.sampler_thread.start()
+
+    # Sampler thread, which takes a snapshot every interval until the repetition stops
+    def sampler(self):
+        while self.stop_event.wait(self.interval) is False:
+            self.samples.append(self.snapshot())
+
+    # Stops sampling the repetition, taking the last snapshot
+    def stop(self):
+        if self.sampler_thread is None:
+            return
+        self.stop_event.set()
+        self.sampler_thread.join()
+        self.sampler_thread = None
+        self.samples.append(self.snapshot())
+
+    # Gets the series of the repetition, as a dictionary with the sampled names and the samples, written next to the results record
+    def series(self):
+        return {"interval": self.interval, "names": ["elapsed"] + sys_names, "samples": self.samples}
+
+    # Summarizes the series of the repetition, as a dictionary with one value per sampled name (None for topics never received)
+    # The baseline of a counter is its first value received during the repetition, since a counter without a value at the start could
+    # already be far from zero (the $SYS messages are not retained), so counters received only once have no increase (None)
+    def summary(self):
+        summary = {}
+        for index, (name, kind) in enumerate(sys_topics.values(), 1):
+            values = [sample[index] for sample in self.samples if sample[index] is not None]
+            if len(values) == 0:
+                summary[name] = None
+            elif kind == "counter":
+                summary[name] = values[-1] - values[0] if len(values) > 1 else None
+            else:
+                summary[name] = max(values)
+        return summary
+
+# Fields of every sampled process, and of the network interface, in the series of the host telemetry:
+# - cpu -> CPU usage in the interval, in percentage of one core (above 100% for processes using more than one core)
+# - rss -> resident memory at the end of the interval, in KB
+# - voluntary/nonvoluntary -> context switches in the interval, either waiting for I/O (voluntary) or preempted by the scheduler (nonvoluntary)
+# - rx/tx -> bytes, packets and dropped packets of the interface in the interval
+process_fields = ("cpu", "rss", "voluntary", "nonvoluntary")
+interface_fields = ("rx_bytes", "rx_packets", "rx_dropped", "tx_bytes", "tx_packets", "tx_dropped")
+
+# Reads the CPU time (in clock ticks), resident memory (in KB) and context switches of a process from /proc/<pid>/stat and /proc/<pid>/status,
+# or None in case the process is gone (or /proc is not available)
+# The name of the process in the stat file is between parentheses and can have spaces, so the fields are split after the last parenthesis
+def read_process(pid):
+    try:
+        with open(f"/proc/{pid}/stat", "r") as stat_file:
+            stat = stat_file.read()
+        with open(f"/proc/{pid}/status", "r") as status_file:
+            status = dict(line.split(":", 1) for line in status_file if ":" in line)
+    except OSError:
+        return None
+    fields = stat[stat.rindex(")")+2:].split()
+    return (int(fields[11]) + int(fields[12]), int(status.get("VmRSS", "0 kB").split()[0]),
+            int(status["voluntary_ctxt_switches"]), int(status["nonvoluntary_ctxt_switches"]))
+
+# Reads the busy and total CPU time of the host (all cores, in clock ticks) from /proc/stat, where the idle time includes the I/O wait
+def read_host():
+    try:
+        with open("/proc/stat", "r") as stat_file:
+            times = [int(value) for value in stat_file.readline().split()[1:9]]
+    except OSError:
+        return None
+    return sum(times) - times[3] - times[4], sum(times)
+
+# Reads the byte, packet and dropped packet counters of a network interface from /proc/net/dev, or None in case the interface doesn't exist
+def read_interface(interface):
+    try:
+        with open("/proc/net/dev", "r") as dev_file:
+            for line in dev_file:
+                name, separator, counters = line.partition(":")
+                if separator and name.strip() == interface:
+                    counters = [int(value) for value in counters.split()]
+                    return counters[0], counters[1], counters[3], counters[8], counters[9], counters[11]
+    except OSError:
+        pass
+    return None
+
+# Host telemetry class, used by the server and the clients to sample the resources of their processes and of the host during every repetition
+# The processes are given by name when the repetition starts (the broker, the server or client itself and Dumpcap), along with the CPU usage
+# of the whole host and the counters of the network interface
+# Every sample only reads a few small files from /proc, and the cumulative counters are kept as they were read, so every sample of the series
+# is the usage in its interval, and the summary is calculated from the first and last readings of the repetition
+class HostTelemetry:
+    def __init__(self, interval, interface):
+        self.interval = interval
+        self.interface = interface
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+        self.processes = {}
+        self.samples = []
+        self.stop_event = threading.Event()
+        self.sampler_thread = None
+
+    # Reads every counter of the processes, the host and the network interface, with the time of the reading
+    def reading(self):
+        return (time.monotonic_ns(), {name: read_process(pid) for name, pid in self.processes.items()}, read_host(), read_interface(self.interface))
+
+    # Calculates the usage between two readings, as a list with the elapsed time since the start of the repetition, the fields of every process,
+    # the CPU usage of the host and the fields of the network interface (None for anything that couldn't be read in both readings)
+    def usage(self, previous, current):
+        seconds = max((current[0]-previous[0])/1000000000, 1e-9)
+        row = [round((current[0]-self.first[0])/1000000000, 3)]
+        for name in self.processes:
+            before, after = previous[1][name], current[1][name]
+            if before is None or after is None:
+                row += [None] * len(process_fields)
+            else:
+                row += [round((after[0]-before[0])/self.clock_ticks/seconds*100, 1), after[1], after[2]-before[2], after[3]-before[3]]
+        if previous[2] is None or current[2] is None or current[2][1] == previous[2][1]:
+            row.append(None)
+        else:
+            row.append(round((current[2][0]-previous[2][0])/(current[2][1]-previous[2][1])*100, 1))
+        if previous[3] is None or current[3] is None:
+            row += [None] * len(interface_fields)
+        else:
+            row += [after - before for before, after in zip(previous[3], current[3])]
+        return row
+
+    # Gets the names of the columns of the series
+    def names(self):
+        return ["elapsed"] + [f"{name}_{field}" for name in self.processes for field in process_fields] + ["host_cpu"] + \
+            [f"interface_{field}" for field in interface_fields]
+
+    # Starts sampling a repetition, with a new series, for the given processes as a dictionary of names and PIDs (processes without a PID are skipped)
+    def start(self, processes):
+        self.processes = {name: pid for name, pid in processes.items() if pid is not None}
+        self.first = self.reading()
+        self.previous = self.first
+        self.samples = []
+        self.stop_event.clear()
+        self.sampler_thread = threading.Thread(target = self.sampler, args = (), daemon = True)
+        self.sampler_thread.start()
+
+    # Takes a sample with the usage since the previous one
+    def sample(self):
+        current = self.reading()
+        self.samples.append(self.usage(self.previous, current))
+        self.previous = current
+
+    # Sampler thread, which takes a sample every interval until the repetition stops
+    def sampler(self):
+        while self.stop_event.wait(self.interval) is False:
+            self.sample()
+
+    # Stops sampling the repetition, taking the last sample
+    def stop(self):
+        if self.sampler_thread is None:
+            return
+        self.stop_event.set()
+        self.sampler_thread.join()
+        self.sampler_thread = None
+        self.sample()
+
+    # Gets the series of the repetition, as a dictionary with the names of the columns and the samples, written next to the results record
+    def series(self):
+        return {"interval": self.interval, "interface": self.interface, "names": self.names(), "samples": self.samples}
+
+    # Summarizes the repetition, as a dictionary with, for every process, its mean and maximum CPU usage, maximum resident memory and total context switches,
+    # the mean and maximum CPU usage of the host and the totals of the network interface
+    # The means and totals come from the first and last readings, and the maximums from the samples
+    def summary(self):
+        total = self.usage(self.first, self.previous)
+        columns = list(zip(*self.samples)) if self.samples else [()] * len(total)
+        maximum = lambda index: max((value for value in columns[index] if value is not None), default=None)
+        summary = {}
+        index = 1
+        for name in self.processes:
+            summary[name] = {"cpu_mean": total[index], "cpu_max": maximum(index), "rss_max": maximum(index+1),
+                             "voluntary": total[index+2], "nonvoluntary": total[index+3]}
+            index += len(process_fields)
+        summary["host"] = {"cpu_mean": total[index], "cpu_max": maximum(index)}
+        summary["interface"] = dict(zip(interface_fields, total[index+1:]))
+        return summary
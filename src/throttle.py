@@ -0,0 +1,94 @@
+# Import of all necessary packages and libraries
+import os
+import signal
+import threading
+
+# Root of the cgroup v2 hierarchy, and the cgroup created for the broker under it
+cgroup_root = "/sys/fs/cgroup"
+cgroup_path = cgroup_root + "/mqtt_qos_broker"
+# Period of the CPU quota of the cgroup, in microseconds (the kernel default)
+cgroup_period = 100000
+
+# Checks if the broker can be throttled with a cgroup, which needs the unified (v2) hierarchy with the cpu controller available,
+# and permission to create the cgroup (usually root)
+def cgroup_available():
+    try:
+        with open(cgroup_root + "/cgroup.controllers", "r") as controllers_file:
+            controllers = controllers_file.read().split()
+    except OSError:
+        return False
+    return "cpu" in controllers and os.access(cgroup_root, os.W_OK)
+
+# Cgroup throttle class, which limits the CPU time of a process with the cpu.max quota of its own cgroup
+# The quota is a fraction of the period, so the process (all its threads) can use at most cpu% of one core, spread evenly by the scheduler
+# The cpu controller is enabled for the children of the root cgroup in case it isn't, and the cgroup is removed once the process ends
+class CgroupThrottle:
+    def __init__(self, pid, cpu):
+        with open(cgroup_root + "/cgroup.subtree_control", "r") as control_file:
+            enabled = control_file.read().split()
+        if "cpu" not in enabled:
+            with open(cgroup_root + "/cgroup.subtree_control", "w") as control_file:
+                control_file.write("+cpu")
+        os.makedirs(cgroup_path, exist_ok=True)
+        with open(cgroup_path + "/cpu.max", "w") as max_file:
+            max_file.write(f"{int(cgroup_period*cpu/100)} {cgroup_period}")
+        with open(cgroup_path + "/cgroup.procs", "w") as procs_file:
+            procs_file.write(str(pid))
+
+    # Removes the cgroup, which is only possible once the process has ended
+    def close(self):
+        try:
+            os.rmdir(cgroup_path)
+        except OSError:
+            pass
+
+# Duty cycle throttle class, used when cgroups are not available, which alternately stops and continues a process with SIGSTOP and SIGCONT
+# In every period, the process runs for cpu% of it and is stopped for the rest, so its average CPU time is limited like with a quota,
+# although in bursts of the period instead of being spread by the scheduler (a short period reduces the bursts, at the cost of more signals)
+# The throttle thread stops once the process ends or the throttle is closed, and always leaves the process running
+class DutyCycleThrottle:
+    def __init__(self, pid, cpu, period):
+        self.pid = pid
+        self.run_time = period * cpu / 100
+        self.stop_time = period - self.run_time
+        self.stop_event = threading.Event()
+        self.throttle_thread = threading.Thread(target = self.throttle, args = (), daemon = True)
+        self.throttle_thread.start()
+
+    # Throttle thread, which sends the signals until the process ends or the throttle is closed
+    def throttle(self):
+        try:
+            while self.stop_event.wait(self.run_time) is False:
+                os.kill(self.pid, signal.SIGSTOP)
+                stopped = self.stop_event.wait(self.stop_time)
+                os.kill(self.pid, signal.SIGCONT)
+                if stopped:
+                    return
+        except ProcessLookupError:
+            return
+
+    # Stops the throttle thread, leaving the process running
+    def close(self):
+        self.stop_event.set()
+        self.throttle_thread.join()
+
+# Limits the CPU of a process to cpu% of one core, and pins it to the given cores, returning the throttle (or None without a limit)
+# and the throttling method used, which is one of:
+# - cgroup -> cpu.max quota of a cgroup v2, used with the "auto" method when available
+# - signal -> SIGSTOP/SIGCONT duty cycle, used with the "auto" method when cgroups are not available (or the cgroup can't be created)
+# - none -> the CPU is not limited (100% or more, since Mosquitto runs on a single thread)
+# The affinity is a list of core numbers, or None to let the process run on any core
+def throttle_process(pid, cpu, affinity, method="auto", period=0.1):
+    if cpu <= 0:
+        raise ValueError(f"CPU performance should be above 0%, not {cpu}%")
+    if affinity is not None:
+        os.sched_setaffinity(pid, affinity)
+    if cpu >= 100:
+        return None, "none"
+    if method == "cgroup" or (method == "auto" and cgroup_available()):
+        try:
+            return CgroupThrottle(pid, cpu), "cgroup"
+        except OSError:
+            if method == "cgroup":
+                raise
+    return DutyCycleThrottle(pid, cpu, period), "signal"
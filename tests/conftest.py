@@ -0,0 +1,8 @@
+# The modules under test are imported the same way the server, the clients and the dataset processor import them,
+# from the src and scripts directories, so both are added to the import path (the tests are run from the root directory)
+import os
+import sys
+
+root_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root_folder, "src"))
+sys.path.insert(0, os.path.join(root_folder, "scripts"))
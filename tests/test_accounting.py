@@ -0,0 +1,47 @@
+# Tests of the sequence accounting of the server: lost, duplicate, reordered and out of range messages, and the missing ranges of the logs
+import accounting
+
+def test_complete_run():
+    tracker = accounting.SequenceTracker(2, 5)
+    for sequence in range(5):
+        tracker.record(0, sequence)
+        tracker.record(1, sequence)
+    assert tracker.client_summary(0) == (5, 0, 0, 0)
+    assert tracker.missing_ranges(1) == []
+
+def test_lost_duplicate_and_reordered():
+    tracker = accounting.SequenceTracker(1, 10)
+    for sequence in (0, 1, 4, 2, 2, 9):
+        tracker.record(0, sequence)
+    # 2 arrived after 4 (reordered) and twice (duplicate), 3 and 5-8 never arrived
+    assert tracker.client_summary(0) == (5, 5, 1, 1)
+    assert tracker.missing_ranges(0) == [(3, 3), (5, 8)]
+
+def test_slots_are_independent():
+    tracker = accounting.SequenceTracker(3, 4)
+    tracker.record(1, 3)
+    assert tracker.missing_ranges(0) == [(0, 3)]
+    assert tracker.missing_ranges(1) == [(0, 2)]
+    assert tracker.client_summary(2) == (0, 4, 0, 0)
+
+def test_out_of_range():
+    tracker = accounting.SequenceTracker(1, 4)
+    tracker.record(0, -1)
+    tracker.record(0, 4)
+    assert tracker.out_of_range == 2
+    assert tracker.client_summary(0) == (0, 4, 0, 0)
+
+def test_duplicate_count_saturates():
+    tracker = accounting.SequenceTracker(1, 1)
+    for delivery in range(300):
+        tracker.record(0, 0)
+    assert tracker.counts[0] == 255
+    assert tracker.client_summary(0) == (1, 0, 299, 0)
+
+def test_format_ranges():
+    assert accounting.format_ranges([]) == ""
+    assert accounting.format_ranges([(10, 15), (200, 200), (340, 341)]) == "10-15, 200, 340-341"
+
+def test_format_ranges_limit():
+    ranges = [(index*10, index*10+1) for index in range(5)]
+    assert accounting.format_ranges(ranges, limit=2) == "0-1, 10-11, ... (3 more ranges)"
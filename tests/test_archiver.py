@@ -0,0 +1,106 @@
+# Tests of the capture archiver: verified archiving, removal of members that fail verification, and the journal of queued capture files
+import io
+import json
+import os
+import zipfile
+import pytest
+import archiver
+
+# Writes a capture file with some content, returning its path
+def capture_file(folder, name, content):
+    path = folder / name
+    path.write_bytes(content)
+    return str(path)
+
+@pytest.mark.parametrize("codec", ["deflate", "stored"])
+def test_archive_capture(tmp_path, codec):
+    zip_path = str(tmp_path / "run.zip")
+    capture = capture_file(tmp_path, "run-R1-T01.pcap", os.urandom(3*archiver.chunk_size//2))
+    content = open(capture, "rb").read()
+    name = archiver.archive_capture(zip_path, capture, codec)
+    assert name == "run-R1-T01.pcap"
+    assert not os.path.exists(capture)
+    with zipfile.ZipFile(zip_path) as open_zip, archiver.open_member(open_zip, name) as member:
+        assert member.read() == content
+
+def test_corrupted_member_is_removed(tmp_path, monkeypatch):
+    zip_path = str(tmp_path / "run.zip")
+    archiver.archive_capture(zip_path, capture_file(tmp_path, "run-R1-T01.pcap", b"first capture"))
+    capture = capture_file(tmp_path, "run-R2-T02.pcap", b"second capture")
+    # The member reads back with different content than the capture file, as if it was corrupted on disk
+    monkeypatch.setattr(archiver, "open_member", lambda open_zip, name: io.BytesIO(b"corrupted"))
+    with pytest.raises(OSError):
+        archiver.archive_capture(zip_path, capture)
+    monkeypatch.undo()
+    # The capture file is kept, and the zip file only has the previous member, still readable
+    assert open(capture, "rb").read() == b"second capture"
+    with zipfile.ZipFile(zip_path) as open_zip:
+        assert open_zip.namelist() == ["run-R1-T01.pcap"]
+        assert open_zip.read("run-R1-T01.pcap") == b"first capture"
+        assert open_zip.testzip() is None
+
+def test_failed_write_is_removed(tmp_path, monkeypatch):
+    zip_path = str(tmp_path / "run.zip")
+    archiver.archive_capture(zip_path, capture_file(tmp_path, "run-R1-T01.pcap", b"first capture"))
+    capture = capture_file(tmp_path, "run-R2-T02.pcap", b"second capture")
+    def failing_writer(member, codec, level):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(archiver, "open_writer", failing_writer)
+    with pytest.raises(OSError):
+        archiver.archive_capture(zip_path, capture)
+    assert os.path.exists(capture)
+    with zipfile.ZipFile(zip_path) as open_zip:
+        assert open_zip.namelist() == ["run-R1-T01.pcap"]
+
+def test_remove_member(tmp_path):
+    zip_path = str(tmp_path / "run.zip")
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as open_zip:
+        open_zip.writestr("first.pcap", b"1"*1000)
+        open_zip.writestr("second.pcap", b"2"*1000)
+    archiver.remove_member(zip_path, "first.pcap")
+    archiver.remove_member(zip_path, "missing.pcap")
+    with zipfile.ZipFile(zip_path) as open_zip:
+        assert open_zip.namelist() == ["second.pcap"]
+        assert open_zip.read("second.pcap") == b"2"*1000
+    assert not os.path.exists(zip_path + ".tmp")
+
+def test_codec_available():
+    assert archiver.codec_available("deflate") and archiver.codec_available("stored")
+    assert not archiver.codec_available("brotli")
+
+def test_archiver_pool(tmp_path):
+    messages = []
+    pool = archiver.Archiver("deflate", None, 2, lambda level, message: messages.append(level))
+    for zip_number in range(2):
+        for repetition in range(3):
+            pool.submit(str(tmp_path / f"run{zip_number}.zip"), capture_file(tmp_path, f"run{zip_number}-R{repetition}.pcap", os.urandom(1000)))
+    pool.close()
+    assert messages == ["info"]*6
+    for zip_number in range(2):
+        with zipfile.ZipFile(str(tmp_path / f"run{zip_number}.zip")) as open_zip:
+            assert sorted(open_zip.namelist()) == [f"run{zip_number}-R{repetition}.pcap" for repetition in range(3)]
+
+def test_journal_requeues_leftover_captures(tmp_path):
+    journal_path = str(tmp_path / "server-archiver.json")
+    zip_path = str(tmp_path / "run.zip")
+    # An interrupted execution left two queued capture files, one of them already archived and deleted
+    leftover = capture_file(tmp_path, "run-R1-T01.pcap", b"leftover")
+    with open(journal_path, "w") as journal_file:
+        json.dump([[zip_path, leftover], [zip_path, str(tmp_path / "run-R2-T02.pcap")]], journal_file)
+    pool = archiver.Archiver("deflate", None, 1, lambda level, message: None, journal_path)
+    pool.close()
+    with zipfile.ZipFile(zip_path) as open_zip:
+        assert open_zip.namelist() == ["run-R1-T01.pcap"]
+    assert json.load(open(journal_path)) == []
+
+def test_journal_keeps_failed_captures(tmp_path, monkeypatch):
+    journal_path = str(tmp_path / "server-archiver.json")
+    zip_path = str(tmp_path / "run.zip")
+    capture = capture_file(tmp_path, "run-R1-T01.pcap", b"capture")
+    monkeypatch.setattr(archiver, "open_member", lambda open_zip, name: io.BytesIO(b"corrupted"))
+    messages = []
+    pool = archiver.Archiver("deflate", None, 1, lambda level, message: messages.append(level), journal_path)
+    pool.submit(zip_path, capture)
+    pool.close()
+    assert messages == ["error"]
+    assert json.load(open(journal_path)) == [[zip_path, capture]]
@@ -0,0 +1,60 @@
+# Tests of the campaign state: atomic writes, and resuming only the same unfinished run plan
+import json
+import campaign
+
+plan = [{"broker": {"queue_size": 1000}, "client_amount": 1, "msg_qos": 0, "msg_amount": 10, "msg_size": 32, "msg_freq": 5},
+        {"broker": {"queue_size": 1000}, "client_amount": 2, "msg_qos": 1, "msg_amount": 10, "msg_size": 32, "msg_freq": 5}]
+
+def test_atomic_write_replaces_content(tmp_path):
+    path = str(tmp_path / "state.json")
+    campaign.atomic_write(path, "first")
+    campaign.atomic_write(path, "second")
+    assert open(path).read() == "second"
+    assert [entry.name for entry in tmp_path.iterdir()] == ["state.json"]
+
+def test_new_campaign(tmp_path):
+    state = campaign.CampaignState(str(tmp_path / "campaign.json"), plan)
+    assert state.resumed is False
+    assert state.current_run() == 0
+    assert state.run_state(0) is None
+
+def test_resume_where_it_stopped(tmp_path):
+    path = str(tmp_path / "campaign.json")
+    state = campaign.CampaignState(path, plan)
+    state.run_started(0, "uuid-0")
+    state.repetition_done(0, 0, {"loss": 0.0}, False)
+    state.repetition_done(0, 1, {"loss": 1.0}, True)
+    state.run_done(0)
+    state.run_started(1, "uuid-1")
+    resumed = campaign.CampaignState(path, plan)
+    assert resumed.resumed is True
+    assert resumed.current_run() == 1
+    assert resumed.run_state(1) == {"uuid": "uuid-1", "repetitions": [], "last": False}
+    assert [repetition["metrics"] for repetition in resumed.run_state(0)["repetitions"]] == [{"loss": 0.0}, {"loss": 1.0}]
+
+def test_different_plan_starts_a_new_campaign(tmp_path):
+    path = str(tmp_path / "campaign.json")
+    campaign.CampaignState(path, plan).run_started(0, "uuid-0")
+    state = campaign.CampaignState(path, plan[:1])
+    assert state.resumed is False
+    assert state.run_state(0) is None
+
+def test_finished_campaign_is_not_resumed(tmp_path):
+    path = str(tmp_path / "campaign.json")
+    state = campaign.CampaignState(path, plan)
+    state.run_started(0, "uuid-0")
+    state.campaign_done()
+    assert json.load(open(path))["finished"] is True
+    assert campaign.CampaignState(path, plan).resumed is False
+
+def test_corrupt_state_starts_a_new_campaign(tmp_path):
+    path = tmp_path / "campaign.json"
+    path.write_text('{"plan": ')
+    state = campaign.CampaignState(str(path), plan)
+    assert state.resumed is False
+    assert state.current_run() == 0
+
+def test_plan_id_ignores_key_order():
+    reordered = [dict(reversed(list(run.items()))) for run in plan]
+    assert campaign.plan_id(plan) == campaign.plan_id(reordered)
+    assert campaign.plan_id(plan) != campaign.plan_id(plan[::-1])
@@ -0,0 +1,80 @@
+# Tests of the latency measurements: clock offset estimation, histogram buckets and percentiles, and the publish handshake tracker
+import pytest
+import latency
+
+# Gets the bucket of a value, by recording it in an empty histogram
+def bucket_index(value):
+    histogram = latency.LatencyHistogram()
+    histogram.record(value)
+    return next(index for index, count in enumerate(histogram.counts) if count > 0)
+
+def test_clock_sync_keeps_lowest_rtt():
+    clock_sync = latency.ClockSync()
+    # The client clock is 1000 ahead of the server clock, and the second ping has the lowest round trip time
+    clock_sync.record(latency.pong_struct.pack(0, 3, 1000 + 50), 100)
+    clock_sync.record(latency.pong_struct.pack(200, 3, 1200 + 5), 210)
+    assert clock_sync.sample(3) == (10, 1000)
+    assert clock_sync.sample(4) is None
+
+@pytest.mark.parametrize("value, index, highest", [(0, 0, 0), (127, 127, 127), (128, 128, 129), (129, 128, 129),
+                                                   (255, 191, 255), (256, 192, 259), (259, 192, 259), (260, 193, 263)])
+def test_bucket_boundaries(value, index, highest):
+    assert bucket_index(value) == index
+    assert latency.LatencyHistogram().bucket_value(index) == highest
+
+def test_buckets_are_contiguous():
+    # Every value falls in the bucket whose range contains it, and the relative error stays below 1/64
+    histogram = latency.LatencyHistogram()
+    for value in list(range(0, 5000)) + [2**exponent + offset for exponent in range(13, 40) for offset in (-1, 0, 1)]:
+        index = bucket_index(value)
+        assert histogram.bucket_value(index) >= value
+        assert index == 0 or histogram.bucket_value(index-1) < value
+        assert histogram.bucket_value(index) - value <= value/64
+
+def test_values_above_the_range_go_to_the_last_bucket():
+    histogram = latency.LatencyHistogram(max_bits=20)
+    histogram.record(2**30)
+    assert histogram.counts[histogram.size-1] == 1
+    assert histogram.percentile(100) == 2**30
+
+def test_negative_values():
+    histogram = latency.LatencyHistogram()
+    histogram.record(-5)
+    assert (histogram.negative, histogram.counts[0]) == (1, 1)
+
+def test_percentiles():
+    histogram = latency.LatencyHistogram()
+    for value in range(1, 101):
+        histogram.record(value)
+    assert histogram.percentile(50) == 50
+    assert histogram.percentile(99) == 99
+    assert histogram.percentile(100) == 100
+    assert latency.LatencyHistogram().percentile(50) is None
+
+def test_percentile_is_capped_by_maximum():
+    histogram = latency.LatencyHistogram()
+    histogram.record(1000)
+    assert histogram.percentile(50) == 1000
+
+def test_merge():
+    first = latency.LatencyHistogram()
+    second = latency.LatencyHistogram()
+    first.record(10)
+    second.record(1000000)
+    second.record(-1)
+    first.merge(second)
+    assert (first.total, first.negative, first.maximum) == (3, 1, 1000000)
+
+def test_handshake_either_side_first():
+    tracker = latency.HandshakeTracker()
+    tracker.start = 0
+    # Completed after the publish loop stored the send time (QoS 1 and 2)
+    tracker.sent(1, 100)
+    tracker.completed(1, 600)
+    # Completed inside the publish call, before the send time is stored (QoS 0)
+    tracker.completed(2, 1000000500)
+    tracker.sent(2, 1000000000)
+    assert tracker.histogram.total == 2
+    assert [(second, count) for second, count, mean, maximum in tracker.series()] == [(0, 1), (1, 1)]
+    # Both slots are cleared, so the message ids can be reused
+    assert (tracker.send_time[1], tracker.done_time[2]) == (0, 0)
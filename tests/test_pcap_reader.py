@@ -0,0 +1,164 @@
+# Tests of the streaming capture reader: pcap/pcapng records, IP/TCP decoding, TCP reordering and gaps, and MQTT packet reassembly
+import io
+import struct
+import pytest
+import pcap_reader
+
+client = (b"\x0a\x00\x00\x02", 50000)
+broker = (b"\x0a\x00\x00\x03", 1883)
+
+# Builds a TCP segment from the client to the broker, with the captured data (shorter than the length when cut by a snaplen)
+def segment(seq, data, length=None, flags=pcap_reader.tcp_ack, timestamp=0, source=client, destination=broker):
+    return pcap_reader.Segment(timestamp, source[0], source[1], destination[0], destination[1], seq, 0, flags,
+                               len(data) if length is None else length, data)
+
+# Encodes the remaining length of an MQTT fixed header, 7 bits per byte with the continuation bit
+def remaining_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length & 0x7F, length >> 7
+        encoded.append(byte | (0x80 if length else 0))
+        if length == 0:
+            return bytes(encoded)
+
+# Builds an MQTT PUBLISH packet, with a packet id for QoS 1 and 2
+def publish(topic, body, qos=0, msgid=1):
+    variable = struct.pack(">H", len(topic)) + topic + (struct.pack(">H", msgid) if qos > 0 else b"")
+    return bytes([0x30 | (qos << 1)]) + remaining_length(len(variable) + len(body)) + variable + body
+
+# Builds an Ethernet, IPv4 and TCP packet with the given TCP payload
+def ethernet_packet(payload, seq=1000):
+    tcp = struct.pack(">HHIIBBHHH", client[1], broker[1], seq, 0, 5 << 4, pcap_reader.tcp_ack, 65535, 0, 0)
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, 20 + len(tcp) + len(payload), 0, 0x4000, 64, 6, 0, client[0], broker[0])
+    return b"\x00"*12 + b"\x08\x00" + ip + tcp + payload
+
+def test_read_pcap_microseconds():
+    packet = ethernet_packet(b"abc")
+    capture = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, pcap_reader.linktype_ethernet)
+    capture += struct.pack("<IIII", 10, 5, len(packet), len(packet)) + packet
+    packets = list(pcap_reader.read_packets(io.BytesIO(capture)))
+    assert packets == [(10*1000000000 + 5000, pcap_reader.linktype_ethernet, packet, len(packet))]
+
+def test_read_pcap_truncated_record():
+    packet = ethernet_packet(b"abc")
+    capture = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, pcap_reader.linktype_ethernet)
+    capture += struct.pack("<IIII", 10, 5, len(packet), len(packet)) + packet[:-1]
+    assert list(pcap_reader.read_packets(io.BytesIO(capture))) == []
+
+def test_read_pcapng_nanoseconds():
+    packet = ethernet_packet(b"abc")
+    section = struct.pack("<IIIHHq", 0x0A0D0D0A, 28, pcap_reader.pcapng_byteorder, 1, 0, -1) + struct.pack("<I", 28)
+    options = struct.pack("<HHB3x", 9, 1, 9) + struct.pack("<HH", 0, 0)
+    interface = struct.pack("<IIHHI", 1, 20 + len(options), pcap_reader.linktype_ethernet, 0, 65535) + options
+    interface += struct.pack("<I", 20 + len(options))
+    padded = packet + b"\x00"*(-len(packet) % 4)
+    timestamp = 1234567890123456789
+    enhanced = struct.pack("<IIIIIII", 6, 32 + len(padded), 0, timestamp >> 32, timestamp & 0xFFFFFFFF, len(packet), len(packet)) + padded
+    enhanced += struct.pack("<I", 32 + len(padded))
+    packets = list(pcap_reader.read_packets(io.BytesIO(section + interface + enhanced)))
+    assert packets == [(timestamp, pcap_reader.linktype_ethernet, packet, len(packet))]
+
+def test_read_unknown_format():
+    with pytest.raises(ValueError):
+        list(pcap_reader.read_packets(io.BytesIO(b"notacapture")))
+
+def test_tcp_segments_ethernet():
+    packet = ethernet_packet(b"hello", seq=4242)
+    segments = list(pcap_reader.tcp_segments([(7, pcap_reader.linktype_ethernet, packet, len(packet))]))
+    assert len(segments) == 1
+    assert segments[0].flow() == (client[0], client[1], broker[0], broker[1])
+    assert (segments[0].seq, segments[0].length, segments[0].data) == (4242, 5, b"hello")
+
+def test_tcp_segments_snaplen():
+    # With a snaplen, the length still comes from the IP header while the data only has the captured bytes
+    packet = ethernet_packet(b"hello world")
+    segments = list(pcap_reader.tcp_segments([(7, pcap_reader.linktype_ethernet, packet[:-6], len(packet))]))
+    assert (segments[0].length, segments[0].data) == (11, b"hello")
+
+def test_seq_diff_wraps_around():
+    assert pcap_reader.seq_diff(5, 0xFFFFFFFB) == 10
+    assert pcap_reader.seq_diff(0xFFFFFFFB, 5) == -10
+
+@pytest.mark.parametrize("length", [0, 127, 128, 16383, 16384, 2097151, 2097152])
+def test_remaining_length(length):
+    stream = pcap_reader.MQTTStream()
+    packet = bytes([0x30]) + remaining_length(length) + b"\x00"*length
+    messages = stream.feed(packet)
+    assert [(message[0], message[2]) for message in messages] == [(pcap_reader.mqtt_publish, length)]
+
+def test_invalid_first_byte_loses_sync():
+    stream = pcap_reader.MQTTStream()
+    assert stream.feed(b"\x00\x02ab") == []
+    assert stream.synced is False
+
+def test_split_publish():
+    packet = publish(b"mqtt_qos/main_topic/client-0", b"\x01"*300 + b"\xAB\xCD", qos=1, msgid=7)
+    reassembler = pcap_reader.MQTTReassembler()
+    assert reassembler.segment(segment(1000, packet[:3], timestamp=1)) == []
+    assert reassembler.segment(segment(1003, packet[3:100], timestamp=2)) == []
+    messages = reassembler.segment(segment(1100, packet[100:], timestamp=3))
+    assert len(messages) == 1
+    assert (messages[0].topic, messages[0].qos, messages[0].msgid, messages[0].timestamp) == ("mqtt_qos/main_topic/client-0", 1, 7, 3)
+    assert messages[0].payload == b"\x01"*300 + b"\xAB\xCD"
+    assert messages[0].tail == b"\xAB\xCD"
+
+def test_several_packets_in_one_segment():
+    packets = publish(b"t", b"a") + publish(b"t", b"b") + bytes([0x40, 2, 0, 9])
+    messages = pcap_reader.MQTTReassembler().segment(segment(1000, packets))
+    assert [message.packet_type for message in messages] == [pcap_reader.mqtt_publish, pcap_reader.mqtt_publish, pcap_reader.mqtt_puback]
+    assert messages[2].msgid == 9
+
+def test_retransmission_is_ignored():
+    first = publish(b"t", b"first")
+    second = publish(b"t", b"second")
+    reassembler = pcap_reader.MQTTReassembler()
+    assert len(reassembler.segment(segment(1000, first))) == 1
+    assert reassembler.segment(segment(1000, first)) == []
+    # A retransmission that overlaps new bytes only delivers the new ones
+    messages = reassembler.segment(segment(1000, first + second))
+    assert [message.payload for message in messages] == [b"second"]
+
+def test_out_of_order_segments_are_held():
+    first = publish(b"t", b"first")
+    second = publish(b"t", b"second")
+    reassembler = pcap_reader.MQTTReassembler()
+    reassembler.segment(segment(999, b"", flags=pcap_reader.tcp_syn))
+    assert reassembler.segment(segment(1000 + len(first), second)) == []
+    messages = reassembler.segment(segment(1000, first))
+    assert [message.payload for message in messages] == [b"first", b"second"]
+
+def test_gap_inside_packet_completes_it():
+    # The middle of a big PUBLISH is missing from the capture (cut by the snaplen), so the packet completes without its tail
+    packet = publish(b"t", b"\x02"*2000)
+    reassembler = pcap_reader.MQTTReassembler()
+    messages = reassembler.segment(segment(1000, packet[:50], length=len(packet)))
+    assert len(messages) == 1
+    assert messages[0].payload == b"\x02"*(50 - 6)
+    assert messages[0].tail is None
+    # The next packet starts at the beginning of the next segment and is decoded normally
+    messages = reassembler.segment(segment(1000 + len(packet), publish(b"t", b"next")))
+    assert [message.payload for message in messages] == [b"next"]
+
+def test_gap_over_header_resyncs_on_next_segment():
+    first = publish(b"t", b"first")
+    lost = publish(b"t", b"lost")
+    after = publish(b"t", b"after")
+    reassembler = pcap_reader.MQTTReassembler()
+    reassembler.segment(segment(1000, first))
+    # The segment with the lost packet is held until the hold limit is reached, and then skipped as a gap
+    for index in range(pcap_reader.pending_limit + 1):
+        seq = 1000 + len(first) + len(lost) + index*len(after)
+        messages = reassembler.segment(segment(seq, after))
+    assert len(messages) == pcap_reader.pending_limit + 1
+    assert all(message.payload == b"after" for message in messages)
+
+def test_other_ports_are_ignored():
+    assert pcap_reader.MQTTReassembler().segment(segment(1000, publish(b"t", b"x"), destination=(broker[0], 8883))) == []
+
+def test_ack_rtt():
+    tracker = pcap_reader.AckRttTracker()
+    assert tracker.segment(segment(1000, b"x"*10, timestamp=100)) is None
+    # A retransmission is not tracked again, so the ACK is measured from the original transmission
+    assert tracker.segment(segment(1000, b"x"*10, timestamp=150)) is None
+    ack = pcap_reader.Segment(250, broker[0], broker[1], client[0], client[1], 1, 1010, pcap_reader.tcp_ack, 0, b"")
+    assert tracker.segment(ack) == 150
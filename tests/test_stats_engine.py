@@ -0,0 +1,54 @@
+# Tests of the NumPy statistics engine: group packing, per group statistics, bootstrap intervals and outliers
+import math
+import numpy
+import stats_engine
+
+def test_group_matrix_packs_and_drops_missing_values():
+    group_index = numpy.array([1, 0, 1, 0, 1])
+    values = numpy.array([10.0, 1.0, numpy.nan, 2.0, 30.0])
+    matrix, counts, order, columns = stats_engine.group_matrix(group_index, values, 3)
+    assert counts.tolist() == [2, 2, 0]
+    assert matrix[0].tolist() == [1.0, 2.0]
+    assert matrix[1].tolist() == [10.0, 30.0]
+    assert all(math.isnan(value) for value in matrix[2])
+    # Every value can be found back from its position in the matrix
+    assert order.tolist() == [1, 3, 0, 4]
+    assert matrix[group_index[order], columns].tolist() == values[order].tolist()
+
+def test_matrix_statistics():
+    matrix, counts, order, columns = stats_engine.group_matrix([0]*5 + [1], [1.0, 2.0, 3.0, 4.0, 5.0, 7.0], 3)
+    statistics, flags = stats_engine.matrix_statistics(matrix, counts, resamples=200)
+    assert statistics["mean"][0] == 3.0
+    assert statistics["median"][0] == 3.0
+    assert math.isclose(statistics["std"][0], numpy.std([1, 2, 3, 4, 5], ddof=1))
+    # A single value has no standard deviation nor interval, and an empty group has no statistics at all
+    assert statistics["mean"][1] == 7.0
+    assert math.isnan(statistics["std"][1]) and math.isnan(statistics["ci_low"][1])
+    assert math.isnan(statistics["mean"][2])
+    assert statistics["ci_low"][0] <= 3.0 <= statistics["ci_high"][0]
+
+def test_bootstrap_only_resamples_own_values():
+    # The NaN padding of a shorter group is never drawn, so its interval stays inside its own values
+    matrix, counts, order, columns = stats_engine.group_matrix([0, 0, 1, 1, 1, 1], [5.0, 6.0, 100.0, 200.0, 300.0, 400.0], 2)
+    low, high = stats_engine.bootstrap_interval(matrix, counts, 500, 95, numpy.random.default_rng(0))
+    assert 5.0 <= low[0] <= high[0] <= 6.0
+    assert 100.0 <= low[1] <= high[1] <= 400.0
+
+def test_bootstrap_is_reproducible():
+    matrix, counts, order, columns = stats_engine.group_matrix([0]*20, list(range(20)), 1)
+    first = stats_engine.bootstrap_interval(matrix, counts, 100, 95, numpy.random.default_rng(7))
+    second = stats_engine.bootstrap_interval(matrix, counts, 100, 95, numpy.random.default_rng(7))
+    assert first[0].tolist() == second[0].tolist() and first[1].tolist() == second[1].tolist()
+
+def test_outliers_use_their_own_group():
+    values = [10.0, 11.0, 12.0, 11.0, 10.0, 50.0] + [50.0, 51.0, 49.0, 50.0]
+    matrix, counts, order, columns = stats_engine.group_matrix([0]*6 + [1]*4, values, 2)
+    statistics, flags = stats_engine.matrix_statistics(matrix, counts, resamples=10)
+    assert statistics["outliers"].tolist() == [1, 0]
+    assert flags[0, 5] and not flags[1].any()
+
+def test_sample_statistics():
+    assert stats_engine.sample_statistics([]) is None
+    assert stats_engine.sample_statistics([2.0]) == {"mean": 2.0, "median": 2.0, "p5": 2.0, "p95": 2.0, "p99": 2.0, "std": None}
+    statistics = stats_engine.sample_statistics([1.0, 2.0, 3.0, 4.0])
+    assert (statistics["mean"], statistics["median"], statistics["std"]) == (2.5, 2.5, 1.291)
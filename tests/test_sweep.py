@@ -0,0 +1,55 @@
+# Tests of the sweep planner: reflected (Gray code) ordering, fractional designs and the grouping of the runs by broker settings
+import itertools
+import pytest
+import sweep
+
+broker_space = {"queue_size": [1000, 100, 10], "tcp_delay": [1, 0], "cpu_performance": 100, "cpu_affinity": [None]}
+run_space = {"client_amount": [1, 2, 5], "msg_qos": [0, 1, 2], "msg_amount": 1000, "msg_size": [1250, 12500], "msg_freq": [5, 25, 50]}
+
+@pytest.mark.parametrize("level_amounts", [[3], [2, 3], [3, 3, 3], [2, 1, 4, 3]])
+def test_reflected_product_is_a_full_factorial(level_amounts):
+    combinations = sweep.reflected_product(level_amounts)
+    assert sorted(combinations) == sorted(itertools.product(*[range(amount) for amount in level_amounts]))
+
+@pytest.mark.parametrize("level_amounts", [[2, 3], [3, 3, 3], [2, 1, 4, 3]])
+def test_reflected_product_adjacency(level_amounts):
+    # Consecutive combinations differ in a single factor, by a single level
+    combinations = sweep.reflected_product(level_amounts)
+    for previous, combination in zip(combinations, combinations[1:]):
+        changes = [abs(first - second) for first, second in zip(previous, combination) if first != second]
+        assert changes == [1]
+
+def test_reflected_product_first_factor_changes_least():
+    combinations = sweep.reflected_product([2, 3])
+    assert combinations == [(0, 0), (0, 1), (0, 2), (1, 2), (1, 1), (1, 0)]
+
+def test_space_plan_groups_broker_settings():
+    plan = sweep.space_plan({"broker": broker_space, "runs": run_space})
+    assert len(plan) == 3*2*3*3*2*3
+    # The broker is only restarted once per combination of broker settings
+    assert sweep.broker_changes(plan) == 3*2 - 1
+    assert all(run["msg_amount"] == 1000 and run["broker"]["cpu_performance"] == 100 for run in plan)
+
+def test_space_plan_fraction_covers_every_pair():
+    space = {"fraction": 3, "broker": {"queue_size": [1000, 100, 10], "tcp_delay": 1, "cpu_performance": 100, "cpu_affinity": [None]},
+             "runs": {"client_amount": [1, 2, 5], "msg_qos": [0, 1, 2], "msg_amount": 1000, "msg_size": 1250, "msg_freq": [5, 25, 50]}}
+    plan = sweep.space_plan(space)
+    assert len(plan) == 3**4 // 3
+    # With 3 level factors and a fraction of 3, every pair of factors still has all its combinations of levels
+    values = [(run["broker"]["queue_size"], run["client_amount"], run["msg_qos"], run["msg_freq"]) for run in plan]
+    for first, second in itertools.combinations(range(4), 2):
+        assert len({(value[first], value[second]) for value in values}) == 9
+
+@pytest.mark.parametrize("space", [{"broker": broker_space, "runs": {**run_space, "msg_color": [1]}},
+                                   {"broker": broker_space, "runs": {name: run_space[name] for name in run_space if name != "msg_qos"}},
+                                   {"broker": broker_space, "runs": {**run_space, "msg_qos": []}},
+                                   {"fraction": 0, "broker": broker_space, "runs": run_space}])
+def test_space_plan_rejects_bad_spaces(space):
+    with pytest.raises(ValueError):
+        sweep.space_plan(space)
+
+def test_details_plan():
+    details = {"client_amount": 10, "msg_qos": [0, 1], "msg_amount": 1000, "msg_size": [1250, 12500], "msg_freq": [25, 50]}
+    plan = sweep.details_plan(details, 2, {"queue_size": 1000})
+    assert plan[1] == {"broker": {"queue_size": 1000}, "client_amount": 10, "msg_qos": 1, "msg_amount": 1000, "msg_size": 12500, "msg_freq": 50}
+    assert sweep.broker_changes(plan) == 0